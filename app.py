@@ -1,10 +1,10 @@
 import streamlit as st
 
 # --- Import feature functions ---
-from explain_tab import feature_explain_topic
-from summarize_tab import feature_summarize_notes
-from quiz_tab import feature_generate_quiz
-from flashcard_tab import feature_generate_flashcards
+from explain_tab import feature_explain_topic, cancel_explanation_generation
+from summarize_tab import feature_summarize_notes, cancel_summary_generation, cancel_batch_summaries
+from quiz_tab import feature_generate_quiz, cancel_quiz_generation
+from flashcard_tab import feature_generate_flashcards, cancel_flashcard_generation
 
 # --- Page Config ---
 st.set_page_config(
@@ -79,6 +79,14 @@ if 'app_mode' not in st.session_state:
 # --- Back Button ---
 def show_back_button():
     if st.button("← Back to Home", type="secondary", key="back_home"):
+        # Leaving a tab abandons its pending generation; free the worker instead of finishing it
+        cancel_explanation_generation()
+        cancel_summary_generation()
+        if st.session_state.get('summary_batch_job_id'):
+            # A finished batch stays on screen; only one still running is abandoned
+            cancel_batch_summaries()
+        cancel_quiz_generation()
+        cancel_flashcard_generation()
         st.session_state.app_mode = "Home"
         st.rerun()
     st.markdown("<br>", unsafe_allow_html=True)
@@ -0,0 +1,103 @@
+"""Compares the PDF text backends on a corpus of sample PDFs: pages per second and character fidelity.
+
+Fidelity is measured against the layout-aware pdfplumber backend as an F1 score over
+each page's character bigrams with whitespace removed, so backends are not penalised
+for spacing differences (pdfplumber itself drops word spaces in some documents).
+
+    python benchmark_pdf.py samples/ lecture.pdf --max-pages 50
+"""
+import argparse
+import os
+import re
+import time
+from collections import Counter
+
+from pdf_extraction import BACKENDS, count_pages
+
+REFERENCE = "pdfplumber"
+WHITESPACE = re.compile(r'\s+')
+
+
+def find_pdfs(paths):
+    """Expands files and directories (searched recursively) into a sorted list of PDF paths."""
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                found.extend(os.path.join(root, name) for name in names if name.lower().endswith('.pdf'))
+        else:
+            found.append(path)
+    return sorted(found)
+
+
+def bigrams(text):
+    text = WHITESPACE.sub('', text)
+    return Counter(text[i:i + 2] for i in range(len(text) - 1))
+
+
+def char_f1(text, reference):
+    """Harmonic mean of bigram precision and recall of text against reference (1.0 when both are empty)."""
+    found, expected = bigrams(text), bigrams(reference)
+    if not found and not expected:
+        return 1.0
+    overlap = sum((found & expected).values())
+    if not overlap:
+        return 0.0
+    precision = overlap / sum(found.values())
+    recall = overlap / sum(expected.values())
+    return 2 * precision * recall / (precision + recall)
+
+
+def read_document(backend, path, max_pages):
+    """Returns (page texts, seconds) for one document read in-process by backend."""
+    total = min(count_pages(path), max_pages) if max_pages else count_pages(path)
+    started = time.perf_counter()
+    pages = list(BACKENDS[backend].iter_pages(path, 0, total))
+    return pages, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("paths", nargs="+", help="PDF files or directories of PDFs")
+    parser.add_argument("--max-pages", type=int, default=0, help="Read at most this many pages per document (0 = all)")
+    parser.add_argument("--backends", default=','.join(BACKENDS), help="Comma-separated backends to compare")
+    args = parser.parse_args()
+
+    backends = [name.strip() for name in args.backends.split(',') if name.strip()]
+    if REFERENCE not in backends:
+        backends.append(REFERENCE)
+    pdfs = find_pdfs(args.paths)
+    if not pdfs:
+        parser.error("no PDFs found")
+
+    totals = {name: {"pages": 0, "seconds": 0.0, "chars": 0, "f1": []} for name in backends}
+    print(f"{'document':<40}{'backend':<12}{'pages':>6}{'pages/s':>10}{'chars':>9}{'fidelity':>10}")
+    for path in pdfs:
+        try:
+            results = {name: read_document(name, path, args.max_pages) for name in backends}
+        except Exception as e:
+            print(f"{os.path.basename(path)[:39]:<40}skipped: {e}")
+            continue
+        reference = results[REFERENCE][0]
+        for name in backends:
+            pages, seconds = results[name]
+            f1 = sum(char_f1(text, expected) for text, expected in zip(pages, reference)) / max(1, len(pages))
+            chars = sum(len(text) for text in pages)
+            row = totals[name]
+            row["pages"] += len(pages)
+            row["seconds"] += seconds
+            row["chars"] += chars
+            row["f1"].append(f1)
+            rate = len(pages) / seconds if seconds else 0.0
+            print(f"{os.path.basename(path)[:39]:<40}{name:<12}{len(pages):>6}{rate:>10.1f}{chars:>9}{f1:>10.3f}")
+
+    print(f"\n{'backend':<12}{'pages':>7}{'seconds':>9}{'pages/s':>10}{'chars':>10}{'fidelity':>10}   (fidelity: character bigram F1 vs {REFERENCE})")
+    for name in backends:
+        row = totals[name]
+        rate = row["pages"] / row["seconds"] if row["seconds"] else 0.0
+        f1 = sum(row["f1"]) / len(row["f1"]) if row["f1"] else 0.0
+        print(f"{name:<12}{row['pages']:>7}{row['seconds']:>9.2f}{rate:>10.1f}{row['chars']:>10}{f1:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
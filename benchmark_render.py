@@ -0,0 +1,86 @@
+"""Times the summary renderer on large generated summaries: the former version, the precompiled one, and a memoized rerun.
+
+Every size is also checked to render exactly the same HTML as the former version.
+
+    python benchmark_render.py --sizes 1000,10000,100000 --repeat 20
+"""
+import argparse
+import html
+import random
+import re
+import time
+
+from markdown_render import render_markdown_html
+
+WORDS = ("cell membrane protein enzyme energy reaction structure process system function "
+         "layer network memory pattern balance value force data model result").split()
+
+
+def legacy_render(summary_raw, highlight):
+    """The renderer the summary tab used before markdown_render: html.escape plus five re.sub passes."""
+    summary_escaped = html.escape(summary_raw)
+    if highlight:
+        summary_escaped = re.sub(r'\*\*(.*?)\*\*', r'<strong style="color: #FFD700;">\1</strong>', summary_escaped)
+    summary_escaped = re.sub(r'^[\-\*]\s+(.+)$', r'<div style="margin-left: 1.5rem; margin-bottom: 0.3rem;">• \1</div>', summary_escaped, flags=re.MULTILINE)
+    summary_escaped = re.sub(r'^(\d+)\.\s+(.+)$', r'<div style="margin-left: 1.5rem; margin-bottom: 0.3rem;"><strong style="color: #FFD700;">\1.</strong> \2</div>', summary_escaped, flags=re.MULTILINE)
+    summary_escaped = re.sub(r'\n\n', '</p><p style="margin-bottom: 0.8rem;">', summary_escaped)
+    summary_escaped = summary_escaped.replace('\n', '<br>')
+    return f'<p style="margin-bottom: 0.8rem;">{summary_escaped}</p>'
+
+
+def make_summary(lines, rng):
+    """Builds a summary of about lines lines mixing paragraphs, bullets, numbered items, bold terms and HTML."""
+    blocks = []
+    while sum(block.count('\n') + 1 for block in blocks) < lines:
+        kind = rng.choice(("paragraph", "bullets", "numbered"))
+        if kind == "paragraph":
+            sentences = []
+            for _ in range(rng.randint(2, 5)):
+                words = [rng.choice(WORDS) for _ in range(rng.randint(8, 16))]
+                words[rng.randrange(len(words))] = f"**{rng.choice(WORDS)}**"
+                sentences.append(' '.join(words).capitalize() + rng.choice(('.', ' <i>&</i>.')))
+            blocks.append(' '.join(sentences))
+        else:
+            items = []
+            for number in range(1, rng.randint(3, 8)):
+                text = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(5, 12)))
+                text = f"**{text.split()[0]}** {text}" if rng.random() < 0.5 else text
+                items.append(f"{number}. {text}" if kind == "numbered" else f"{rng.choice('-*')} {text}")
+            blocks.append('\n'.join(items))
+    return '\n\n'.join(blocks)
+
+
+def best_of(repeat, fn):
+    """Returns the fastest of repeat timed calls, in milliseconds."""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="100,1000,10000,50000", help="Comma-separated summary sizes, in lines")
+    parser.add_argument("--repeat", type=int, default=10, help="Timed runs per measurement (the best is reported)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"{'lines':>7}{'chars':>10}{'highlight':>11}{'former ms':>11}{'uncached ms':>13}{'memoized ms':>13}{'speedup':>9}  same")
+    for lines in (int(size) for size in args.sizes.split(',') if size.strip()):
+        summary = make_summary(lines, rng)
+        for highlight in (True, False):
+            same = legacy_render(summary, highlight) == render_markdown_html(summary, highlight)
+            legacy = best_of(args.repeat, lambda: legacy_render(summary, highlight))
+            # Each uncached run renders a fresh copy, so the memo cannot answer it.
+            copies = [summary + ' ' * i for i in range(1, args.repeat + 1)]
+            single = best_of(args.repeat, lambda: render_markdown_html(copies.pop(), highlight))
+            memoized = best_of(args.repeat, lambda: render_markdown_html(summary, highlight))
+            speedup = legacy / memoized if memoized else float('inf')
+            print(f"{lines:>7}{len(summary):>10}{str(highlight):>11}{legacy:>11.3f}{single:>13.3f}{memoized:>13.4f}{speedup:>8.0f}x  {same}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 import streamlit as st
-import re
-from utils import generate_content_with_backoff
+from utils import stream_content, get_job_executor, submit_job, job_status_text, cancel_job, fit_topic, notes_lookup
+from jobs import JobQueueFull, DONE, collect_text, poll_job
+from markdown_render import markup_to_markdown, strip_markup
 
 
 # --- CUSTOM CSS FOR EXPLAIN TOPIC ---
@@ -105,6 +106,66 @@ def inject_explain_css():
     """, unsafe_allow_html=True)
 
 
+# Section markers in the order the model is asked to emit them.
+EXPLANATION_SECTIONS = [
+    ("#DEFINITION#", "📖 Definition"),
+    ("#EXPLANATION#", "💡 Detailed Explanation"),
+    ("#EXAMPLE#", "🌟 Example / Analogy"),
+    ("#KEY_POINTS#", "🎯 Key Takeaways"),
+]
+
+
+def parse_partial_sections(text):
+    """Splits a possibly incomplete explanation into the (header, content) sections received so far."""
+    found = []
+    for marker, header in EXPLANATION_SECTIONS:
+        position = text.find(marker)
+        if position != -1:
+            found.append((position, marker, header))
+    found.sort()
+
+    sections = []
+    for i, (position, marker, header) in enumerate(found):
+        end = found[i + 1][0] if i + 1 < len(found) else len(text)
+        content = text[position + len(marker):end].strip()
+        if content:
+            sections.append((header, content))
+    return sections
+
+
+def clean_explanation_content(content):
+    """Converts the model's HTML-ish markup into markdown Streamlit can render."""
+    # Anchor links like [](http://...) are dropped; <pre>, <code> and <strong> become markdown
+    return markup_to_markdown(content)
+
+
+def render_explanation_card(header, content):
+    """Renders one explanation section as a header card followed by its content."""
+    cleaned_content = clean_explanation_content(content)
+    
+    # Header card
+    st.markdown(f"""
+    <div style="
+        background: linear-gradient(135deg, #1A1A1A 0%, #252525 100%);
+        padding: 1.5rem 1.5rem 0.8rem 1.5rem;
+        border-radius: 15px 15px 0 0;
+        border-left: 5px solid #FFD700;
+        box-shadow: 0 8px 24px rgba(0, 0, 0, 0.4);
+        margin-bottom: 0;
+    ">
+        <h3 style="color: #FFD700; margin: 0; font-size: 1.15rem;">
+            {header}
+        </h3>
+    </div>
+    """, unsafe_allow_html=True)
+    
+    # Content with bordered container (continuous with header)
+    with st.container(border=True):
+        st.markdown(cleaned_content)
+    
+    st.markdown("<br>", unsafe_allow_html=True)
+
+
 def feature_explain_topic():
     """Implements the 'Explain a Topic' feature with modern UI."""
     
@@ -133,38 +194,14 @@ def feature_explain_topic():
         display_explanation_results()
         return
     
-    # Loading state
+    # Loading state (the explanation streams in from a background job)
     if st.session_state.explanation_generating:
-        with st.container(border=True):
-            st.markdown("""
-            <div style="padding: 2rem 1rem; text-align: center;">
-                <div style="margin-bottom: 2rem;">
-                    <div style="
-                        border: 4px solid #333333;
-                        border-top: 4px solid #FFD700;
-                        border-radius: 50%;
-                        width: 60px;
-                        height: 60px;
-                        animation: spin 1s linear infinite;
-                        margin: 0 auto;
-                    "></div>
-                </div>
-                <h3 style="color: #FFD700; margin: 0;">🔄 Generating Explanation...</h3>
-                <p style="color: #CCCCCC; margin-top: 0.5rem;">Please wait while we prepare your explanation</p>
-            </div>
-            
-            <style>
-            @keyframes spin {
-                0% { transform: rotate(0deg); }
-                100% { transform: rotate(360deg); }
-            }
-            </style>
-            """, unsafe_allow_html=True)
-        
-        # Actually generate
         generate_explanation()
         return
     
+    if st.session_state.get('explanation_error'):
+        st.error(f"❌ {st.session_state.pop('explanation_error')}")
+    
     # Input form
     with st.container(border=True):
         st.markdown('<h3 style="color: #FFD700; margin-top: 0; margin-bottom: 1rem; font-size: 1.3rem;">🎓 What would you like to learn?</h3>', unsafe_allow_html=True)
@@ -204,6 +241,14 @@ def feature_explain_topic():
                 st.session_state.explanation_level = "Advanced"
                 st.rerun()
         
+        uploads = st.session_state.get('uploaded_files') or []
+        use_notes = uploads and st.checkbox(
+            f"📎 Use my uploaded notes ({len(uploads)} file{'s' if len(uploads) > 1 else ''})",
+            value=True,
+            key='explanation_use_notes_input',
+            help="Sends only the passages of your uploaded files that match the topic"
+        )
+        
         st.markdown('<div style="margin-top: 1rem;">', unsafe_allow_html=True)
         
         # Generate button (centered)
@@ -212,6 +257,7 @@ def feature_explain_topic():
             if st.button("✨ Generate Explanation", type="primary", use_container_width=True, key="gen_explain_btn"):
                 if topic.strip():
                     st.session_state.explanation_generating = True
+                    st.session_state.explanation_use_notes = bool(use_notes)
                     st.rerun()
                 else:
                     st.warning("⚠️ Please enter a topic first.")
@@ -220,17 +266,45 @@ def feature_explain_topic():
 
 
 
-def generate_explanation():
-    """Actually performs the explanation generation."""
-    
-    topic = st.session_state.explanation_topic
-    level = st.session_state.explanation_level
-    
-    if not topic.strip():
-        st.session_state.explanation_generating = False
-        st.rerun()
+def render_explanation_progress(job):
+    """Shows the sections streamed so far, or the spinner until the first one arrives."""
+    sections = parse_partial_sections(job.partial)
+    if sections:
+        for header, content in sections:
+            render_explanation_card(header, content)
         return
     
+    with st.container(border=True):
+        st.markdown(f"""
+        <div style="padding: 2rem 1rem; text-align: center;">
+            <div style="margin-bottom: 2rem;">
+                <div style="
+                    border: 4px solid #333333;
+                    border-top: 4px solid #FFD700;
+                    border-radius: 50%;
+                    width: 60px;
+                    height: 60px;
+                    animation: spin 1s linear infinite;
+                    margin: 0 auto;
+                "></div>
+            </div>
+            <h3 style="color: #FFD700; margin: 0;">🔄 Generating Explanation...</h3>
+            <p style="color: #CCCCCC; margin-top: 0.5rem;">Please wait while we prepare your explanation</p>
+            <p style="color: #999999; margin-top: 0.5rem; font-size: 0.9rem;">{job_status_text(job)}</p>
+        </div>
+        
+        <style>
+        @keyframes spin {{
+            0% {{ transform: rotate(0deg); }}
+            100% {{ transform: rotate(360deg); }}
+        }}
+        </style>
+        """, unsafe_allow_html=True)
+
+
+def build_explanation_payload(topic, level):
+    """Builds the structured-explanation request for a topic at a given level."""
+    topic = fit_topic(topic)
     # Define structured prompt with HTML tags
     system_prompt = f"""
     You are 'MyBuddy', an AI study companion. Your goal is to explain the topic provided by the user in a clear, structured format suitable for a student at the '{level}' level.
@@ -256,7 +330,7 @@ def generate_explanation():
     
     user_prompt = f"Explain the following topic at the {level} level: {topic}"
     
-    payload = {
+    return {
         "contents": [{"parts": [{"text": user_prompt}]}],
         "systemInstruction": {"parts": [{"text": system_prompt}]},
         "generationConfig": {
@@ -266,15 +340,57 @@ def generate_explanation():
         },
         "model": "gemini-2.5-flash-preview-05-20"
     }
+
+
+def cancel_explanation_generation():
+    """Aborts a pending explanation and returns the tab to its form."""
+    cancel_job(st.session_state.pop('explanation_job_id', None))
+    st.session_state.pop('explanation_regenerate', None)
+    st.session_state.explanation_generating = False
+
+
+def generate_explanation():
+    """Submits the explanation to the background job pool, then polls it until it finishes."""
     
-    # Call API
-    response_text = generate_content_with_backoff(payload)
+    executor = get_job_executor()
+    job = executor.get(st.session_state.get('explanation_job_id'))
     
-    if response_text:
-        st.session_state.explanation_output = response_text
+    if job is None:
+        topic = st.session_state.explanation_topic
+        level = st.session_state.explanation_level
+        
+        if not topic.strip():
+            st.session_state.explanation_generating = False
+            st.rerun()
+            return
+        
+        # Regenerate bypasses the shared response cache
+        regenerate = st.session_state.pop('explanation_regenerate', False)
+        notes = None
+        if st.session_state.get('explanation_use_notes') and st.session_state.get('uploaded_files'):
+            notes = notes_lookup(topic, st.session_state.uploaded_files)
+        payload = build_explanation_payload(topic, level)
+        try:
+            job = submit_job(collect_text, stream_content(payload, regenerate=regenerate, notes=notes))
+        except JobQueueFull as e:
+            st.session_state.explanation_error = str(e)
+            st.session_state.explanation_generating = False
+            st.rerun()
+            return
+        st.session_state.explanation_job_id = job.id
+    
+    if job.done:
+        executor.forget(job.id)
+        st.session_state.pop('explanation_job_id', None)
+        if job.status == DONE and job.result:
+            st.session_state.explanation_output = job.result
+        else:
+            st.session_state.explanation_error = f"AI request failed: {job.error}"
+        st.session_state.explanation_generating = False
+        st.rerun()
+        return
     
-    st.session_state.explanation_generating = False
-    st.rerun()
+    poll_job(job, render_explanation_progress)
 
 
 def display_explanation_results():
@@ -306,48 +422,12 @@ def display_explanation_results():
     
     # Display cards with cleaned content
     for header, content in sections.items():
-        # Clean content before rendering
-        cleaned_content = content
-        
-        # Remove anchor links like [](http://...)
-        cleaned_content = re.sub(r'\[\]\(http[s]?://[^\)]+\)', '', cleaned_content)
-        
-        # Convert <pre> tags to markdown code blocks
-        cleaned_content = re.sub(r'<pre>\s*', '\n```\n', cleaned_content)
-        cleaned_content = re.sub(r'\s*</pre>', '\n```\n', cleaned_content)
-        
-        # Convert <code> tags to inline code markdown
-        cleaned_content = re.sub(r'<code>(.*?)</code>', r'`\1`', cleaned_content)
-        
-        # Convert <strong> tags to markdown bold
-        cleaned_content = re.sub(r'<strong>(.*?)</strong>', r'**\1**', cleaned_content)
-        
-        # Header card
-        st.markdown(f"""
-        <div style="
-            background: linear-gradient(135deg, #1A1A1A 0%, #252525 100%);
-            padding: 1.5rem 1.5rem 0.8rem 1.5rem;
-            border-radius: 15px 15px 0 0;
-            border-left: 5px solid #FFD700;
-            box-shadow: 0 8px 24px rgba(0, 0, 0, 0.4);
-            margin-bottom: 0;
-        ">
-            <h3 style="color: #FFD700; margin: 0; font-size: 1.15rem;">
-                {header}
-            </h3>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        # Content with bordered container (continuous with header)
-        with st.container(border=True):
-            st.markdown(cleaned_content)
-        
-        st.markdown("<br>", unsafe_allow_html=True)
+        render_explanation_card(header, content)
     
     st.markdown("<br>", unsafe_allow_html=True)
     
     # Action buttons
-    col1, col2 = st.columns(2)
+    col1, col2, col3 = st.columns(3)
     
     with col1:
         if st.button("🔄 Explain Another Topic", use_container_width=True, type="secondary"):
@@ -356,6 +436,13 @@ def display_explanation_results():
             st.rerun()
     
     with col2:
+        if st.button("🔁 Regenerate", use_container_width=True, type="secondary", key="regen_explain_btn"):
+            st.session_state.explanation_output = None
+            st.session_state.explanation_regenerate = True
+            st.session_state.explanation_generating = True
+            st.rerun()
+    
+    with col3:
         # Download as text
         cleaned_output = st.session_state.explanation_output.replace('#DEFINITION#', 'DEFINITION:\n')
         cleaned_output = cleaned_output.replace('#EXPLANATION#', '\n\nEXPLANATION:\n')
@@ -363,11 +450,7 @@ def display_explanation_results():
         cleaned_output = cleaned_output.replace('#KEY_POINTS#', '\n\nKEY POINTS:\n')
         
         # Remove HTML tags and anchors from download
-        cleaned_output = re.sub(r'\[\]\(http[s]?://[^\)]+\)', '', cleaned_output)
-        cleaned_output = re.sub(r'<pre>', '\n', cleaned_output)
-        cleaned_output = re.sub(r'</pre>', '\n', cleaned_output)
-        cleaned_output = re.sub(r'<code>(.*?)</code>', r'\1', cleaned_output)
-        cleaned_output = re.sub(r'<strong>(.*?)</strong>', r'\1', cleaned_output)
+        cleaned_output = strip_markup(cleaned_output)
         
         separator = '=' * 60
         
@@ -0,0 +1,121 @@
+import re
+
+import numpy as np
+
+DAMPING = 0.85            # TextRank damping factor (chance of following a similarity edge)
+MAX_ITERATIONS = 50
+TOLERANCE = 1e-6          # Stop iterating once no score moves more than this
+MIN_WORDS = 4             # Shorter sentences (headings, labels, stray lines) are never selected
+
+WORD = re.compile(r"[a-z][a-z'-]{2,}")
+STOP_WORDS = frozenset("""
+    the and for are but not you all any can had her was one our out has him his how its may new now
+    see two who did get let say she too use that with have this will your from they been were said
+    each which their them then there these would other into more some what when than also such only
+    very just over most where after about could should because those while being does here
+""".split())
+
+
+def tfidf_rows(sentences):
+    """Returns (row, column, weight) arrays of the L2-normalized TF-IDF matrix, one row per sentence.
+
+    Terms are lowercased words of three or more letters outside STOP_WORDS; term
+    frequency is damped with 1 + log(tf) so one repeated word cannot dominate a sentence.
+    """
+    vocabulary = {}
+    rows, columns = [], []
+    for row, sentence in enumerate(sentences):
+        for word in WORD.findall(sentence.lower()):
+            if word not in STOP_WORDS:
+                rows.append(row)
+                columns.append(vocabulary.setdefault(word, len(vocabulary)))
+    if not rows:
+        empty = np.zeros(0)
+        return empty.astype(np.int64), empty.astype(np.int64), empty
+
+    terms = len(vocabulary)
+    keys, counts = np.unique(np.array(rows, dtype=np.int64) * terms + np.array(columns, dtype=np.int64),
+                             return_counts=True)
+    rows, columns = keys // terms, keys % terms
+    document_frequency = np.bincount(columns, minlength=terms)
+    idf = np.log((len(sentences) + 1) / (document_frequency + 1)) + 1
+    weights = (1 + np.log(counts)) * idf[columns]
+    norms = np.sqrt(np.bincount(rows, weights=weights ** 2, minlength=len(sentences)))
+    return rows, columns, weights / norms[rows]
+
+
+def textrank_scores(sentences):
+    """Returns one centrality score per sentence (TextRank over TF-IDF cosine similarity).
+
+    The sentence-by-sentence similarity matrix S = X·Xᵀ is never built: every power
+    iteration multiplies by X and Xᵀ as sparse (row, column, weight) arrays, so time
+    and memory grow with the number of words rather than the square of the sentences.
+    """
+    count = len(sentences)
+    if count == 0:
+        return np.zeros(0)
+    rows, columns, weights = tfidf_rows(sentences)
+    terms = int(columns.max()) + 1 if len(columns) else 0
+    has_terms = np.bincount(rows, minlength=count) > 0
+
+    def similarity(vector):
+        # S·v without the diagonal (each non-empty sentence is fully similar to itself).
+        term_totals = np.bincount(columns, weights=weights * vector[rows], minlength=terms)
+        product = np.bincount(rows, weights=weights * term_totals[columns], minlength=count)
+        return product - has_terms * vector
+
+    degree = similarity(np.ones(count))
+    inverse_degree = np.divide(1.0, degree, out=np.zeros(count), where=degree > 1e-12)
+    scores = np.full(count, 1.0 / count)
+    for _ in range(MAX_ITERATIONS):
+        updated = (1 - DAMPING) / count + DAMPING * similarity(scores * inverse_degree)
+        converged = np.abs(updated - scores).max() < TOLERANCE
+        scores = updated
+        if converged:
+            break
+    return scores
+
+
+def select_key_sentences(paragraphs, max_tokens, measure):
+    """Returns (text, stats) keeping the highest-ranked sentences that fit max_tokens, in document order.
+
+    paragraphs is a list of sentence lists; measure(text) returns a token count.
+    Sentences kept from the same paragraph are rejoined with spaces, different
+    paragraphs with blank lines. Repeats of a kept sentence are skipped: TextRank
+    favours repeated text, which adds tokens but nothing new.
+    """
+    sentences = [sentence for paragraph in paragraphs for sentence in paragraph]
+    paragraph_of = [index for index, paragraph in enumerate(paragraphs) for _ in paragraph]
+    tokens = np.array([measure(sentence) for sentence in sentences], dtype=np.int64)
+    scores = textrank_scores(sentences)
+    eligible = np.array([len(sentence.split()) >= MIN_WORDS for sentence in sentences], dtype=bool)
+
+    kept = np.zeros(len(sentences), dtype=bool)
+    seen = set()
+    remaining = max_tokens
+    for index in np.argsort(-scores, kind='stable'):
+        if eligible[index] and tokens[index] <= remaining:
+            key = ' '.join(sentences[index].lower().split())
+            if key in seen:
+                continue
+            seen.add(key)
+            kept[index] = True
+            remaining -= tokens[index]
+            if remaining <= 0:
+                break
+
+    parts = []
+    previous = None
+    for index in np.flatnonzero(kept):
+        if parts:
+            parts.append(' ' if paragraph_of[index] == previous else '\n\n')
+        parts.append(sentences[index])
+        previous = paragraph_of[index]
+    text = ''.join(parts)
+    stats = {
+        "sentences_total": len(sentences),
+        "sentences_kept": int(kept.sum()),
+        "tokens_before": int(tokens.sum()),
+        "tokens_after": int(tokens[kept].sum()),
+    }
+    return text, stats
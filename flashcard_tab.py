@@ -1,5 +1,6 @@
 import streamlit as st
-from utils import generate_structured_flashcards
+from utils import stream_flashcards, get_job_executor, submit_job, job_status_text, cancel_job, notes_lookup
+from jobs import JobQueueFull, collect_items, poll_job
 
 
 # --- CUSTOM CSS FOR FLASHCARDS ---
@@ -72,13 +73,75 @@ def flip_card():
 
 
 def reset_flashcards():
-    """Clears all flashcard-related state variables to return to the setup form."""
+    """Clears all flashcard-related state variables to return to the setup form, aborting any cards still generating."""
+    cancel_job(st.session_state.get('flashcard_job_id'))
     st.session_state.pop('flashcard_data', None)
     st.session_state.pop('card_current_index', None)
     st.session_state.pop('card_side', None)
     st.session_state.pop('flashcard_topic', None)
     st.session_state.pop('flashcard_type', None)
+    st.session_state.pop('flashcard_use_notes', None)
     st.session_state.pop('flashcard_generating', None)
+    st.session_state.pop('flashcard_job_id', None)
+
+
+def cancel_flashcard_generation():
+    """Aborts a deck that is still loading its first card; a deck already being studied is left alone."""
+    if st.session_state.get('flashcard_generating'):
+        cancel_job(st.session_state.pop('flashcard_job_id', None))
+        st.session_state.flashcard_generating = False
+
+
+def sync_streamed_cards():
+    """Appends cards that the background job produced since the last rerun."""
+    executor = get_job_executor()
+    job = executor.get(st.session_state.get('flashcard_job_id'))
+    if job is None:
+        st.session_state.pop('flashcard_job_id', None)
+        return
+    
+    new_cards = job.items[len(st.session_state.flashcard_data):]
+    if new_cards:
+        st.session_state.flashcard_data.extend(new_cards)
+    
+    if job.done and len(job.items) == len(st.session_state.flashcard_data):
+        executor.forget(job.id)
+        st.session_state.pop('flashcard_job_id', None)
+
+
+def render_flashcard_progress(job):
+    """Shows the loading card until the first flashcard streams in, then opens the deck."""
+    if job.items:
+        st.rerun()
+    
+    st.markdown(f"""
+    <div style="
+        padding: 2rem 1rem;
+        text-align: center;
+    ">
+        <div style="margin-bottom: 2rem;">
+            <div style="
+                border: 4px solid #333333;
+                border-top: 4px solid #FFD700;
+                border-radius: 50%;
+                width: 60px;
+                height: 60px;
+                animation: spin 1s linear infinite;
+                margin: 0 auto;
+            "></div>
+        </div>
+        <h3 style="color: #FFD700; margin: 0;">🔄 Generating Flashcards...</h3>
+        <p style="color: #CCCCCC; margin-top: 0.5rem;">Please wait while we create your study materials</p>
+        <p style="color: #999999; margin-top: 0.5rem; font-size: 0.9rem;">{job_status_text(job)}</p>
+    </div>
+    
+    <style>
+    @keyframes spin {{
+        0% {{ transform: rotate(0deg); }}
+        100% {{ transform: rotate(360deg); }}
+    }}
+    </style>
+    """, unsafe_allow_html=True)
 
 
 def display_flashcard_deck():
@@ -89,6 +152,7 @@ def display_flashcard_deck():
         return
 
     inject_flashcard_css()
+    sync_streamed_cards()
 
     data = st.session_state.flashcard_data
     current_idx = st.session_state.card_current_index
@@ -200,6 +264,20 @@ def display_flashcard_deck():
     progress = (current_idx + 1) / len(data)
     st.progress(progress)
     
+    # More cards are still streaming in from the background job
+    job = get_job_executor().get(st.session_state.get('flashcard_job_id'))
+    if job is not None:
+        remaining = st.session_state.get('flashcard_num_cards', len(data)) - len(data)
+        if remaining > 0:
+            st.caption(f"⏳ {remaining} more card{'s' if remaining != 1 else ''} on the way...")
+        available = len(data)
+        
+        def rerun_when_ready(job):
+            if len(job.items) > available:
+                st.rerun()
+        
+        poll_job(job, rerun_when_ready)
+    
     st.markdown("<br>", unsafe_allow_html=True)
 
     # CAROUSEL with 3 cards visible (or 1 on mobile)
@@ -402,63 +480,44 @@ def feature_generate_flashcards():
     # SINGLE container - shows different content based on state
     with st.container(border=True):
         if st.session_state.flashcard_generating:
-            # LOADING VIEW
-            st.markdown("""
-            <div style="
-                padding: 2rem 1rem;
-                text-align: center;
-            ">
-                <div style="margin-bottom: 2rem;">
-                    <div style="
-                        border: 4px solid #333333;
-                        border-top: 4px solid #FFD700;
-                        border-radius: 50%;
-                        width: 60px;
-                        height: 60px;
-                        animation: spin 1s linear infinite;
-                        margin: 0 auto;
-                    "></div>
-                </div>
-                <h3 style="color: #FFD700; margin: 0;">🔄 Generating Flashcards...</h3>
-                <p style="color: #CCCCCC; margin-top: 0.5rem;">Please wait while we create your study materials</p>
-            </div>
+            # LOADING VIEW: cards stream in from a background job; show the deck as soon as the first one is ready
+            executor = get_job_executor()
+            job = executor.get(st.session_state.get('flashcard_job_id'))
             
-            <style>
-            @keyframes spin {
-                0% { transform: rotate(0deg); }
-                100% { transform: rotate(360deg); }
-            }
-            </style>
-            """, unsafe_allow_html=True)
-            
-            # Actually do the generation
-            topic = st.session_state.flashcard_topic
-            card_type = st.session_state.flashcard_type
-            num_cards = st.session_state.get('flashcard_num_cards', 5)
-            
-            flashcard_data = generate_structured_flashcards(topic, num_cards)
-
-            if flashcard_data and len(flashcard_data) > 0:
-                valid_cards = [
-                    card for card in flashcard_data 
-                    if card.get('question') and card.get('answer')
-                ]
-                
-                if valid_cards:
-                    st.session_state.flashcard_data = valid_cards
-                    st.session_state.card_current_index = 0
-                    st.session_state.card_side = 'Q'
-                    st.session_state.flashcard_generating = False
-                    st.rerun()
-                else:
+            if job is None:
+                topic = st.session_state.flashcard_topic
+                num_cards = st.session_state.get('flashcard_num_cards', 5)
+                notes = None
+                if st.session_state.get('flashcard_use_notes') and st.session_state.get('uploaded_files'):
+                    notes = notes_lookup(topic, st.session_state.uploaded_files)
+                try:
+                    job = submit_job(collect_items, stream_flashcards(topic, num_cards, notes=notes))
+                except JobQueueFull as e:
                     st.session_state.flashcard_generating = False
+                    st.session_state.flashcard_error = str(e)
                     st.rerun()
-            else:
+                st.session_state.flashcard_job_id = job.id
+
+            if job.items:
+                st.session_state.flashcard_data = list(job.items)
+                st.session_state.card_current_index = 0
+                st.session_state.card_side = 'Q'
+                st.session_state.flashcard_generating = False
+                st.rerun()
+            elif job.done:
+                executor.forget(job.id)
+                st.session_state.pop('flashcard_job_id', None)
                 st.session_state.flashcard_generating = False
+                st.session_state.flashcard_error = job.error or "No flashcards were generated. Please try again."
                 st.rerun()
+            
+            poll_job(job, render_flashcard_progress)
         
         else:
             # SETUP FORM VIEW
+            if st.session_state.get('flashcard_error'):
+                st.error(f"❌ Flashcard generation failed: {st.session_state.pop('flashcard_error')}")
+            
             st.markdown('<h3 style="color: #FFD700; margin-top: 0; margin-bottom: 1.5rem; font-size: 1.3rem;">🎴 Setup Your Flashcards</h3>', unsafe_allow_html=True)
             
             topic = st.text_area(
@@ -507,6 +566,14 @@ div[data-baseweb="select"] input {
                     help="Choose between 1-20 flashcards"
                 )
             
+            uploads = st.session_state.get('uploaded_files') or []
+            use_notes = uploads and st.checkbox(
+                f"📎 Use my uploaded notes ({len(uploads)} file{'s' if len(uploads) > 1 else ''})",
+                value=True,
+                key='flashcard_use_notes_input',
+                help="Sends only the passages of your uploaded files that match the topic"
+            )
+            
             st.markdown("<br>", unsafe_allow_html=True)
             
             col_left, col_center, col_right = st.columns([1, 2, 1])
@@ -518,6 +585,7 @@ div[data-baseweb="select"] input {
                         st.session_state.flashcard_topic = topic
                         st.session_state.flashcard_type = card_type
                         st.session_state.flashcard_num_cards = num_cards
+                        st.session_state.flashcard_use_notes = bool(use_notes)
                         st.rerun()
                     else:
                         st.warning("⚠️ Please enter a topic or notes.")
@@ -0,0 +1,568 @@
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from token_budget import TokenEstimator
+
+# --- Connection Pool Defaults ---
+POOL_CONNECTIONS = 4      # Number of distinct hosts to keep pools for
+POOL_MAXSIZE = 32         # Max keep-alive sockets per host
+CONNECT_TIMEOUT = 5       # Seconds to establish TCP+TLS
+READ_TIMEOUT = 120        # Seconds to wait for the model to respond
+
+# --- Retry Defaults ---
+MAX_RETRIES = 5           # Total attempts per call
+BASE_DELAY = 1            # Smallest backoff sleep in seconds
+MAX_DELAY = 20            # Largest single backoff sleep in seconds
+DEADLINE = 90             # Total seconds a single call may take, retries included
+
+# --- Token Estimates ---
+DEFAULT_OUTPUT_TOKENS = 1024  # Output allowance charged when a payload sets no maxOutputTokens
+
+# --- Single Flight ---
+FOLLOW_POLL = 0.25            # Seconds between cancellation checks while waiting on another caller's request
+
+# --- Circuit Breaker Defaults ---
+FAILURE_THRESHOLD = 5     # Consecutive upstream failures before the circuit opens
+RECOVERY_TIMEOUT = 30     # Seconds to fail fast before letting a probe through
+
+# Payload fields that determine the model's output; anything else is transport detail.
+CACHE_KEY_FIELDS = ("model", "systemInstruction", "contents", "generationConfig")
+
+# Status codes that indicate a transient upstream problem worth retrying.
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+# Status codes that count against upstream health (429 is quota, not an outage).
+UNHEALTHY_STATUS = {500, 502, 503, 504}
+
+
+# --- Errors ---
+
+class GeminiError(Exception):
+    """Base class for all errors raised by the Gemini client."""
+
+
+class GeminiAPIError(GeminiError):
+    """The API rejected the request with a non-retryable status, or retries ran out."""
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class GeminiResponseError(GeminiError):
+    """The API answered but the body did not contain usable content."""
+
+
+class InputTooLargeError(GeminiError):
+    """The prompt is estimated to exceed the client's input budget, so it was not sent."""
+
+    def __init__(self, message, tokens, limit):
+        super().__init__(message)
+        self.tokens = tokens
+        self.limit = limit
+
+
+class CircuitOpenError(GeminiError):
+    """The circuit breaker is open, so the request was not sent."""
+
+
+class DeadlineExceededError(GeminiError):
+    """The call could not complete within its total time budget."""
+
+
+class GenerationCancelled(GeminiError):
+    """The caller cancelled the request; any pending backoff or open stream was abandoned."""
+
+
+# --- Circuit Breaker ---
+
+class CircuitBreaker:
+    """Thread-safe closed/open/half-open breaker shared by every caller of the client."""
+
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, recovery_timeout=RECOVERY_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._probe_in_flight = False
+
+    @property
+    def state(self):
+        """Returns 'closed', 'open' or 'half-open'."""
+        with self._lock:
+            return self._state_locked()
+
+    def _state_locked(self):
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.recovery_timeout:
+            return "half-open"
+        return "open"
+
+    def allow_request(self):
+        """Returns True if a request may be sent now; only one probe is let through when half-open."""
+        with self._lock:
+            state = self._state_locked()
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def retry_in(self):
+        """Returns the seconds left until the breaker lets a probe through."""
+        with self._lock:
+            if self._opened_at is None:
+                return 0
+            return max(0.0, self.recovery_timeout - (time.monotonic() - self._opened_at))
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probe_in_flight or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+    def release_probe(self):
+        """Frees the half-open probe slot when a call ends without a health verdict."""
+        with self._lock:
+            self._probe_in_flight = False
+
+
+# --- Single Flight ---
+
+GONE = threading.Event()      # Stands in for the cancel_event of a caller that stopped reading
+GONE.set()
+
+
+class Flight:
+    """One upstream generation shared by every concurrent caller with the same payload.
+
+    The leader publishes chunks as they stream in; followers replay them from the start.
+    The upstream call is only cancelled once every subscriber has cancelled or left. A
+    leader that stops reading while followers still wait hands the stream to a thread
+    that drains it for them.
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.subscribers = []     # Each caller's cancel_event (None for callers that cannot cancel)
+        self._cond = threading.Condition()
+
+    def is_set(self):
+        """True once every subscriber has cancelled; lets the flight stand in for a cancel_event."""
+        with self._cond:
+            return all(event is not None and event.is_set() for event in self.subscribers)
+
+    def wait(self, timeout):
+        """Sleeps up to timeout seconds, returning True early if every subscriber cancels."""
+        give_up_at = time.monotonic() + timeout
+        while not self.is_set():
+            remaining = give_up_at - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(remaining, FOLLOW_POLL))
+        return True
+
+    def subscribe(self, cancel_event):
+        """Adds a caller and returns its index, for leave()."""
+        with self._cond:
+            self.subscribers.append(cancel_event)
+            return len(self.subscribers) - 1
+
+    def leave(self, index):
+        """Marks a caller that stopped reading as gone, as if it had cancelled."""
+        with self._cond:
+            self.subscribers[index] = GONE
+
+    def publish(self, chunk):
+        with self._cond:
+            self.chunks.append(chunk)
+            self._cond.notify_all()
+
+    def finish(self, error=None):
+        with self._cond:
+            self.done = True
+            self.error = error
+            self._cond.notify_all()
+
+    def follow(self, cancel_event=None):
+        """Yields the flight's chunks as they arrive, re-raising the leader's error if it failed."""
+        sent = 0
+        while True:
+            with self._cond:
+                while sent == len(self.chunks) and not self.done:
+                    if cancel_event is not None and cancel_event.is_set():
+                        raise GenerationCancelled("Generation cancelled.")
+                    self._cond.wait(FOLLOW_POLL)
+                pending = self.chunks[sent:]
+                finished, error = self.done, self.error
+            for chunk in pending:
+                yield chunk
+            sent += len(pending)
+            if finished and sent == len(self.chunks):
+                if error is not None:
+                    raise error
+                return
+
+
+# --- Helpers ---
+
+def parse_retry_after(response):
+    """Returns the server's requested wait in seconds, or None if it gave no hint."""
+    header = response.headers.get('Retry-After')
+    if header:
+        try:
+            return max(0.0, float(header))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(header).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+
+    # Gemini also reports the hint as a google.rpc.RetryInfo detail, e.g. "retryDelay": "12s".
+    try:
+        details = response.json().get('error', {}).get('details', [])
+    except ValueError:
+        return None
+    for detail in details:
+        delay = detail.get('retryDelay') if isinstance(detail, dict) else None
+        if isinstance(delay, str) and delay.endswith('s'):
+            try:
+                return max(0.0, float(delay[:-1]))
+            except ValueError:
+                pass
+    return None
+
+
+def payload_key(payload):
+    """Returns a canonical SHA-256 of the fields of a payload that affect the generated output."""
+    canonical = {field: payload.get(field) for field in CACHE_KEY_FIELDS}
+    encoded = json.dumps(canonical, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+def stream_url_for(api_url):
+    """Derives the streamGenerateContent endpoint from a generateContent URL."""
+    return api_url.replace(':generateContent', ':streamGenerateContent')
+
+
+def extract_stream_text(event):
+    """Returns the text carried by one streamGenerateContent event (may be empty)."""
+    candidates = event.get('candidates') or []
+    if not candidates:
+        return ''
+    parts = (candidates[0].get('content') or {}).get('parts') or []
+    return ''.join(part.get('text', '') for part in parts)
+
+
+# --- Client ---
+
+class GeminiClient:
+    """Process-wide Gemini API client with pooled connections, classified retries and a circuit breaker.
+
+    When a limiter is given, every attempt (retries included) waits for admission first.
+    Concurrent calls with the same canonical payload share one upstream request.
+    Prompts are sized locally by estimator before sending: anything over
+    max_input_tokens is refused, and the usageMetadata of each response calibrates
+    the estimator.
+    """
+
+    def __init__(
+        self,
+        api_key,
+        api_url,
+        stream_url=None,
+        pool_connections=POOL_CONNECTIONS,
+        pool_maxsize=POOL_MAXSIZE,
+        connect_timeout=CONNECT_TIMEOUT,
+        read_timeout=READ_TIMEOUT,
+        max_retries=MAX_RETRIES,
+        base_delay=BASE_DELAY,
+        max_delay=MAX_DELAY,
+        deadline=DEADLINE,
+        breaker=None,
+        cache=None,
+        limiter=None,
+        estimator=None,
+        max_input_tokens=None,
+    ):
+        self.api_key = api_key
+        self.api_url = api_url
+        self.stream_url = stream_url or stream_url_for(api_url)
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.breaker = breaker or CircuitBreaker()
+        self.cache = cache
+        self.limiter = limiter
+        self.estimator = estimator or TokenEstimator()
+        self.max_input_tokens = max_input_tokens
+        self.coalesced = 0        # Calls served by joining another caller's in-flight request
+        self._flights = {}
+        self._flights_lock = threading.Lock()
+
+        # pool_block keeps us at pool_maxsize sockets per host instead of
+        # opening throwaway connections that are closed after a single use.
+        adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=True,
+            max_retries=0,
+        )
+        self._session = requests.Session()
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+        self._session.headers.update({
+            'Content-Type': 'application/json',
+            'Connection': 'keep-alive',
+        })
+
+    def generate(self, payload, use_cache=True, cancel_event=None, ticket=None):
+        """Returns the generated text for payload, served from the response cache when possible.
+
+        The response is read as a stream, so setting cancel_event stops the call at its
+        next chunk (or pending backoff) and raises GenerationCancelled instead of
+        holding the caller until the whole body has arrived. With use_cache=False the
+        cache is not read (a forced regenerate), but the fresh result still replaces
+        the cached one. ticket identifies the caller to the rate limiter.
+        """
+        return ''.join(self.stream(payload, use_cache=use_cache, cancel_event=cancel_event, ticket=ticket))
+
+    def stream(self, payload, use_cache=True, cancel_event=None, ticket=None):
+        """Yields text chunks from streamGenerateContent as the model produces them.
+
+        Retries only happen before the first chunk is delivered; a cached response
+        is yielded as a single chunk. Setting cancel_event closes the connection at
+        the next chunk (or wakes any backoff sleep) and raises GenerationCancelled.
+        """
+        key = payload_key(payload)
+        if self.cache is not None and use_cache:
+            cached = self.cache.get(key)
+            if cached is not None:
+                yield cached
+                return
+
+        flight, leader, index = self._join_flight(key, cancel_event)
+        if not leader:
+            try:
+                yield from flight.follow(cancel_event)
+            finally:
+                flight.leave(index)
+            return
+
+        upstream = self._stream_upstream(payload, key, flight, ticket)
+        try:
+            for chunk in upstream:
+                flight.publish(chunk)
+                yield chunk
+        except GeneratorExit:
+            flight.leave(index)
+            with self._flights_lock:
+                # Decided under the lock, so nobody joins a flight that is about to be abandoned.
+                abandoned = flight.is_set()
+                if abandoned and self._flights.get(key) is flight:
+                    del self._flights[key]
+            if abandoned:
+                upstream.close()
+                flight.finish(GeminiAPIError("The shared request was abandoned before it finished."))
+            else:
+                # Followers are still waiting: keep reading the response for them.
+                threading.Thread(
+                    target=self._drain, args=(key, flight, upstream), daemon=True, name="mybuddy-flight",
+                ).start()
+            raise
+        except BaseException as e:
+            self._land(key, flight, e)
+            raise
+        self._land(key, flight)
+
+    def _drain(self, key, flight, upstream):
+        """Publishes the rest of an abandoned leader's stream to the followers of its flight."""
+        try:
+            for chunk in upstream:
+                flight.publish(chunk)
+        except BaseException as e:
+            self._land(key, flight, e)
+            return
+        self._land(key, flight)
+
+    def _stream_upstream(self, payload, key, cancel_event, ticket):
+        counted, tokens = self._budget(payload)
+        response = self._request(
+            self.stream_url, json.dumps(payload), stream=True,
+            cancel_event=cancel_event, ticket=ticket, tokens=tokens,
+        )
+        # SSE responses often omit a charset and requests would fall back to Latin-1.
+        response.encoding = 'utf-8'
+        parts = []
+        usage = None
+        try:
+            for line in response.iter_lines(decode_unicode=True):
+                if cancel_event.is_set():
+                    raise GenerationCancelled("Generation cancelled.")
+                if not line or not line.startswith('data:'):
+                    continue
+                try:
+                    event = json.loads(line[len('data:'):])
+                except ValueError as e:
+                    raise GeminiResponseError(f"Invalid stream event from API: {e}") from e
+                usage = event.get('usageMetadata') or usage
+                chunk = extract_stream_text(event)
+                if chunk:
+                    parts.append(chunk)
+                    yield chunk
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                requests.exceptions.ChunkedEncodingError) as e:
+            self.breaker.record_failure()
+            raise GeminiAPIError(f"Stream interrupted: {e}") from e
+        finally:
+            # Closing a partially read stream drops the socket, aborting the generation upstream.
+            response.close()
+
+        self._record_usage(counted, usage)
+        if not parts:
+            raise GeminiResponseError("No candidates returned.")
+        if self.cache is not None:
+            self.cache.set(key, ''.join(parts))
+
+    def _join_flight(self, key, cancel_event):
+        """Returns (flight, leader, index): the in-flight request for key, whether this caller sends it, and its subscriber index."""
+        with self._flights_lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = Flight()
+            else:
+                self.coalesced += 1
+            index = flight.subscribe(cancel_event)
+        return flight, leader, index
+
+    def _land(self, key, flight, error=None):
+        # Results are cached before this runs, so a caller arriving after removal hits the cache.
+        flight.finish(error)
+        with self._flights_lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+    def _budget(self, payload):
+        """Returns (uncalibrated prompt count, tokens to charge the limiter), refusing prompts over budget."""
+        counted = self.estimator.count_payload(payload)
+        prompt = math.ceil(counted * self.estimator.ratio)
+        if self.max_input_tokens and prompt > self.max_input_tokens:
+            raise InputTooLargeError(
+                f"This request is too long to send (about {prompt:,} tokens; the limit is {self.max_input_tokens:,}).",
+                prompt, self.max_input_tokens,
+            )
+        output = (payload.get('generationConfig') or {}).get('maxOutputTokens', DEFAULT_OUTPUT_TOKENS)
+        return counted, prompt + output
+
+    def _record_usage(self, counted, usage):
+        if usage:
+            self.estimator.observe(counted, usage.get('promptTokenCount'))
+
+    def _request(self, url, body, stream=False, cancel_event=None, ticket=None, tokens=0):
+        """POSTs body to url with classified retries and returns the first successful response."""
+        give_up_at = time.monotonic() + self.deadline
+        delay = self.base_delay
+        last_error = None
+
+        for attempt in range(self.max_retries):
+            if cancel_event is not None and cancel_event.is_set():
+                raise GenerationCancelled("Generation cancelled.")
+            if not self.breaker.allow_request():
+                raise CircuitOpenError(
+                    f"Gemini API is temporarily unavailable. Try again in {math.ceil(self.breaker.retry_in())}s."
+                )
+
+            remaining = give_up_at - time.monotonic()
+            if remaining <= 0:
+                self.breaker.release_probe()
+                break
+
+            if self.limiter is not None:
+                if not self.limiter.acquire(ticket, tokens, timeout=remaining, cancel_event=cancel_event):
+                    self.breaker.release_probe()
+                    if cancel_event is not None and cancel_event.is_set():
+                        raise GenerationCancelled("Generation cancelled.")
+                    raise DeadlineExceededError(
+                        f"MyBuddy is at its request quota; no slot opened up within {self.deadline}s."
+                    )
+                remaining = give_up_at - time.monotonic()
+
+            retry_after = None
+            try:
+                response = self._session.post(
+                    url,
+                    params={'key': self.api_key, **({'alt': 'sse'} if stream else {})},
+                    data=body,
+                    timeout=(self.connect_timeout, min(self.read_timeout, remaining)),
+                    stream=stream,
+                )
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                self.breaker.record_failure()
+                last_error = GeminiAPIError(f"Network error: {e}")
+            else:
+                status = response.status_code
+                if status < 400:
+                    self.breaker.record_success()
+                    return response
+                retry_after = parse_retry_after(response)
+                response.close()
+                if status in RETRYABLE_STATUS:
+                    if status in UNHEALTHY_STATUS:
+                        self.breaker.record_failure()
+                    else:
+                        self.breaker.release_probe()
+                    last_error = GeminiAPIError(f"API returned HTTP {status}.", status)
+                else:
+                    # The upstream is healthy; the request itself is wrong.
+                    self.breaker.record_success()
+                    raise GeminiAPIError(f"API rejected the request (HTTP {status}).", status)
+
+            if attempt == self.max_retries - 1:
+                break
+
+            # Decorrelated jitter spreads sessions apart instead of retrying in lockstep,
+            # but a server-provided Retry-After always wins.
+            delay = min(self.max_delay, random.uniform(self.base_delay, delay * 3))
+            sleep_for = retry_after if retry_after is not None else delay
+            if last_error.status_code == 429 and self.limiter is not None:
+                # Quota is shared, so everyone waiting on the limiter backs off too.
+                self.limiter.throttle(sleep_for)
+            if time.monotonic() + sleep_for >= give_up_at:
+                raise DeadlineExceededError(
+                    f"Gave up after {attempt + 1} attempt(s); the API did not recover within {self.deadline}s."
+                )
+            if cancel_event is None:
+                time.sleep(sleep_for)
+            elif cancel_event.wait(sleep_for):
+                raise GenerationCancelled("Generation cancelled.")
+
+        if time.monotonic() >= give_up_at:
+            raise DeadlineExceededError(f"Request did not complete within {self.deadline}s.")
+        raise last_error or GeminiAPIError("Max retries reached. API request failed.")
+
+    def close(self):
+        """Closes all pooled connections."""
+        self._session.close()
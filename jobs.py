@@ -0,0 +1,202 @@
+import itertools
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit as st
+
+POLL_INTERVAL = 0.5        # Seconds between UI checks on a running job
+JOB_RETENTION = 10 * 60    # Seconds a finished job stays available to the session that submitted it
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = {DONE, FAILED, CANCELLED}
+
+
+class JobQueueFull(Exception):
+    """Every worker is busy and the wait queue is at its configured depth."""
+
+
+class Job:
+    """One generation running on the shared executor; the UI reads its progress between reruns."""
+
+    def __init__(self, seq):
+        self.id = uuid.uuid4().hex
+        self.seq = seq
+        self.status = QUEUED
+        self.items = []        # Structured items streamed so far (quiz questions, flashcards)
+        self.partial = ""      # Text streamed so far (explanations, summaries)
+        self.progress = ""     # One-line description of what the job is doing right now
+        self.meta = {}         # Extra outputs a job body hands back to its tab
+        self.result = None
+        self.error = None
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+        self.ticket = None     # Rate-limiter ticket for the job's API calls, if any
+        self._future = None
+        self._released = False
+
+    @property
+    def done(self):
+        return self.status in FINISHED
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def emit(self, item):
+        """Publishes one completed item to the UI."""
+        self.items.append(item)
+
+    def publish(self, text):
+        """Publishes the text generated so far to the UI."""
+        self.partial = text
+
+    def report(self, progress):
+        """Publishes a progress line for the loading view."""
+        self.progress = progress
+
+
+class JobExecutor:
+    """Bounded thread pool that runs generation jobs off the Streamlit script thread."""
+
+    def __init__(self, workers, queue_depth, retention=JOB_RETENTION):
+        self.workers = workers
+        self.queue_depth = queue_depth
+        self.retention = retention
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="mybuddy-job")
+        self._capacity = threading.BoundedSemaphore(workers + queue_depth)
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._seq = itertools.count()
+
+    def submit(self, fn, *args, ticket=None, **kwargs):
+        """Queues fn(job, *args, **kwargs) and returns its Job; raises JobQueueFull when saturated.
+
+        ticket is the rate-limiter ticket the job's API calls should use (see job.ticket).
+        """
+        if not self._capacity.acquire(blocking=False):
+            raise JobQueueFull("MyBuddy is busy right now. Please try again in a moment.")
+
+        job = Job(next(self._seq))
+        job.ticket = ticket
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+        job._future = self._pool.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def get(self, job_id):
+        """Returns the job with job_id, or None if it is unknown or has expired."""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """Cancels a queued or running job and hands its slot back to the pool straight away.
+
+        A queued job never starts. A running job is signalled through job.cancel_event
+        and stops at its next checkpoint (a streamed chunk or a backoff wakeup).
+        """
+        job = self.get(job_id)
+        if job is None or job.done:
+            return
+        job.cancel_event.set()
+        if job._future is not None:
+            job._future.cancel()
+        job.finished_at = time.monotonic()
+        job.status = CANCELLED
+        self._release(job)
+
+    def forget(self, job_id):
+        """Drops a finished job once its result has been consumed."""
+        with self._lock:
+            self._jobs.pop(job_id, None)
+
+    def queue_position(self, job):
+        """Returns how many jobs will start before this one (0 once it is running)."""
+        if job.status != QUEUED:
+            return 0
+        with self._lock:
+            return sum(1 for other in self._jobs.values() if other.status == QUEUED and other.seq < job.seq)
+
+    def stats(self):
+        """Returns job counts by status plus the configured limits."""
+        with self._lock:
+            counts = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0, CANCELLED: 0}
+            for job in self._jobs.values():
+                counts[job.status] += 1
+        return {**counts, "workers": self.workers, "queue_depth": self.queue_depth}
+
+    def _run(self, job, fn, args, kwargs):
+        if job.cancelled:
+            return
+        job.status = RUNNING
+        try:
+            result = fn(job, *args, **kwargs)
+        except Exception as e:  # Surfaced to the user by the tab that owns the job
+            if not job.cancelled:
+                job.error = str(e) or e.__class__.__name__
+                self._finish(job, FAILED)
+        else:
+            if not job.cancelled:
+                job.result = result
+                self._finish(job, DONE)
+        finally:
+            self._release(job)
+
+    def _finish(self, job, status):
+        # finished_at is set first, so a job that reads as done always has one.
+        job.finished_at = time.monotonic()
+        job.status = status
+
+    def _release(self, job):
+        with self._lock:
+            if job._released:
+                return
+            job._released = True
+        self._capacity.release()
+
+    def _prune(self):
+        cutoff = time.monotonic() - self.retention
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.done and job.finished_at is not None and job.finished_at < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+
+# --- Job Bodies ---
+
+def collect_text(job, open_stream):
+    """Job body that accumulates streamed text chunks, publishing the text so far.
+
+    open_stream(cancel_event=..., ticket=...) must return the chunk iterator; it is opened
+    inside the worker so the job's cancel event and ticket reach the request.
+    """
+    parts = []
+    for chunk in open_stream(cancel_event=job.cancel_event, ticket=job.ticket):
+        parts.append(chunk)
+        job.publish(''.join(parts))
+    return job.partial
+
+
+def collect_items(job, open_stream):
+    """Job body that publishes each streamed item as soon as it is complete."""
+    for item in open_stream(cancel_event=job.cancel_event, ticket=job.ticket):
+        job.emit(item)
+    return list(job.items)
+
+
+# --- UI Polling ---
+
+@st.fragment(run_every=POLL_INTERVAL)
+def poll_job(job, render_progress):
+    """Re-renders a running job via render_progress(job) each tick and reruns the app once it finishes."""
+    if job.done:
+        st.rerun()
+    render_progress(job)
@@ -0,0 +1,58 @@
+import json
+
+
+class JsonItemStream:
+    """Incrementally parses streamed JSON, emitting each object at item_depth as soon as it closes.
+
+    item_depth=1 yields the elements of a top-level array (e.g. QUIZ_SCHEMA output);
+    item_depth=2 yields objects nested one level further, such as the items of an
+    array stored under a key of a top-level object.
+    """
+
+    def __init__(self, item_depth=1):
+        self.item_depth = item_depth
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._item = None          # list of chunk slices for the object being captured
+        self._started = False
+
+    @property
+    def complete(self):
+        """True once the top-level JSON value has been closed."""
+        return self._started and self._depth == 0 and not self._in_string
+
+    def feed(self, chunk):
+        """Consumes the next piece of text and returns the objects completed by it."""
+        completed = []
+        capture_from = 0 if self._item is not None else None
+
+        for i, char in enumerate(chunk):
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == '\\':
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if char == '"':
+                self._in_string = True
+            elif char in '[{':
+                if char == '{' and self._depth == self.item_depth and self._item is None:
+                    self._item = []
+                    capture_from = i
+                self._depth += 1
+                self._started = True
+            elif char in ']}':
+                self._depth -= 1
+                if self._item is not None and self._depth == self.item_depth:
+                    self._item.append(chunk[capture_from:i + 1])
+                    completed.append(json.loads(''.join(self._item)))
+                    self._item = None
+                    capture_from = None
+
+        if self._item is not None and capture_from is not None:
+            self._item.append(chunk[capture_from:])
+        return completed
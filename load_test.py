@@ -0,0 +1,158 @@
+"""Drives N concurrent simulated sessions through the explain, summarize, quiz and flashcard flows.
+
+Each session submits its generations through the same job pool, rate limiter and Gemini
+client the tabs use, against mock_gemini_server.py unless --url is given, and the run
+reports throughput plus p50/p95/p99 latencies per flow.
+
+    python load_test.py --sessions 50 --latency lognormal:0.0,0.5 --error-429 0.05
+"""
+import argparse
+import os
+import threading
+import time
+import uuid
+
+from mock_gemini_server import MockConfig, start_mock_server
+
+FLOWS = ("explain", "summarize", "quiz", "flashcards")
+POLL_SECONDS = 0.02       # How often a simulated session checks its job
+SAMPLE_NOTES = (
+    "Photosynthesis converts light energy into chemical energy. Chlorophyll in the chloroplasts absorbs "
+    "light, water is split to release oxygen, and the Calvin cycle fixes carbon dioxide into glucose. "
+) * 8
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of values (0 for an empty list)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, int(round(pct / 100 * len(ordered) + 0.5)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def run_flow(flow, topic, session_id):
+    """Submits one generation the way its tab does and waits for it; returns (first_output_s, total_s)."""
+    from explain_tab import build_explanation_payload
+    from summarize_tab import build_section_payload, build_summary_payload
+    from jobs import DONE, collect_items, collect_text
+    from rate_limiter import Ticket
+    from summary_pipeline import summarize_document
+    from utils import (
+        get_gemini_client, get_job_executor, get_section_pool,
+        stream_content, stream_flashcards, stream_quiz_questions,
+    )
+
+    if flow == "explain":
+        args = (collect_text, stream_content(build_explanation_payload(topic, "Intermediate")))
+    elif flow == "summarize":
+        args = (summarize_document, get_gemini_client(), [f"{topic}\n\n{SAMPLE_NOTES}"],
+                build_summary_payload, build_section_payload, get_section_pool())
+    elif flow == "quiz":
+        args = (collect_items, stream_quiz_questions(topic, "Intermediate", 5))
+    else:
+        args = (collect_items, stream_flashcards(topic, 5))
+
+    started = time.monotonic()
+    job = get_job_executor().submit(*args, ticket=Ticket(session_id))
+    first_output = None
+    while not job.done:
+        if first_output is None and (job.partial or job.items):
+            first_output = time.monotonic() - started
+        time.sleep(POLL_SECONDS)
+    total = time.monotonic() - started
+    if job.status != DONE:
+        raise RuntimeError(job.error or job.status)
+    return first_output if first_output is not None else total, total
+
+
+def run_session(index, iterations, shared_topic, results, lock):
+    session_id = uuid.uuid4().hex
+    for iteration in range(iterations):
+        topic = shared_topic or f"Topic {index}-{iteration}"
+        for flow in FLOWS:
+            try:
+                first, total = run_flow(flow, topic, session_id)
+            except Exception as e:
+                with lock:
+                    results[flow]["errors"].append(str(e))
+            else:
+                with lock:
+                    results[flow]["first"].append(first)
+                    results[flow]["total"].append(total)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=20, help="Concurrent simulated users")
+    parser.add_argument("--iterations", type=int, default=1, help="Times each session runs all four flows")
+    parser.add_argument("--url", help="generateContent URL to test instead of starting the mock server")
+    parser.add_argument("--shared-topic", help="Give every session this topic to exercise caching and coalescing")
+    parser.add_argument("--latency", default="lognormal:-1.0,0.5", help="Mock time to first byte (see mock_gemini_server.py)")
+    parser.add_argument("--chunk-delay", default="fixed:0.02", help="Mock delay between streamed events")
+    parser.add_argument("--error-429", type=float, default=0.0)
+    parser.add_argument("--error-500", type=float, default=0.0)
+    parser.add_argument("--timeout-rate", type=float, default=0.0)
+    parser.add_argument("--hang-seconds", type=float, default=5.0, help="How long an injected timeout hangs")
+    args = parser.parse_args()
+
+    config = None
+    url = args.url
+    if url is None:
+        config = MockConfig(
+            latency=args.latency,
+            chunk_delay=args.chunk_delay,
+            error_429=args.error_429,
+            error_500=args.error_500,
+            timeout_rate=args.timeout_rate,
+            hang_seconds=args.hang_seconds,
+        )
+        _, url = start_mock_server(config)
+        os.environ.setdefault("GOOGLE_API_KEY", "mock-key")
+        # The mock has no quota, so only throttle when the caller asked for it explicitly.
+        os.environ.setdefault("MYBUDDY_RATE_LIMIT_RPM", "1000000")
+        os.environ.setdefault("MYBUDDY_RATE_LIMIT_TPM", "1000000000")
+    os.environ["GEMINI_API_URL"] = url
+    os.environ.pop("GEMINI_STREAM_URL", None)
+
+    # utils reads its configuration at import time, so import only after the environment is set.
+    from utils import get_gemini_client, get_job_executor, get_rate_limiter, get_response_cache_stats
+
+    results = {flow: {"first": [], "total": [], "errors": []} for flow in FLOWS}
+    lock = threading.Lock()
+    threads = [
+        threading.Thread(target=run_session, args=(i, args.iterations, args.shared_topic, results, lock))
+        for i in range(args.sessions)
+    ]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    completed = sum(len(results[flow]["total"]) for flow in FLOWS)
+    failed = sum(len(results[flow]["errors"]) for flow in FLOWS)
+    print(f"\n{args.sessions} sessions x {args.iterations} iteration(s) against {url}")
+    print(f"{completed} flows completed, {failed} failed in {elapsed:.2f}s -> {completed / elapsed:.2f} flows/s\n")
+    print(f"{'flow':<11}{'ok':>5}{'err':>5}   {'first p50/p95/p99 (s)':<24}{'total p50/p95/p99 (s)':<24}")
+    for flow in FLOWS:
+        first, total, errors = results[flow]["first"], results[flow]["total"], results[flow]["errors"]
+        first_pcts = '/'.join(f"{percentile(first, p):.2f}" for p in (50, 95, 99))
+        total_pcts = '/'.join(f"{percentile(total, p):.2f}" for p in (50, 95, 99))
+        print(f"{flow:<11}{len(total):>5}{len(errors):>5}   {first_pcts:<24}{total_pcts:<24}")
+
+    print(f"\nCoalesced calls: {get_gemini_client().coalesced}")
+    print(f"Response cache: {get_response_cache_stats()}")
+    print(f"Rate limiter: {get_rate_limiter().stats()}")
+    print(f"Token estimates vs usageMetadata: {get_gemini_client().estimator.stats()}")
+    print(f"Job pool: {get_job_executor().stats()}")
+    if config is not None:
+        print(f"Mock server: {config.stats}")
+    for flow in FLOWS:
+        for error in sorted(set(results[flow]["errors"]))[:3]:
+            print(f"  {flow} error: {error}")
+
+
+if __name__ == "__main__":
+    main()
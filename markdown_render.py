@@ -0,0 +1,86 @@
+import html
+import re
+from functools import lru_cache
+
+RENDER_CACHE_ENTRIES = 256  # Rendered texts kept per renderer; Streamlit reruns re-render the same text
+
+BULLET_HTML = '<div style="margin-left: 1.5rem; margin-bottom: 0.3rem;">• {}</div>'
+NUMBERED_HTML = '<div style="margin-left: 1.5rem; margin-bottom: 0.3rem;"><strong style="color: #FFD700;">{}.</strong> {}</div>'
+STRONG_HTML = '<strong style="color: #FFD700;">{}</strong>'
+STRONG_TEMPLATE = STRONG_HTML.format(r'\1')
+CODE_HTML = '<code>{}</code>'
+PARAGRAPH_HTML = '<p style="margin-bottom: 0.8rem;">'
+
+# Bullets and numbered items share one pattern, so list lines are found in a single scan.
+LIST_ITEM = re.compile(r'^(?:[\-\*]\s+(?P<bullet>.+)|(?P<number>\d+)\.\s+(?P<item>.+))$', re.MULTILINE)
+INLINE_MARKUP = re.compile(r'\*\*(?P<bold>.*?)\*\*|`(?P<code>[^`\n]+)`')
+BOLD = re.compile(r'\*\*(.*?)\*\*')
+
+# The HTML-ish tags the model sometimes emits in explanations.
+MODEL_MARKUP = re.compile(
+    r'\[\]\(https?://[^\)]+\)'
+    r'|(?P<pre><pre>\s*|\s*</pre>)'
+    r'|<code>(?P<code>.*?)</code>'
+    r'|<strong>(?P<strong>.*?)</strong>'
+)
+
+
+@lru_cache(maxsize=RENDER_CACHE_ENTRIES)
+def render_markdown_html(text, highlight=True):
+    """Converts model markdown (bullets, numbered lists, **bold**, line breaks) into safe HTML.
+
+    The text is escaped first, so model output cannot inject markup. Without
+    highlight, **bold** markers are left as typed. Bold uses a template
+    substitution and line breaks plain str.replace, which run at C speed; only list
+    lines go through Python. Results are memoized on (text, highlight), so a rerun
+    that shows the same text does no work.
+    """
+    def list_item(match):
+        if match.lastgroup == 'bullet':
+            return BULLET_HTML.format(match['bullet'])
+        return NUMBERED_HTML.format(match['number'], match['item'])
+
+    body = html.escape(text)
+    if highlight:
+        body = BOLD.sub(STRONG_TEMPLATE, body)
+    body = LIST_ITEM.sub(list_item, body)
+    body = body.replace('\n\n', '</p>' + PARAGRAPH_HTML).replace('\n', '<br>')
+    return f'{PARAGRAPH_HTML}{body}</p>'
+
+
+@lru_cache(maxsize=RENDER_CACHE_ENTRIES)
+def render_inline_html(text):
+    """Escapes a short model-written string (a question, option or explanation), keeping **bold** and `code`."""
+    def replace(match):
+        if match.lastgroup == 'bold':
+            return STRONG_HTML.format(match['bold'])
+        return CODE_HTML.format(match['code'])
+
+    return INLINE_MARKUP.sub(replace, html.escape(str(text)))
+
+
+@lru_cache(maxsize=RENDER_CACHE_ENTRIES)
+def markup_to_markdown(text):
+    """Rewrites the HTML-ish tags in model output (<pre>, <code>, <strong>, empty links) as markdown."""
+    def replace(match):
+        kind = match.lastgroup
+        if kind == 'pre':
+            return '\n```\n'
+        if kind == 'code':
+            return f"`{match['code']}`"
+        if kind == 'strong':
+            return f"**{match['strong']}**"
+        return ''
+
+    return MODEL_MARKUP.sub(replace, text)
+
+
+def strip_markup(text):
+    """Removes the HTML-ish tags from model output, keeping only their text (for downloads)."""
+    def replace(match):
+        kind = match.lastgroup
+        if kind == 'pre':
+            return '\n'
+        return match[kind] if kind in ('code', 'strong') else ''
+
+    return MODEL_MARKUP.sub(replace, text)
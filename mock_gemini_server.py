@@ -0,0 +1,293 @@
+"""Local stand-in for the Gemini generateContent and streamGenerateContent endpoints.
+
+Point the app at it with GEMINI_API_URL, e.g.
+
+    python mock_gemini_server.py --port 8765 --latency lognormal:0.0,0.5 --error-429 0.05
+    GEMINI_API_URL=http://127.0.0.1:8765/v1beta/models/mock:generateContent streamlit run app.py
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+DEFAULT_PORT = 8765
+DEFAULT_ITEMS = 5         # Array length when the prompt does not ask for a number of items
+NESTED_ITEMS = 4          # Length of arrays inside items (e.g. a question's options)
+CHUNK_CHARS = 40          # Characters per streamed SSE event
+BYTES_PER_TOKEN = 4       # The mock "tokenizer" behind usageMetadata counts
+HANG_SECONDS = 150        # How long an injected timeout holds the connection before dropping it
+
+WORDS = (
+    "energy cell process system structure function model theory data signal network pattern "
+    "balance reaction layer value change force memory rule method result concept example"
+).split()
+
+
+# --- Configuration ---
+
+def parse_latency(spec):
+    """Turns 'fixed:S', 'uniform:LO,HI' or 'lognormal:MU,SIGMA' into a sampler returning seconds."""
+    kind, _, args = spec.partition(':')
+    params = [float(arg) for arg in args.split(',') if arg]
+    if kind == "fixed" and len(params) == 1:
+        return lambda rng: params[0]
+    if kind == "uniform" and len(params) == 2:
+        return lambda rng: rng.uniform(params[0], params[1])
+    if kind == "lognormal" and len(params) == 2:
+        return lambda rng: rng.lognormvariate(params[0], params[1])
+    raise ValueError(f"Unknown latency spec {spec!r}; use fixed:S, uniform:LO,HI or lognormal:MU,SIGMA")
+
+
+class MockConfig:
+    """Latency and fault-injection settings shared by every request the mock server handles."""
+
+    def __init__(self, latency="fixed:0.2", chunk_delay="fixed:0.02", error_429=0.0, error_500=0.0,
+                 timeout_rate=0.0, hang_seconds=HANG_SECONDS, retry_delay=1, seed=None):
+        self.latency = parse_latency(latency)
+        self.chunk_delay = parse_latency(chunk_delay)
+        self.error_429 = error_429
+        self.error_500 = error_500
+        self.timeout_rate = timeout_rate
+        self.hang_seconds = hang_seconds
+        self.retry_delay = retry_delay
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "streams": 0, "errors_429": 0, "errors_500": 0, "timeouts": 0}
+
+    def draw(self):
+        """Returns (fault, latency) for the next request; fault is None, 429, 500 or 'timeout'."""
+        with self.lock:
+            roll = self.rng.random()
+            latency = self.latency(self.rng)
+        if roll < self.error_429:
+            return 429, latency
+        if roll < self.error_429 + self.error_500:
+            return 500, latency
+        if roll < self.error_429 + self.error_500 + self.timeout_rate:
+            return "timeout", latency
+        return None, latency
+
+    def count(self, name):
+        with self.lock:
+            self.stats[name] += 1
+
+
+# --- Fake Content ---
+
+def prompt_text(payload):
+    """Returns the system instruction and user prompt of a request as one string."""
+    texts = []
+    for block in [payload.get('systemInstruction') or {}] + list(payload.get('contents') or []):
+        texts.extend(part.get('text', '') for part in block.get('parts') or [])
+    return '\n'.join(texts)
+
+
+def fake_sentence(rng, words=12):
+    text = ' '.join(rng.choice(WORDS) for _ in range(words))
+    return text[0].upper() + text[1:] + '.'
+
+
+def fake_value(schema, rng, count=DEFAULT_ITEMS):
+    """Builds a value that satisfies a Gemini responseSchema (OBJECT/ARRAY/STRING/INTEGER/NUMBER/BOOLEAN)."""
+    kind = schema.get('type', 'STRING').upper()
+    if kind == "OBJECT":
+        return {name: fake_value(prop, rng, NESTED_ITEMS) for name, prop in schema.get('properties', {}).items()}
+    if kind == "ARRAY":
+        return [fake_value(schema.get('items', {}), rng, NESTED_ITEMS) for _ in range(count)]
+    if kind == "INTEGER":
+        # Integers in MyBuddy schemas index into a sibling array of NESTED_ITEMS entries.
+        return rng.randrange(NESTED_ITEMS)
+    if kind == "NUMBER":
+        return round(rng.random(), 3)
+    if kind == "BOOLEAN":
+        return rng.random() < 0.5
+    return fake_sentence(rng, rng.randint(4, 14))
+
+
+def fake_text(prompt, rng):
+    """Writes plain-text output, filling any #SECTION# markers the prompt asks for."""
+    markers = list(dict.fromkeys(re.findall(r'#[A-Z_]+#', prompt)))
+    if not markers:
+        return '\n'.join(f"- **{rng.choice(WORDS)}** {fake_sentence(rng)}" for _ in range(6))
+    sections = []
+    for marker in markers:
+        if "POINT" in marker:
+            body = '\n'.join(f"- {fake_sentence(rng, 8)}" for _ in range(4))
+        else:
+            body = ' '.join(fake_sentence(rng) for _ in range(3))
+        sections.append(f"{marker}\n{body}")
+    return '\n\n'.join(sections)
+
+
+def fake_response_text(payload, rng):
+    """Returns the text the model would produce: JSON matching responseSchema, or prose."""
+    prompt = prompt_text(payload)
+    schema = (payload.get('generationConfig') or {}).get('responseSchema')
+    if schema:
+        requested = re.search(r'\b(\d{1,3})\b', prompt)
+        count = int(requested.group(1)) if requested else DEFAULT_ITEMS
+        return json.dumps(fake_value(schema, rng, count))
+    return fake_text(prompt, rng)
+
+
+def count_tokens(text):
+    return max(1, len(text.encode('utf-8')) // BYTES_PER_TOKEN)
+
+
+def usage_metadata(prompt, output):
+    prompt_tokens, output_tokens = count_tokens(prompt), count_tokens(output)
+    return {
+        "promptTokenCount": prompt_tokens,
+        "candidatesTokenCount": output_tokens,
+        "totalTokenCount": prompt_tokens + output_tokens,
+    }
+
+
+def candidate_event(text, finished=False, usage=None):
+    event = {"candidates": [{"content": {"parts": [{"text": text}], "role": "model"}}]}
+    if finished:
+        event["candidates"][0]["finishReason"] = "STOP"
+    if usage:
+        event["usageMetadata"] = usage
+    return event
+
+
+# --- HTTP Handler ---
+
+class MockGeminiHandler(BaseHTTPRequestHandler):
+    """Serves models/*:generateContent and models/*:streamGenerateContent with injected latency and faults."""
+
+    protocol_version = "HTTP/1.1"     # Keep-alive, like the real API
+    config = MockConfig()
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if urlparse(self.path).path == "/stats":
+            with self.config.lock:
+                self._send_json(200, dict(self.config.stats))
+        else:
+            self._send_json(404, {"error": {"code": 404, "message": "Not found", "status": "NOT_FOUND"}})
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        streaming = path.endswith(":streamGenerateContent")
+        if not streaming and not path.endswith(":generateContent"):
+            self._send_json(404, {"error": {"code": 404, "message": "Not found", "status": "NOT_FOUND"}})
+            return
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            self._send_json(400, {"error": {"code": 400, "message": "Invalid JSON", "status": "INVALID_ARGUMENT"}})
+            return
+
+        config = self.config
+        config.count("streams" if streaming else "requests")
+        fault, latency = config.draw()
+        time.sleep(latency)
+
+        if fault == 429:
+            config.count("errors_429")
+            self._send_json(429, {"error": {
+                "code": 429, "message": "Resource has been exhausted (mock).", "status": "RESOURCE_EXHAUSTED",
+                "details": [{"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": f"{config.retry_delay}s"}],
+            }})
+            return
+        if fault == 500:
+            config.count("errors_500")
+            self._send_json(500, {"error": {"code": 500, "message": "Internal error (mock).", "status": "INTERNAL"}})
+            return
+        if fault == "timeout":
+            config.count("timeouts")
+            time.sleep(config.hang_seconds)
+            self.close_connection = True
+            return
+
+        rng = random.Random()
+        text = fake_response_text(payload, rng)
+        usage = usage_metadata(prompt_text(payload), text)
+        if streaming:
+            self._stream(text, usage)
+        else:
+            self._send_json(200, candidate_event(text, finished=True, usage=usage))
+
+    def _stream(self, text, usage):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        pieces = [text[i:i + CHUNK_CHARS] for i in range(0, len(text), CHUNK_CHARS)] or ['']
+        try:
+            for index, piece in enumerate(pieces):
+                if index:
+                    with self.config.lock:
+                        delay = self.config.chunk_delay(self.config.rng)
+                    time.sleep(delay)
+                last = index == len(pieces) - 1
+                event = candidate_event(piece, finished=last, usage=usage if last else None)
+                self._write_chunk(f"data: {json.dumps(event)}\r\n\r\n".encode('utf-8'))
+            self._write_chunk(b'')
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True   # The client cancelled mid-stream
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+        self.wfile.flush()
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=UTF-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def start_mock_server(config=None, host="127.0.0.1", port=0):
+    """Starts the mock server on a daemon thread and returns (server, generateContent URL)."""
+    handler = type("ConfiguredMockGeminiHandler", (MockGeminiHandler,), {"config": config or MockConfig()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True, name="mock-gemini").start()
+    return server, f"http://{host}:{server.server_port}/v1beta/models/mock:generateContent"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--latency", default="fixed:0.2", help="Time to first byte: fixed:S, uniform:LO,HI or lognormal:MU,SIGMA")
+    parser.add_argument("--chunk-delay", default="fixed:0.02", help="Delay between streamed events, same format as --latency")
+    parser.add_argument("--error-429", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--error-500", type=float, default=0.0, help="Fraction of requests answered with 500")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="Fraction of requests that hang, then drop")
+    parser.add_argument("--hang-seconds", type=float, default=HANG_SECONDS)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    config = MockConfig(
+        latency=args.latency,
+        chunk_delay=args.chunk_delay,
+        error_429=args.error_429,
+        error_500=args.error_500,
+        timeout_rate=args.timeout_rate,
+        hang_seconds=args.hang_seconds,
+        seed=args.seed,
+    )
+    server, url = start_mock_server(config, args.host, args.port)
+    print(f"Mock Gemini API listening; set GEMINI_API_URL={url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
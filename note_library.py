@@ -0,0 +1,224 @@
+import re
+import sqlite3
+import threading
+import time
+
+SEARCH_RESULTS = 20       # Matching pages returned per search
+MAX_CHARS = 20_000_000    # Page text kept across all sessions before the least recently added documents are evicted
+SNIPPET_TOKENS = 16       # Words of context around the matches in a search snippet
+
+PHRASE = re.compile(r'"([^"]+)"|(\w+)')
+
+
+def match_query(text):
+    """Turns what a user typed into an FTS5 query: every word (or "quoted phrase") must appear.
+
+    Each term is quoted, so FTS5 operators and punctuation in the input are searched
+    for literally instead of raising a syntax error. Returns None if nothing is searchable.
+    """
+    terms = []
+    for phrase, word in PHRASE.findall(text):
+        term = (phrase or word).strip()
+        if term:
+            terms.append('"' + term.replace('"', '""') + '"')
+    return ' '.join(terms) or None
+
+
+class NoteLibrary:
+    """Thread-safe, in-memory SQLite store of every uploaded document's pages with an FTS5 full-text index.
+
+    Each document's page text is stored once, with the character offset where the page
+    starts in the extracted text (pages joined by blank lines, as the summarizer's
+    source text is). Owners (browser sessions) only see the documents they added; ownership
+    expires after ttl seconds and documents nobody owns are dropped. Beyond max_chars of
+    page text, the documents least recently added by any owner are evicted too (the
+    newest one always stays). Both are enforced on every read and write. Session ids do
+    not survive a reload or restart, so the library is never written to disk.
+    """
+
+    def __init__(self, ttl=24 * 60 * 60, max_chars=MAX_CHARS):
+        self.ttl = ttl
+        self.max_chars = max_chars
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(":memory:", check_same_thread=False, isolation_level=None)
+        self._db.executescript(
+            "CREATE TABLE IF NOT EXISTS documents (document TEXT PRIMARY KEY, page_count INTEGER NOT NULL, chars INTEGER NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS owners ("
+            "owner TEXT NOT NULL, document TEXT NOT NULL, name TEXT NOT NULL, added_at REAL NOT NULL, PRIMARY KEY (owner, document));"
+            "CREATE INDEX IF NOT EXISTS owners_added ON owners (added_at);"
+            "CREATE TABLE IF NOT EXISTS pages ("
+            "id INTEGER PRIMARY KEY, document TEXT NOT NULL, page INTEGER NOT NULL, start INTEGER NOT NULL, text TEXT NOT NULL, "
+            "UNIQUE (document, page));"
+            # The full-text index reads its text from pages; the triggers keep it in step.
+            "CREATE VIRTUAL TABLE IF NOT EXISTS pages_fts USING fts5("
+            "text, content='pages', content_rowid='id', tokenize='porter unicode61');"
+            "CREATE TRIGGER IF NOT EXISTS pages_added AFTER INSERT ON pages BEGIN "
+            "INSERT INTO pages_fts (rowid, text) VALUES (new.id, new.text); END;"
+            "CREATE TRIGGER IF NOT EXISTS pages_removed AFTER DELETE ON pages BEGIN "
+            "INSERT INTO pages_fts (pages_fts, rowid, text) VALUES ('delete', old.id, old.text); END;"
+        )
+
+    def attach(self, owner, document, name):
+        """Makes an already stored document visible to owner under name; returns False if it is not stored."""
+        now = time.time()
+        with self._lock:
+            if self._db.execute("SELECT 1 FROM documents WHERE document = ?", (document,)).fetchone() is None:
+                return False
+            self._db.execute(
+                "INSERT OR REPLACE INTO owners (owner, document, name, added_at) VALUES (?, ?, ?, ?)",
+                (owner, document, name, now),
+            )
+            self._prune(now)
+            return True
+
+    def add(self, owner, document, name, pages):
+        """Stores a document's pages (an iterable of page texts) and makes it visible to owner under name."""
+        rows = []
+        offset = 0
+        for number, page in enumerate(pages, start=1):
+            text = page.strip()
+            rows.append((text, document, number, offset))
+            if text:
+                offset += len(text) + 2
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                if self._db.execute("SELECT 1 FROM documents WHERE document = ?", (document,)).fetchone() is None:
+                    self._db.executemany("INSERT INTO pages (text, document, page, start) VALUES (?, ?, ?, ?)", rows)
+                    self._db.execute(
+                        "INSERT INTO documents (document, page_count, chars) VALUES (?, ?, ?)",
+                        (document, len(rows), max(offset - 2, 0)),
+                    )
+                self._db.execute(
+                    "INSERT OR REPLACE INTO owners (owner, document, name, added_at) VALUES (?, ?, ?, ?)",
+                    (owner, document, name, now),
+                )
+                self._prune(now)
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def pages(self, document, numbers=None):
+        """Returns [(page, text)] of a document in page order, all pages or only the given numbers."""
+        with self._lock:
+            self._prune(time.time())
+            rows = self._db.execute(
+                "SELECT page, text FROM pages WHERE document = ? ORDER BY page", (document,)
+            ).fetchall()
+        if numbers is not None:
+            wanted = set(numbers)
+            rows = [row for row in rows if row[0] in wanted]
+        return rows
+
+    def matching_pages(self, owner, document, query):
+        """Returns the numbers of a document's pages that contain every term of query, in page order."""
+        match = match_query(query)
+        if match is None:
+            return []
+        with self._lock:
+            self._prune(time.time())
+            rows = self._db.execute(
+                "SELECT pages.page FROM pages_fts JOIN pages ON pages.id = pages_fts.rowid "
+                "JOIN owners ON owners.document = pages.document "
+                "WHERE pages_fts MATCH ? AND owners.owner = ? AND pages.document = ? ORDER BY pages.page",
+                (match, owner, document),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def search(self, owner, query, limit=SEARCH_RESULTS):
+        """Returns owner's best-matching pages for query, best first.
+
+        Each result is a dict with the document's name, the page number, the page's
+        character offset in the document text and a snippet with the matches in **bold**.
+        """
+        match = match_query(query)
+        if match is None:
+            return []
+        with self._lock:
+            self._prune(time.time())
+            rows = self._db.execute(
+                "SELECT owners.name, pages.document, pages.page, pages.start, "
+                f"snippet(pages_fts, 0, '**', '**', '…', {SNIPPET_TOKENS}) "
+                "FROM pages_fts JOIN pages ON pages.id = pages_fts.rowid "
+                "JOIN owners ON owners.document = pages.document "
+                "WHERE pages_fts MATCH ? AND owners.owner = ? ORDER BY bm25(pages_fts) LIMIT ?",
+                (match, owner, limit),
+            ).fetchall()
+        return [
+            {"name": name, "document": document, "page": page, "start": start, "snippet": snippet}
+            for name, document, page, start, snippet in rows
+        ]
+
+    def _prune(self, now):
+        """Drops expired ownership, documents nobody owns and, over max_chars, the least recently added documents."""
+        self._db.execute("DELETE FROM owners WHERE added_at <= ?", (now - self.ttl,))
+        evicted = [row[0] for row in self._db.execute(
+            "SELECT document FROM documents WHERE document NOT IN (SELECT document FROM owners)"
+        )]
+        total = 0
+        for document, chars in self._db.execute(
+            "SELECT documents.document, documents.chars FROM documents JOIN owners ON owners.document = documents.document "
+            "GROUP BY documents.document ORDER BY MAX(owners.added_at) DESC"
+        ).fetchall():
+            total += chars
+            if total > self.max_chars and total > chars:
+                evicted.append(document)
+        for document in evicted:
+            self._db.execute("DELETE FROM owners WHERE document = ?", (document,))
+            self._db.execute("DELETE FROM pages WHERE document = ?", (document,))
+            self._db.execute("DELETE FROM documents WHERE document = ?", (document,))
+
+
+class LibraryPages:
+    """The pages of one upload, read through the NoteLibrary on a job worker.
+
+    source is the upload's lazy page texts; it is only read when the library does not
+    hold the document yet. Without query, iterating yields every page as it is read
+    and then stores the pages that were read. With query, the document is stored first
+    and only its pages that contain every term of query are yielded, in page order;
+    their numbers are kept in self.numbers. page_count, pages and truncated describe
+    the source as far as it was read, for progress and truncation notices.
+    """
+
+    def __init__(self, library, owner, document, name, source, query=None):
+        self.library = library
+        self.owner = owner
+        self.document = document
+        self.name = name
+        self.source = source
+        self.query = query
+        self.numbers = None
+
+    @property
+    def page_count(self):
+        return getattr(self.source, 'page_count', None)
+
+    @property
+    def pages(self):
+        return getattr(self.source, 'pages', [])
+
+    @property
+    def truncated(self):
+        return getattr(self.source, 'truncated', False)
+
+    def add(self):
+        """Makes the document visible to owner, reading the source only if no owner has added it yet."""
+        if not self.library.attach(self.owner, self.document, self.name):
+            self.library.add(self.owner, self.document, self.name, self.source)
+
+    def __iter__(self):
+        if self.query is None:
+            read = []
+            for page in self.source:
+                read.append(page)
+                yield page
+            self.library.add(self.owner, self.document, self.name, read)
+            return
+        self.add()
+        self.numbers = self.library.matching_pages(self.owner, self.document, self.query)
+        if not self.numbers:
+            raise ValueError(f"No page of {self.name} mentions {self.query}.")
+        for _, text in self.library.pages(self.document, self.numbers):
+            yield text
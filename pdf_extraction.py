@@ -0,0 +1,269 @@
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from io import BytesIO
+from multiprocessing import get_all_start_methods, get_context
+
+import pdfplumber
+import pypdfium2
+
+MAX_PAGES = 300           # Pages read from one document before the rest is skipped
+TIME_BUDGET = 60          # Seconds one document may spend in extraction
+SHARD_PAGES = 4           # Pages per work item; small shards keep progress granular and load balanced
+PARALLEL_MIN_PAGES = 8    # Documents shorter than this are cheaper to read in-process
+ACCURATE_MAX_PAGES = 12   # "auto" reads documents up to this long with the layout-aware backend...
+ACCURATE_MAX_PAGE_BYTES = 64 * 1024  # ...when their pages average at most this many bytes
+
+
+class ExtractedPdf:
+    """Per-page text of a PDF, in page order, plus how much of the document it covers."""
+
+    def __init__(self, pages, page_count, elapsed):
+        self.pages = pages
+        self.page_count = page_count
+        self.elapsed = elapsed
+
+    @property
+    def truncated(self):
+        """True when the page or time budget stopped extraction before the last page."""
+        return len(self.pages) < self.page_count
+
+    @property
+    def text(self):
+        return '\n\n'.join(page.strip() for page in self.pages if page.strip())
+
+    def __iter__(self):
+        return iter(self.pages)
+
+    def as_dict(self):
+        """Returns a JSON-serializable form for the extraction cache."""
+        return {"pages": self.pages, "page_count": self.page_count, "elapsed": self.elapsed}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["pages"], data["page_count"], data["elapsed"])
+
+
+def truncation_notice(pages):
+    """Describes pages skipped by the page or time budget, or returns None if the whole document was read."""
+    if not getattr(pages, 'truncated', False):
+        return None
+    return (
+        f"Only the first {len(pages.pages)} of {pages.page_count} pages were read; "
+        "the summary covers those pages."
+    )
+
+
+def open_pdf(source):
+    """Opens a PDF from bytes or a file path."""
+    return pdfplumber.open(BytesIO(source) if isinstance(source, bytes) else source)
+
+
+# --- Text Backends ---
+
+class PdfplumberBackend:
+    """Accurate: pdfplumber's layout analysis keeps reading order in columns and tables, but is slow."""
+
+    name = "pdfplumber"
+
+    def iter_pages(self, source, start, stop):
+        with open_pdf(source) as pdf:
+            for index in range(start, stop):
+                yield pdf.pages[index].extract_text() or ""
+
+
+class PdfiumBackend:
+    """Fast: PDFium's text layer in content order, with no layout analysis.
+
+    PDFium is not thread-safe, so calls are serialized within a process; pool workers
+    are separate processes and run in parallel.
+    """
+
+    name = "pdfium"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # A fork taken while another thread held the lock must not leave the child deadlocked.
+        os.register_at_fork(after_in_child=self._reset_lock)
+
+    def _reset_lock(self):
+        self._lock = threading.Lock()
+
+    def count_pages(self, source):
+        """Returns the number of pages; PDFium reads the page tree without parsing any page."""
+        with self._lock:
+            pdf = pypdfium2.PdfDocument(source)
+            try:
+                return len(pdf)
+            finally:
+                pdf.close()
+
+    def iter_pages(self, source, start, stop):
+        with self._lock:
+            pdf = pypdfium2.PdfDocument(source)
+        try:
+            for index in range(start, stop):
+                with self._lock:
+                    page = pdf[index]
+                    textpage = page.get_textpage()
+                    text = textpage.get_text_range()
+                    textpage.close()
+                    page.close()
+                # PDFium marks a word hyphenated across lines with U+FFFE and ends lines with CRLF.
+                yield text.replace('\ufffe', '').replace('\r\n', '\n')
+        finally:
+            with self._lock:
+                pdf.close()
+
+
+BACKENDS = {backend.name: backend for backend in (PdfplumberBackend(), PdfiumBackend())}
+
+
+def choose_backend(page_count, size, preference="auto"):
+    """Returns the backend name to read a document of page_count pages and size bytes with.
+
+    "auto" spends pdfplumber's layout analysis only on short documents with light
+    pages, where it is cheap and reading order matters most. Long documents, and short
+    ones whose pages are heavy (drawings, embedded fonts and images push up the bytes
+    per page, and with them pdfplumber's cost), go to the fast backend.
+    """
+    if preference in BACKENDS:
+        return preference
+    if preference != "auto":
+        raise ValueError(f"Unknown PDF backend {preference!r}; use auto, {', '.join(BACKENDS)}")
+    if page_count <= ACCURATE_MAX_PAGES and size <= ACCURATE_MAX_PAGE_BYTES * max(page_count, 1):
+        return "pdfplumber"
+    return "pdfium"
+
+
+def count_pages(source):
+    """Returns the number of pages in the PDF."""
+    return BACKENDS["pdfium"].count_pages(source)
+
+
+def source_size(source):
+    """Returns the size in bytes of a PDF given as bytes or a file path."""
+    return len(source) if isinstance(source, bytes) else os.path.getsize(source)
+
+
+def extract_shard(source, start, stop, backend="pdfplumber"):
+    """Returns the text of pages [start, stop); runs inside a pool worker process."""
+    return list(BACKENDS[backend].iter_pages(source, start, stop))
+
+
+def create_pool(workers=None):
+    """Returns a process pool for extraction.
+
+    Workers are forked where possible: spawn and forkserver re-import __main__ in each
+    worker, and under Streamlit __main__ is the app script itself.
+    """
+    method = "fork" if "fork" in get_all_start_methods() else "spawn"
+    return ProcessPoolExecutor(max_workers=workers or os.cpu_count(), mp_context=get_context(method))
+
+
+class PdfPageStream:
+    """Iterates a PDF's page texts in document order while worker processes parse ahead.
+
+    Each page is handed out as soon as it and every page before it are done, so a
+    consumer can start on the opening pages while later shards are still being parsed.
+    Iteration stops at max_pages or once time_budget seconds have passed.
+    backend is a BACKENDS name or "auto" (see choose_backend); the one used is in
+    self.backend once iteration starts. on_progress(pages_done, pages_total) is called
+    as pages complete, and on_complete(ExtractedPdf) once every page up to max_pages
+    has been read.
+    """
+
+    def __init__(self, source, pool=None, max_pages=MAX_PAGES, time_budget=TIME_BUDGET,
+                 shard_pages=SHARD_PAGES, on_progress=None, on_complete=None, backend="auto"):
+        self.source = source
+        self.pool = pool
+        self.backend = backend
+        self.max_pages = max_pages
+        self.time_budget = time_budget
+        self.shard_pages = shard_pages
+        self.on_progress = on_progress
+        self.on_complete = on_complete
+        self.page_count = None    # Known once iteration starts
+        self.pages = []
+        self.elapsed = 0.0
+
+    @property
+    def truncated(self):
+        return self.page_count is not None and len(self.pages) < self.page_count
+
+    def result(self):
+        """Returns the pages read so far as an ExtractedPdf."""
+        return ExtractedPdf(self.pages, self.page_count or 0, self.elapsed)
+
+    def __iter__(self):
+        started = time.monotonic()
+        self.page_count = count_pages(self.source)
+        self.backend = choose_backend(self.page_count, source_size(self.source), self.backend)
+        total = min(self.page_count, self.max_pages) if self.max_pages else self.page_count
+
+        if self.pool is None or total < PARALLEL_MIN_PAGES:
+            pages = self._read_in_process(total, started)
+        else:
+            pages = self._read_in_pool(total, started)
+        for text in pages:
+            self.pages.append(text)
+            self.elapsed = time.monotonic() - started
+            yield text
+
+        if len(self.pages) == total and self.on_complete:
+            self.on_complete(self.result())
+
+    def _read_in_process(self, total, started):
+        pages = BACKENDS[self.backend].iter_pages(self.source, 0, total)
+        try:
+            for index in range(total):
+                if time.monotonic() - started > self.time_budget:
+                    return
+                yield next(pages)
+                if self.on_progress:
+                    self.on_progress(index + 1, total)
+        finally:
+            pages.close()
+
+    def _read_in_pool(self, total, started):
+        shards = {
+            self.pool.submit(extract_shard, self.source, start, min(start + self.shard_pages, total), self.backend): start
+            for start in range(0, total, self.shard_pages)
+        }
+        results = {}
+        pending = set(shards)
+        next_start = 0
+        done_pages = 0
+        try:
+            while pending:
+                remaining = self.time_budget - (time.monotonic() - started)
+                if remaining <= 0:
+                    return
+                finished, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    results[shards[future]] = future.result()
+                    done_pages += len(results[shards[future]])
+                if finished and self.on_progress:
+                    self.on_progress(done_pages, total)
+                # Hand out the contiguous run from the next page so the text never has holes in it.
+                while next_start in results:
+                    yield from results.pop(next_start)
+                    next_start += self.shard_pages
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def extract_pdf_pages(source, pool=None, max_pages=MAX_PAGES, time_budget=TIME_BUDGET,
+                      shard_pages=SHARD_PAGES, on_progress=None, backend="auto"):
+    """Extracts a PDF page by page, sharding the page range across pool's worker processes.
+
+    Pages come back in document order. Extraction stops at max_pages or once
+    time_budget seconds have passed, keeping every page before the first one that
+    did not finish. on_progress(pages_done, pages_total) is called as pages complete.
+    """
+    stream = PdfPageStream(source, pool, max_pages, time_budget, shard_pages, on_progress, backend=backend)
+    for _ in stream:
+        pass
+    return stream.result()
@@ -1,5 +1,7 @@
 import streamlit as st
-from utils import generate_structured_quiz
+from utils import stream_quiz_questions, get_job_executor, submit_job, job_status_text, cancel_job, notes_lookup
+from jobs import JobQueueFull, collect_items, poll_job
+from markdown_render import render_inline_html
 
 
 # --- CUSTOM CSS FOR QUIZ ---
@@ -108,12 +110,38 @@ def check_answer(question_index, selected_option_index):
 
 def next_question():
     """Moves to the next question or finishes the quiz."""
-    if st.session_state.quiz_current_index < len(st.session_state.quiz_data) - 1:
+    if st.session_state.quiz_current_index < expected_question_count() - 1:
         st.session_state.quiz_current_index += 1
     else:
         st.session_state.quiz_finished = True
 
 
+def sync_streamed_questions():
+    """Appends questions that the background job produced since the last rerun."""
+    executor = get_job_executor()
+    job = executor.get(st.session_state.get('quiz_job_id'))
+    if job is None:
+        st.session_state.pop('quiz_job_id', None)
+        return
+    
+    new_questions = job.items[len(st.session_state.quiz_data):]
+    if new_questions:
+        st.session_state.quiz_data.extend(new_questions)
+        st.session_state.user_answers.extend([None] * len(new_questions))
+    
+    if job.done and len(job.items) == len(st.session_state.quiz_data):
+        executor.forget(job.id)
+        st.session_state.pop('quiz_job_id', None)
+
+
+def expected_question_count():
+    """Returns how many questions the quiz will have once the background job is done."""
+    available = len(st.session_state.quiz_data)
+    if st.session_state.get('quiz_job_id') is not None:
+        return max(available, st.session_state.get('quiz_num_questions', available))
+    return available
+
+
 def show_quiz_results():
     """Displays the final score, accuracy, and download button."""
     correct_count = sum(1 for answer in st.session_state.user_answers if answer and answer['correct'])
@@ -321,7 +349,8 @@ Keep learning and improving! 🚀
     return results
 
 def reset_quiz_state():
-    """Clears all quiz-related session state variables."""
+    """Clears all quiz-related session state variables and aborts any questions still generating."""
+    cancel_job(st.session_state.get('quiz_job_id'))
     st.session_state.pop('quiz_data', None)
     st.session_state.pop('quiz_current_index', None)
     st.session_state.pop('user_answers', None)
@@ -329,8 +358,16 @@ def reset_quiz_state():
     st.session_state.pop('quiz_finished', None)
     st.session_state.pop('quiz_topic', None)
     st.session_state.pop('quiz_difficulty', None)
+    st.session_state.pop('quiz_use_notes', None)
     st.session_state.pop('quiz_generating', None)
+    st.session_state.pop('quiz_job_id', None)
+
 
+def cancel_quiz_generation():
+    """Aborts a quiz that is still loading its first question; a quiz already in progress is left alone."""
+    if st.session_state.get('quiz_generating'):
+        cancel_job(st.session_state.pop('quiz_job_id', None))
+        st.session_state.quiz_generating = False
 
 def display_quiz_question():
     """Renders the current question card, options, feedback, and navigation."""
@@ -339,17 +376,44 @@ def display_quiz_question():
         st.warning("No quiz data loaded. Please start a quiz.")
         return
 
+    sync_streamed_questions()
+
+    q_index = st.session_state.quiz_current_index
+    
+    # The user is ahead of the generator: wait for the next question to stream in
+    if q_index >= len(st.session_state.quiz_data):
+        job = get_job_executor().get(st.session_state.get('quiz_job_id'))
+        if job is None:
+            st.session_state.quiz_finished = True
+        else:
+            st.progress(q_index / expected_question_count(), text=f"Question {q_index + 1} of {expected_question_count()}")
+            with st.container(border=True):
+                st.markdown(f"""
+                <div style="padding: 2rem 1rem; text-align: center;">
+                    <h3 style="color: #FFD700; margin: 0;">⏳ Preparing question {q_index + 1}...</h3>
+                    <p style="color: #CCCCCC; margin-top: 0.5rem;">It will appear here as soon as it is ready</p>
+                </div>
+                """, unsafe_allow_html=True)
+            available = len(st.session_state.quiz_data)
+            
+            def rerun_when_ready(job):
+                if len(job.items) > available:
+                    st.rerun()
+            
+            poll_job(job, rerun_when_ready)
+            return
+
     if st.session_state.get('quiz_finished', False):
         show_quiz_results()
         return
 
-    q_index = st.session_state.quiz_current_index
     question_data = st.session_state.quiz_data[q_index]
     is_answered = st.session_state.user_answers[q_index] is not None
+    total_questions = expected_question_count()
     
     # Progress bar
-    progress = (q_index + 1) / len(st.session_state.quiz_data)
-    st.progress(progress, text=f"Question {q_index + 1} of {len(st.session_state.quiz_data)}")
+    progress = (q_index + 1) / total_questions
+    st.progress(progress, text=f"Question {q_index + 1} of {total_questions}")
     
     st.markdown("<br>", unsafe_allow_html=True)
     
@@ -361,7 +425,7 @@ def display_quiz_question():
             Question {q_index + 1}
         </h3>
         <p style="color: #FFFFFF; font-size: 1.3rem; margin-bottom: 2rem; line-height: 1.8;">
-            {question_data['question']}
+            {render_inline_html(question_data['question'])}
         </p>
         <p style="color: #CCCCCC; font-size: 1rem; margin-bottom: 1rem; font-weight: 600;">
             Choose your answer:
@@ -415,7 +479,7 @@ def display_quiz_question():
                     pointer-events: none;
                     user-select: none;
                 ">
-                    {icon} <strong>{chr(65 + idx)}.</strong> {option}
+                    {icon} <strong>{chr(65 + idx)}.</strong> {render_inline_html(option)}
                 </div>
                 """
                 st.markdown(option_html, unsafe_allow_html=True)
@@ -444,13 +508,13 @@ def display_quiz_question():
                 💡 Explanation
             </h5>
             <p style="color: #CCCCCC; margin: 0; line-height: 1.7; font-size: 1rem;">
-                {question_data['explanation']}
+                {render_inline_html(question_data['explanation'])}
             </p>
         </div>
         """
         st.markdown(explanation_card, unsafe_allow_html=True)
         
-        is_last_question = q_index >= len(st.session_state.quiz_data) - 1
+        is_last_question = q_index >= total_questions - 1
         
         col_spacer, col_button = st.columns([2.5, 1])
         
@@ -480,6 +544,39 @@ def display_quiz_question():
                 next_question()
                 st.rerun()
 
+def render_quiz_progress(job):
+    """Shows the loading card until the first question streams in, then starts the quiz."""
+    if job.items:
+        st.rerun()
+    
+    with st.container(border=True):
+        st.markdown(f"""
+        <div style="padding: 2rem 1rem; text-align: center;">
+            <div style="margin-bottom: 2rem;">
+                <div style="
+                    border: 4px solid #333333;
+                    border-top: 4px solid #FFD700;
+                    border-radius: 50%;
+                    width: 60px;
+                    height: 60px;
+                    animation: spin 1s linear infinite;
+                    margin: 0 auto;
+                "></div>
+            </div>
+            <h3 style="color: #FFD700; margin: 0;">🔄 Generating Quiz...</h3>
+            <p style="color: #CCCCCC; margin-top: 0.5rem;">Please wait while we create your questions</p>
+            <p style="color: #999999; margin-top: 0.5rem; font-size: 0.9rem;">{job_status_text(job)}</p>
+        </div>
+        
+        <style>
+        @keyframes spin {{
+            0% {{ transform: rotate(0deg); }}
+            100% {{ transform: rotate(360deg); }}
+        }}
+        </style>
+        """, unsafe_allow_html=True)
+
+
 # --- MAIN QUIZ FUNCTION ---
 
 def feature_generate_quiz():
@@ -506,55 +603,48 @@ def feature_generate_quiz():
             show_quiz_results()
             return 
 
-        # Loading state
+        # Loading state: questions stream in from a background job; start as soon as the first one is ready
         if st.session_state.quiz_generating:
-            with st.container(border=True):
-                st.markdown("""
-                <div style="padding: 2rem 1rem; text-align: center;">
-                    <div style="margin-bottom: 2rem;">
-                        <div style="
-                            border: 4px solid #333333;
-                            border-top: 4px solid #FFD700;
-                            border-radius: 50%;
-                            width: 60px;
-                            height: 60px;
-                            animation: spin 1s linear infinite;
-                            margin: 0 auto;
-                        "></div>
-                    </div>
-                    <h3 style="color: #FFD700; margin: 0;">🔄 Generating Quiz...</h3>
-                    <p style="color: #CCCCCC; margin-top: 0.5rem;">Please wait while we create your questions</p>
-                </div>
-                
-                <style>
-                @keyframes spin {
-                    0% { transform: rotate(0deg); }
-                    100% { transform: rotate(360deg); }
-                }
-                </style>
-                """, unsafe_allow_html=True)
-            
-            topic = st.session_state.quiz_topic
-            difficulty = st.session_state.quiz_difficulty
-            num_questions = st.session_state.get('quiz_num_questions', 5)
+            executor = get_job_executor()
+            job = executor.get(st.session_state.get('quiz_job_id'))
             
-            quiz_data = generate_structured_quiz(topic, difficulty, num_questions)
+            if job is None:
+                topic = st.session_state.quiz_topic
+                difficulty = st.session_state.quiz_difficulty
+                num_questions = st.session_state.get('quiz_num_questions', 5)
+                notes = None
+                if st.session_state.get('quiz_use_notes') and st.session_state.get('uploaded_files'):
+                    notes = notes_lookup(topic, st.session_state.uploaded_files)
+                try:
+                    job = submit_job(collect_items, stream_quiz_questions(topic, difficulty, num_questions, notes=notes))
+                except JobQueueFull as e:
+                    st.session_state.quiz_generating = False
+                    st.session_state.quiz_error = str(e)
+                    st.rerun()
+                st.session_state.quiz_job_id = job.id
 
-            if quiz_data and len(quiz_data) > 0:
-                st.session_state.quiz_data = quiz_data
+            if job.items:
+                st.session_state.quiz_data = list(job.items)
                 st.session_state.quiz_current_index = 0
-                st.session_state.user_answers = [None] * len(quiz_data)
+                st.session_state.user_answers = [None] * len(st.session_state.quiz_data)
                 st.session_state.quiz_finished = False
                 st.session_state.quiz_started = True
                 st.session_state.quiz_generating = False
                 st.rerun()
-            else:
+            elif job.done:
+                executor.forget(job.id)
+                st.session_state.pop('quiz_job_id', None)
                 st.session_state.quiz_generating = False
                 st.session_state.quiz_started = False
+                st.session_state.quiz_error = job.error or "No questions were generated. Please try again."
                 st.rerun()
             
+            poll_job(job, render_quiz_progress)
             return
 
+        if st.session_state.get('quiz_error'):
+            st.error(f"❌ Quiz generation failed: {st.session_state.pop('quiz_error')}")
+
         # Setup Form
         with st.container(border=True):
             st.markdown('<h3 style="color: #FFD700; margin-top: 0; margin-bottom: 1.5rem; font-size: 1.3rem;">📝 Quiz Setup</h3>', unsafe_allow_html=True)
@@ -585,6 +675,14 @@ def feature_generate_quiz():
                     help="Choose between 1-10 questions"
                 )
             
+            uploads = st.session_state.get('uploaded_files') or []
+            use_notes = uploads and st.checkbox(
+                f"📎 Use my uploaded notes ({len(uploads)} file{'s' if len(uploads) > 1 else ''})",
+                value=True,
+                key='quiz_use_notes_input',
+                help="Sends only the passages of your uploaded files that match the topic"
+            )
+            
             st.markdown("<br>", unsafe_allow_html=True)
             
             col1, col2, col3 = st.columns([1, 2, 1])
@@ -595,6 +693,7 @@ def feature_generate_quiz():
                         st.session_state.quiz_topic = topic
                         st.session_state.quiz_difficulty = difficulty
                         st.session_state.quiz_num_questions = num_questions
+                        st.session_state.quiz_use_notes = bool(use_notes)
                         st.rerun()
                     else:
                         st.warning("⚠️ Please enter a topic to start the quiz.")
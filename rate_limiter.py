@@ -0,0 +1,184 @@
+import threading
+import time
+from collections import OrderedDict, deque
+
+BURST_SECONDS = 10        # Seconds of quota that may be spent at once after an idle spell
+CANCEL_POLL = 0.25        # Seconds between cancellation checks while waiting in the queue
+
+# --- Priority Classes (lower is served first) ---
+INTERACTIVE = 0           # A user pressed a button and is watching the loading view
+PREFETCH = 1              # Speculative work nobody is waiting on yet
+
+
+class TokenBucket:
+    """Refills at rate_per_minute up to capacity units; callers hold the owning limiter's lock."""
+
+    def __init__(self, rate_per_minute, capacity):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(1.0, capacity)
+        self._level = self.capacity
+        self._updated = time.monotonic()
+
+    def wait_time(self, amount, now):
+        """Returns the seconds until amount units are available (0 if they are now)."""
+        self._refill(now)
+        # A request larger than the whole bucket is admitted once the bucket is full.
+        amount = min(amount, self.capacity)
+        if self._level >= amount:
+            return 0.0
+        return (amount - self._level) / self.rate
+
+    def take(self, amount, now):
+        self._refill(now)
+        self._level -= min(amount, self.capacity)
+
+    def _refill(self, now):
+        self._level = min(self.capacity, self._level + (now - self._updated) * self.rate)
+        self._updated = now
+
+
+class Ticket:
+    """A caller's identity in the admission queue; one ticket covers every attempt of a call.
+
+    A job may share its ticket across concurrent calls; each still waits for its own turn.
+    """
+
+    def __init__(self, session_id=None, priority=INTERACTIVE):
+        self.session_id = session_id
+        self.priority = priority
+
+
+class _Waiter:
+    """One pending acquire call; concurrent calls sharing a ticket each wait in their own slot."""
+
+    __slots__ = ("ticket", "session_id", "priority")
+
+    def __init__(self, ticket):
+        self.ticket = ticket
+        self.session_id = ticket.session_id
+        self.priority = ticket.priority
+
+
+class RateLimiter:
+    """Process-wide admission control: request and token buckets in front of a fair, prioritised queue.
+
+    Waiting callers are admitted highest priority first and, within a priority,
+    round-robin across sessions, so one session firing many calls cannot starve the rest.
+    A ticket may be shared by many concurrent calls (e.g. the sections of one summary);
+    each call queues separately.
+    """
+
+    def __init__(self, requests_per_minute, tokens_per_minute=None, burst_seconds=BURST_SECONDS):
+        self.requests = TokenBucket(requests_per_minute, requests_per_minute * burst_seconds / 60)
+        self.tokens = None
+        if tokens_per_minute:
+            self.tokens = TokenBucket(tokens_per_minute, tokens_per_minute * burst_seconds / 60)
+        self._cond = threading.Condition()
+        self._queues = {}         # priority -> OrderedDict(session_id -> deque of waiting calls)
+        self._paused_until = 0.0
+        self._stats = {"admitted": 0, "queued": 0, "timeouts": 0}
+
+    def acquire(self, ticket=None, tokens=0, timeout=None, cancel_event=None):
+        """Blocks until ticket may send one request costing tokens; returns False on timeout or cancellation."""
+        waiter = _Waiter(ticket or Ticket())
+        give_up_at = None if timeout is None else time.monotonic() + timeout
+
+        with self._cond:
+            self._enqueue(waiter)
+            waited = False
+            try:
+                while True:
+                    if cancel_event is not None and cancel_event.is_set():
+                        return False
+                    now = time.monotonic()
+                    wait = self._wait_time(tokens, now) if self._head() is waiter else None
+                    if wait == 0:
+                        self._admit(waiter, tokens, now)
+                        return True
+                    if give_up_at is not None:
+                        remaining = give_up_at - now
+                        if remaining <= 0:
+                            self._stats["timeouts"] += 1
+                            return False
+                        wait = remaining if wait is None else min(wait, remaining)
+                    if not waited:
+                        waited = True
+                        self._stats["queued"] += 1
+                    self._cond.wait(CANCEL_POLL if wait is None else min(wait, CANCEL_POLL))
+            finally:
+                self._dequeue(waiter)
+                self._cond.notify_all()
+
+    def throttle(self, seconds):
+        """Holds every caller back for seconds, e.g. after the API answered 429."""
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def position(self, ticket):
+        """Returns how many waiting calls will be admitted before ticket's first waiting call, or None if it has none."""
+        with self._cond:
+            ahead = 0
+            for priority in sorted(self._queues):
+                lanes = self._queues[priority]
+                if priority < ticket.priority:
+                    ahead += sum(len(lane) for lane in lanes.values())
+                    continue
+                if priority > ticket.priority:
+                    break
+                lane = lanes.get(ticket.session_id)
+                turn = next((index for index, waiter in enumerate(lane or ()) if waiter.ticket is ticket), None)
+                if turn is None:
+                    return None
+                # Lanes take turns, so each lane ahead of ours gets one more turn than the lanes behind it.
+                before = True
+                for session_id, other in lanes.items():
+                    if session_id == ticket.session_id:
+                        before = False
+                        ahead += turn
+                    else:
+                        ahead += min(len(other), turn + 1 if before else turn)
+                return ahead
+            return None
+
+    def stats(self):
+        """Returns admission counters and the number of calls waiting now."""
+        with self._cond:
+            stats = dict(self._stats)
+            stats["waiting"] = sum(len(lane) for lanes in self._queues.values() for lane in lanes.values())
+        return stats
+
+    def _wait_time(self, tokens, now):
+        wait = max(self._paused_until - now, self.requests.wait_time(1, now))
+        if self.tokens is not None and tokens:
+            wait = max(wait, self.tokens.wait_time(tokens, now))
+        return max(0.0, wait)
+
+    def _head(self):
+        for priority in sorted(self._queues):
+            lanes = self._queues[priority]
+            if lanes:
+                return next(iter(lanes.values()))[0]
+        return None
+
+    def _enqueue(self, waiter):
+        lanes = self._queues.setdefault(waiter.priority, OrderedDict())
+        lanes.setdefault(waiter.session_id, deque()).append(waiter)
+
+    def _admit(self, waiter, tokens, now):
+        self.requests.take(1, now)
+        if self.tokens is not None and tokens:
+            self.tokens.take(tokens, now)
+        lanes = self._queues[waiter.priority]
+        lane = lanes.pop(waiter.session_id)
+        lane.popleft()
+        if lane:
+            lanes[waiter.session_id] = lane   # Back of the line until every other session had a turn
+        self._stats["admitted"] += 1
+
+    def _dequeue(self, waiter):
+        lanes = self._queues.get(waiter.priority)
+        lane = lanes.get(waiter.session_id) if lanes is not None else None
+        if lane is not None and waiter in lane:
+            lane.remove(waiter)
+            if not lane:
+                del lanes[waiter.session_id]
@@ -0,0 +1,157 @@
+import base64
+import math
+import zlib
+from collections import Counter
+
+import numpy as np
+
+from extractive import STOP_WORDS, WORD
+from summary_pipeline import Chunker
+
+DIMENSIONS = 2 ** 12      # Hashed feature buckets per chunk vector
+CHUNK_TOKENS = 400        # Estimated tokens per indexed chunk (chunks never span pages)
+TOP_K = 24                # Best chunks considered per document for one query
+SUFFIXES = ("ing", "ed", "es", "s")
+
+
+def stem(word):
+    """Strips one common suffix, so "proteins" and "protein" hash to the same bucket."""
+    for suffix in SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 4:
+            return word[:-len(suffix)]
+    return word
+
+
+def hashed_counts(text):
+    """Returns (buckets, values): the signed, damped term counts of text in the hashed feature space.
+
+    Each term is hashed with CRC-32; the low bits pick the bucket and the top bit a
+    sign, so colliding terms tend to cancel instead of piling up.
+    """
+    counts = Counter(stem(word) for word in WORD.findall(text.lower()) if word not in STOP_WORDS)
+    buckets = np.empty(len(counts), dtype=np.int64)
+    values = np.empty(len(counts), dtype=np.float32)
+    for position, (term, count) in enumerate(counts.items()):
+        digest = zlib.crc32(term.encode())
+        buckets[position] = digest % DIMENSIONS
+        values[position] = (-1.0 if digest >> 31 else 1.0) * (1 + math.log(count))
+    return buckets, values
+
+
+def encode(array):
+    return base64.b64encode(array.tobytes()).decode('ascii')
+
+
+def decode(text, dtype):
+    return np.frombuffer(base64.b64decode(text), dtype=dtype)
+
+
+class DocumentIndex:
+    """Hashed TF-IDF vectors of one document's chunks, searched by cosine similarity on the CPU.
+
+    The vectors are rows of one L2-normalized float32 matrix, so a query is a single
+    matrix-vector product. Each chunk remembers the page it came from.
+    """
+
+    def __init__(self, chunks, pages, buckets, values, lengths):
+        self.chunks = chunks
+        self.pages = pages
+        self._sparse = (buckets, values, lengths)
+        rows = np.repeat(np.arange(len(chunks)), lengths)
+        counts = np.zeros((len(chunks), DIMENSIONS), dtype=np.float32)
+        np.add.at(counts, (rows, buckets), values)
+        document_frequency = np.count_nonzero(counts, axis=0)
+        self.idf = (np.log((len(chunks) + 1) / (document_frequency + 1)) + 1).astype(np.float32)
+        matrix = counts * self.idf
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        self.matrix = np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+
+    @classmethod
+    def build(cls, pages, estimator, chunk_tokens=CHUNK_TOKENS):
+        """Chunks each page of text and vectorizes the chunks."""
+        chunks, chunk_pages, all_buckets, all_values, lengths = [], [], [], [], []
+        for number, page in enumerate(pages, start=1):
+            chunker = Chunker(estimator, chunk_tokens)
+            for chunk in chunker.add(page) + [chunker.flush()]:
+                if not chunk:
+                    continue
+                buckets, values = hashed_counts(chunk)
+                chunks.append(chunk)
+                chunk_pages.append(number)
+                all_buckets.append(buckets)
+                all_values.append(values)
+                lengths.append(len(buckets))
+        return cls(
+            chunks,
+            chunk_pages,
+            np.concatenate(all_buckets or [np.zeros(0, dtype=np.int64)]).astype(np.int16),
+            np.concatenate(all_values or [np.zeros(0, dtype=np.float32)]).astype(np.float16),
+            np.array(lengths, dtype=np.int32),
+        )
+
+    def search(self, query, k=TOP_K):
+        """Returns up to k (chunk index, score) pairs, best first, for chunks sharing a term with query."""
+        if not self.chunks:
+            return []
+        buckets, values = hashed_counts(query)
+        vector = np.zeros(DIMENSIONS, dtype=np.float32)
+        np.add.at(vector, buckets, values)
+        vector *= self.idf
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            return []
+        scores = self.matrix @ (vector / norm)
+        k = min(k, len(scores))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best], kind='stable')]
+        return [(int(index), float(scores[index])) for index in best if scores[index] > 0]
+
+    def as_dict(self):
+        """Returns a JSON-serializable form: the sparse term counts, not the dense matrix."""
+        buckets, values, lengths = self._sparse
+        return {
+            "chunks": self.chunks,
+            "pages": self.pages,
+            "buckets": encode(buckets.astype(np.int16)),
+            "values": encode(values.astype(np.float16)),
+            "lengths": encode(lengths.astype(np.int32)),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuilds an index saved with as_dict."""
+        return cls(
+            data["chunks"],
+            data["pages"],
+            decode(data["buckets"], np.int16).astype(np.int64),
+            decode(data["values"], np.float16).astype(np.float32),
+            decode(data["lengths"], np.int32),
+        )
+
+
+def select_passages(indexes, query, max_tokens, measure):
+    """Returns the chunks most relevant to query across (name, DocumentIndex) pairs that fit max_tokens.
+
+    Chunks are picked best score first, then laid out per document in page order,
+    each under a "[name, page N]" label (just "[name]" for single-page documents).
+    Returns an empty string when nothing matches.
+    """
+    hits = []
+    for position, (name, index) in enumerate(indexes):
+        hits.extend((score, position, chunk) for chunk, score in index.search(query))
+    hits.sort(key=lambda hit: -hit[0])
+
+    picked = []
+    remaining = max_tokens
+    for score, position, chunk in hits:
+        tokens = measure(indexes[position][1].chunks[chunk])
+        if tokens <= remaining:
+            picked.append((position, chunk))
+            remaining -= tokens
+
+    passages = []
+    for position, chunk in sorted(picked):
+        name, index = indexes[position]
+        label = f"{name}, page {index.pages[chunk]}" if index.pages[-1] > 1 else name
+        passages.append(f"[{label}]\n{index.chunks[chunk]}")
+    return '\n\n'.join(passages)
@@ -1,6 +1,14 @@
 import streamlit as st
-import re
-from utils import generate_content_with_backoff, extract_text_from_file
+import html
+from utils import (
+    get_gemini_client, get_section_pool, get_summary_chunk_cache,
+    get_batch_pool, get_job_executor, submit_job, job_status_text, cancel_job, store_uploads,
+    library_pages, missing_from_library, add_to_library, search_notes, EXTRACTIVE_TOKENS, SUMMARY_SCHEMA, BATCH_MAX_FILES,
+)
+from jobs import JobQueueFull, DONE, poll_job
+from summary_pipeline import summarize_batch, summarize_document
+from summary_variants import render_summary_text
+from markdown_render import render_inline_html, render_markdown_html
 
 
 # --- CUSTOM CSS FOR SUMMARIZE NOTES ---
@@ -156,6 +164,80 @@ def inject_summary_css():
 
 
 
+def render_summary_options():
+    """Shows the format, length and highlight controls.
+
+    They change how the summary is rendered, except that a length allowed to read more
+    of the notes than fast mode gave the current summary needs a new one (see needs_more_input).
+    """
+    col_style, col_length = st.columns(2)
+    
+    with col_style:
+        summary_style = st.selectbox(
+            "Summary Format:",
+            ["Bullet Points", "Paragraph", "Both"],
+            index=["Bullet Points", "Paragraph", "Both"].index(st.session_state.summary_style),
+            help="Choose how you want the summary formatted"
+        )
+        st.session_state.summary_style = summary_style
+        
+    with col_length:
+        summary_length = st.selectbox(
+            "Summary Length:",
+            ["Short", "Medium", "Detailed"],
+            index=["Short", "Medium", "Detailed"].index(st.session_state.summary_length),
+            help="Short: Quick overview | Medium: Balanced | Detailed: Comprehensive"
+        )
+        st.session_state.summary_length = summary_length
+    
+    # Toggle button for highlight terms
+    current_state = st.session_state.get('highlight_terms', False)
+    
+    button_label = "🔍 Highlight key terms: " + ("✓ Enabled" if current_state else "Disabled")
+    button_style = "primary" if current_state else "secondary"
+    
+    if st.button(
+        button_label,
+        key="highlight_toggle",
+        type=button_style,
+        use_container_width=False
+    ):
+        st.session_state.highlight_terms = not current_state
+        st.rerun()
+
+
+def extractive_budget(length):
+    """Returns the fast-mode input budget of a summary length, or None when the whole document is read."""
+    return EXTRACTIVE_TOKENS.get(length) if st.session_state.summary_fast_mode else None
+
+
+def needs_more_input(used_budget, length):
+    """Checks whether a summary written from notes cut to used_budget tokens is too thin for length."""
+    budget = extractive_budget(length)
+    return budget is None or budget > used_budget
+
+
+def render_summary_card(title, summary_html):
+    """Renders the summary card with the given title and pre-rendered HTML body."""
+    st.markdown(f"""
+    <div style="
+        background: linear-gradient(135deg, #1A1A1A 0%, #252525 100%);
+        padding: 2.5rem;
+        border-radius: 20px;
+        border: 2px solid #333333;
+        box-shadow: 0 8px 24px rgba(0, 0, 0, 0.4);
+        margin-bottom: 2rem;
+    ">
+        <h3 style="color: #FFD700; margin-top: 0; margin-bottom: 1.5rem;">
+            {title}
+        </h3>
+        <div style="color: #FFFFFF; line-height: 1.8; font-size: 1.05rem;">
+            {summary_html}
+        </div>
+    </div>
+    """, unsafe_allow_html=True)
+
+
 def feature_summarize_notes():
     """Implements the 'Summarize Notes' feature with modern UI."""
     
@@ -180,65 +262,60 @@ def feature_summarize_notes():
         st.session_state.summary_style = "Bullet Points"
     if 'summary_generating' not in st.session_state:
         st.session_state.summary_generating = False
+    if 'summary_fast_mode' not in st.session_state:
+        st.session_state.summary_fast_mode = True
+    if 'summary_batch_combine' not in st.session_state:
+        st.session_state.summary_batch_combine = True
 
     # If showing results, display them
     if st.session_state.summary_output:
         display_summary_results()
         return
 
-    # Loading state
+    # Several files are summarized together; their results stay on screen until reset
+    if st.session_state.get('summary_batch_active'):
+        display_batch_summaries()
+        return
+
+    # Loading state (the summary streams in from a background job)
     if st.session_state.summary_generating:
-        with st.container(border=True):
-            st.markdown("""
-            <div style="padding: 2rem 1rem; text-align: center;">
-                <div style="margin-bottom: 2rem;">
-                    <div style="
-                        border: 4px solid #333333;
-                        border-top: 4px solid #FFD700;
-                        border-radius: 50%;
-                        width: 60px;
-                        height: 60px;
-                        animation: spin 1s linear infinite;
-                        margin: 0 auto;
-                    "></div>
-                </div>
-                <h3 style="color: #FFD700; margin: 0;">✨ Generating Summary...</h3>
-                <p style="color: #CCCCCC; margin-top: 0.5rem;">Please wait while we analyze your notes</p>
-            </div>
-            
-            <style>
-            @keyframes spin {
-                0% { transform: rotate(0deg); }
-                100% { transform: rotate(360deg); }
-            }
-            </style>
-            """, unsafe_allow_html=True)
-        
-        # Actually generate
         generate_summary()
         return
 
+    if st.session_state.get('summary_error'):
+        st.error(f"❌ {st.session_state.pop('summary_error')}")
+
     # Input form
     with st.container(border=True):
         st.markdown('<h3 style="color: #FFD700; margin-top: 0; margin-bottom: 0.8rem; font-size: 1.3rem;">📄 Input Your Notes</h3>', unsafe_allow_html=True)
         
         # File uploader ALWAYS SHOWN (Streamlit handles state automatically)
-        uploaded_file = st.file_uploader(
-            "Upload PDF or TXT file (max 10MB)", 
+        uploaded_files = st.file_uploader(
+            "Upload PDF or TXT files (max 10MB each)", 
             type=["pdf", "txt"],
-            help="Upload your notes to summarize. PDFs must be text-based, not scanned images.",
+            help="Upload your notes to summarize. PDFs must be text-based, not scanned images. "
+                 "Upload several files to summarize them all at once.",
             label_visibility="visible",
+            accept_multiple_files=True,
             key="file_uploader"
         )
         
-        # Store uploaded file in session state
-        if uploaded_file:
-            st.session_state.uploaded_file = uploaded_file
-            # Show indicator that file is active
-            st.success(f"✅ File loaded: {uploaded_file.name}")
-        elif 'uploaded_file' in st.session_state and st.session_state.uploaded_file:
-            # File was uploaded previously
-            st.success(f"✅ File loaded: {st.session_state.uploaded_file.name}")
+        # Keep only handles to the uploads in session state; large files are spilled to disk
+        if uploaded_files:
+            if len(uploaded_files) > BATCH_MAX_FILES:
+                st.warning(f"⚠️ Only the first {BATCH_MAX_FILES} files will be summarized.")
+                uploaded_files = uploaded_files[:BATCH_MAX_FILES]
+            st.session_state.uploaded_files = store_uploads(uploaded_files, st.session_state.get('uploaded_files'))
+        
+        stored_files = st.session_state.get('uploaded_files') or []
+        if len(stored_files) == 1:
+            st.success(f"✅ File loaded: {stored_files[0].name}")
+        elif stored_files:
+            st.success(f"✅ {len(stored_files)} files loaded: {', '.join(upload.name for upload in stored_files)}")
+        
+        # Every file this session has uploaded stays searchable, even after a new summary is started
+        if stored_files or st.session_state.get('notes_library_used'):
+            render_notes_search(stored_files)
         
         st.markdown('<p style="text-align: center; color: #666666; margin: 0.3rem 0; font-size: 0.9rem;">── OR ──</p>', unsafe_allow_html=True)
         
@@ -256,16 +333,18 @@ def feature_summarize_notes():
         if text_input != st.session_state.summary_input_text:
             st.session_state.summary_input_text = text_input
             # Clear uploaded file if user starts typing
-            if len(text_input.strip()) > 0 and st.session_state.get('uploaded_file'):
-                st.session_state.pop('uploaded_file', None)
+            if len(text_input.strip()) > 0 and st.session_state.get('uploaded_files'):
+                st.session_state.pop('uploaded_files', None)
                 st.info("ℹ️ File input cleared - using text input")
         
         # Show which input is active
-        has_file = uploaded_file is not None or st.session_state.get('uploaded_file') is not None
+        has_file = bool(st.session_state.get('uploaded_files'))
         has_text = len(text_input.strip()) > 0
         
         if has_file and has_text:
             st.warning("⚠️ Both file and text detected - text will be used. Clear text to use file.")
+        elif has_file and len(st.session_state.uploaded_files) > 1:
+            st.info("📚 Each file gets its own summary")
         elif has_file:
             st.info("📁 Using file input")
         elif has_text:
@@ -276,47 +355,40 @@ def feature_summarize_notes():
         if text_input != st.session_state.summary_input_text:
             st.session_state.summary_input_text = text_input
         
-        # Store uploaded file in session
-        if uploaded_file:
-            st.session_state.uploaded_file = uploaded_file
-        
         # Options header with NO anchor link and reduced spacing
         st.markdown('<div style="margin-top: 1rem;"><h4 style="color: #FFD700; margin: 0 0 0.5rem 0; font-size: 1.05rem;">⚙️ Summary Options</h4></div>', unsafe_allow_html=True)
         
-        col_style, col_length = st.columns(2)
+        render_summary_options()
+        summary_length = st.session_state.summary_length
         
-        with col_style:
-            summary_style = st.selectbox(
-                "Summary Format:",
-                ["Bullet Points", "Paragraph", "Both"],
-                index=["Bullet Points", "Paragraph", "Both"].index(st.session_state.summary_style),
-                help="Choose how you want the summary formatted"
-            )
-            st.session_state.summary_style = summary_style
-            
-        with col_length:
-            summary_length = st.selectbox(
-                "Summary Length:",
-                ["Short", "Medium", "Detailed"],
-                index=["Short", "Medium", "Detailed"].index(st.session_state.summary_length),
-                help="Short: Quick overview | Medium: Balanced | Detailed: Comprehensive"
-            )
-            st.session_state.summary_length = summary_length
-        
-        # Toggle button for highlight terms
-        current_state = st.session_state.get('highlight_terms', False)
+        # Fast mode only applies where a shorter summary can afford to skip minor sentences
+        if summary_length in EXTRACTIVE_TOKENS:
+            fast_mode = st.session_state.summary_fast_mode
+            if st.button(
+                "⚡ Fast mode for long notes: " + ("✓ Enabled" if fast_mode else "Disabled"),
+                key="fast_mode_toggle",
+                type="primary" if fast_mode else "secondary",
+                help="Long notes are cut down to their key sentences on this device before the summary is written",
+                use_container_width=False
+            ):
+                st.session_state.summary_fast_mode = not fast_mode
+                st.rerun()
         
-        button_label = "🔍 Highlight key terms: " + ("✓ Enabled" if current_state else "Disabled")
-        button_style = "primary" if current_state else "secondary"
+        if has_file and not has_text and len(st.session_state.uploaded_files) > 1:
+            st.session_state.summary_batch_combine = st.checkbox(
+                "🧩 Also write one combined summary of all files",
+                value=st.session_state.summary_batch_combine,
+                help="Built from the per-file summaries, so the notes are not sent again"
+            )
         
-        if st.button(
-            button_label,
-            key="highlight_toggle",
-            type=button_style,
-            use_container_width=False
-        ):
-            st.session_state.highlight_terms = not current_state
-            st.rerun()
+        page_filter = ""
+        if has_file and not has_text:
+            page_filter = st.text_input(
+                "🎯 Only summarize pages that mention (optional):",
+                placeholder='e.g., photosynthesis, "light reactions"',
+                help="Leave empty to summarize every page. A page must contain every word; put phrases in quotes.",
+                key="summary_page_filter_input"
+            )
         
         # Generate button
         st.markdown('<div style="margin-top: 0.8rem;">', unsafe_allow_html=True)
@@ -333,7 +405,7 @@ def feature_summarize_notes():
                 if text_input.strip():
                     # Text takes priority
                     source_text = text_input
-                elif st.session_state.get('uploaded_file') or uploaded_file:
+                elif has_file:
                     # Use file if no text
                     source_text = "file_uploaded"
                 
@@ -341,7 +413,12 @@ def feature_summarize_notes():
                     st.warning("⚠️ Please upload a file or paste text to summarize.")
                 elif source_text != "file_uploaded" and len(source_text.strip()) < 50:
                     st.warning("⚠️ Text is too short to summarize. Please provide more content (at least 50 characters).")
+                elif len(st.session_state.get('uploaded_files') or []) > 1 and not text_input.strip():
+                    st.session_state.summary_pages_query = page_filter.strip()
+                    st.session_state.summary_batch_active = True
+                    st.rerun()
                 else:
+                    st.session_state.summary_pages_query = page_filter.strip()
                     st.session_state.summary_generating = True
                     st.rerun()
         
@@ -349,49 +426,54 @@ def feature_summarize_notes():
 
 
 
-def generate_summary():
-    """Actually performs the summary generation."""
-    source_text = ""
-    
-    # Get text source
-    if st.session_state.get('uploaded_file'):
-        source_text = extract_text_from_file(st.session_state.uploaded_file)
-        if source_text:
-            st.session_state.summary_input_text = ""
-    elif st.session_state.summary_input_text.strip():
-        source_text = st.session_state.summary_input_text
-    
-    if not source_text or len(source_text.strip()) < 50:
-        st.session_state.summary_generating = False
-        st.rerun()
+def render_summary_progress(job):
+    """Shows the summary streamed so far, or the spinner until the first words arrive."""
+    if job.partial:
+        render_summary_card(
+            f"✨ Writing your {st.session_state.summary_length} Summary...",
+            render_markdown_html(job.partial, st.session_state.get('highlight_terms', False))
+        )
         return
     
-    # Construct prompt with BETTER highlighting instruction
-    highlight_instruction = (
-        "Highlight ONLY the 5-7 most critical key terms or concepts using **bold** markdown (e.g., **photosynthesis**). Be selective - do not bold common words or entire phrases, only the most important technical terms or concepts." 
-        if st.session_state.get('highlight_terms', False) else 
-        "Do not use any bold formatting. Keep all text plain without any markdown."
-    )
-    
-    length_guidance = {
-        "Short": "Be very concise. Aim for 3-5 sentences or 3-5 bullet points.",
-        "Medium": "Provide a balanced summary. Aim for 1-2 paragraphs or 5-8 bullet points.",
-        "Detailed": "Give a comprehensive summary. Aim for 2-3 paragraphs or 8-12 bullet points."
-    }
-    
-    summary_style = st.session_state.summary_style
-    summary_length = st.session_state.summary_length
-    
-    system_prompt = f"""
+    with st.container(border=True):
+        st.markdown(f"""
+        <div style="padding: 2rem 1rem; text-align: center;">
+            <div style="margin-bottom: 2rem;">
+                <div style="
+                    border: 4px solid #333333;
+                    border-top: 4px solid #FFD700;
+                    border-radius: 50%;
+                    width: 60px;
+                    height: 60px;
+                    animation: spin 1s linear infinite;
+                    margin: 0 auto;
+                "></div>
+            </div>
+            <h3 style="color: #FFD700; margin: 0;">✨ Generating Summary...</h3>
+            <p style="color: #CCCCCC; margin-top: 0.5rem;">Please wait while we analyze your notes</p>
+            <p style="color: #999999; margin-top: 0.5rem; font-size: 0.9rem;">{job_status_text(job) or job.progress}</p>
+        </div>
+        
+        <style>
+        @keyframes spin {{
+            0% {{ transform: rotate(0deg); }}
+            100% {{ transform: rotate(360deg); }}
+        }}
+        </style>
+        """, unsafe_allow_html=True)
+
+
+def build_summary_payload(source_text):
+    """Builds the structured summarization request every format, length and highlight option is rendered from."""
+    system_prompt = """
     You are 'MyBuddy', an AI study companion specialized in creating clear, concise summaries.
     
     Your task:
-    - Summarize the provided notes in a {summary_style} format
-    - Length: {summary_length} - {length_guidance[summary_length]}
-    - Formatting: {highlight_instruction}
+    - Rank the 12 most important key points of the notes, most important first
+    - Write the summary as 3 paragraphs: a 3-5 sentence overview, then two that each add detail
+    - List up to 10 key terms or concepts with how essential each one is
     - Focus on the main ideas, key concepts, and important details
-    - Use clear, student-friendly language
-    - Organize information logically
+    - Use clear, student-friendly language and plain text without markdown
     
     Important:
     - Do not add information not present in the original text
@@ -401,34 +483,144 @@ def generate_summary():
     
     user_prompt = f"""Summarize the following notes.
 
-Style: {summary_style}
-Length: {summary_length}
-
 Notes to summarize:
 
 {source_text}
 """
     
-    payload = {
+    return {
         "contents": [{"parts": [{"text": user_prompt}]}],
         "systemInstruction": {"parts": [{"text": system_prompt}]},
         "generationConfig": {
             "temperature": 0.3,
             "topP": 0.8,
-            "topK": 40
+            "topK": 40,
+            "responseMimeType": "application/json",
+            "responseSchema": SUMMARY_SCHEMA
         },
         "model": "gemini-2.5-flash-preview-05-20"
     }
+
+
+def build_section_payload(section_text):
+    """Builds the request that condenses one section of a long document before the final summary."""
+    system_prompt = """
+    You are 'MyBuddy', an AI study companion. You are given one section of a longer document.
+    Condense it into dense notes that keep every key concept, definition, name, number and
+    conclusion. Do not add information that is not in the section. Plain text, no preamble.
+    """
     
-    # Call API
-    response_text = generate_content_with_backoff(payload)
+    return {
+        "contents": [{"parts": [{"text": f"Section to condense:\n\n{section_text}"}]}],
+        "systemInstruction": {"parts": [{"text": system_prompt}]},
+        "generationConfig": {
+            "temperature": 0.2,
+            "topP": 0.8,
+            "topK": 40
+        },
+        "model": "gemini-2.5-flash-preview-05-20"
+    }
+
+
+def cancel_summary_generation():
+    """Aborts a pending summary and returns the tab to its form."""
+    cancel_job(st.session_state.pop('summary_job_id', None))
+    st.session_state.pop('summary_regenerate', None)
+    st.session_state.pop('summary_page_source', None)
+    st.session_state.summary_generating = False
+
+
+def cancel_batch_summaries():
+    """Aborts a running batch and forgets its results."""
+    cancel_job(st.session_state.pop('summary_batch_job_id', None))
+    for key in ('summary_batch_active', 'summary_batch_names', 'summary_batch_results', 'summary_batch_combined',
+                'summary_batch_budget'):
+        st.session_state.pop(key, None)
+
+
+def reset_summary_state():
+    """Clears the current summary and its source so a new one can be started."""
+    cancel_summary_generation()
+    cancel_batch_summaries()
+    st.session_state.summary_output = None
+    st.session_state.summary_input_text = ""
+    st.session_state.pop('uploaded_files', None)
+    st.session_state.pop('original_text', None)
+    st.session_state.pop('summary_notes', None)
+    st.session_state.pop('summary_cleanup', None)
+    st.session_state.pop('summary_chunks', None)
+    st.session_state.pop('summary_extractive', None)
+    st.session_state.pop('summary_input_budget', None)
+    st.session_state.pop('summary_pages_query', None)
+    st.session_state.pop('summary_pages', None)
+
+
+def generate_summary():
+    """Submits the summary to the background job pool, then polls it until it finishes.
+
+    PDFs are extracted inside the job, so the model starts on the first sections while
+    later pages are still being parsed. The job also adds the upload to the note
+    library, and with a page filter finds the matching pages there first.
+    """
+    executor = get_job_executor()
+    job = executor.get(st.session_state.get('summary_job_id'))
     
-    if response_text:
-        st.session_state.summary_output = response_text
-        st.session_state.original_text = source_text
+    if job is None:
+        pages = None
+        
+        # Get text source; uploads are read, added to the note library and (with a page
+        # filter) searched inside the job
+        uploaded_file = next(iter(st.session_state.get('uploaded_files') or []), None)
+        if uploaded_file:
+            pages = library_pages(uploaded_file, st.session_state.get('summary_pages_query') or None)
+            st.session_state.summary_page_source = pages
+            st.session_state.summary_input_text = ""
+        elif st.session_state.summary_input_text.strip():
+            pages = [st.session_state.summary_input_text]
+        
+        if pages is None or (isinstance(pages, list) and sum(len(page.strip()) for page in pages) < 50):
+            st.session_state.summary_generating = False
+            st.rerun()
+            return
+        
+        # Regenerate bypasses the shared response cache
+        regenerate = st.session_state.pop('summary_regenerate', False)
+        extractive_tokens = extractive_budget(st.session_state.summary_length)
+        st.session_state.summary_input_budget = extractive_tokens
+        try:
+            job = submit_job(
+                summarize_document, get_gemini_client(), pages, build_summary_payload, build_section_payload,
+                get_section_pool(), regenerate=regenerate, chunk_cache=get_summary_chunk_cache(),
+                extractive_tokens=extractive_tokens
+            )
+        except JobQueueFull as e:
+            st.session_state.summary_error = str(e)
+            st.session_state.summary_generating = False
+            st.rerun()
+            return
+        st.session_state.summary_job_id = job.id
+    
+    if job.done:
+        executor.forget(job.id)
+        st.session_state.pop('summary_job_id', None)
+        source = st.session_state.pop('summary_page_source', None)
+        if job.status == DONE and job.result:
+            st.session_state.summary_output = job.result
+            st.session_state.original_text = job.meta.get('source_text', '')
+            st.session_state.summary_notes = job.meta.get('notes', [])
+            st.session_state.summary_cleanup = job.meta.get('normalization')
+            st.session_state.summary_chunks = job.meta.get('chunks')
+            st.session_state.summary_extractive = job.meta.get('extractive')
+            st.session_state.summary_pages = getattr(source, 'numbers', None)
+            if source is not None:
+                st.session_state.notes_library_used = True
+        else:
+            st.session_state.summary_error = f"Summary failed: {job.error}"
+        st.session_state.summary_generating = False
+        st.rerun()
+        return
     
-    st.session_state.summary_generating = False
-    st.rerun()
+    poll_job(job, render_summary_progress)
 
 
 def display_summary_results():
@@ -444,10 +636,29 @@ def display_summary_results():
     </div>
     """, unsafe_allow_html=True)
     
+    for note in st.session_state.get('summary_notes', []):
+        st.warning(f"⚠️ {note}")
+    
+    # Options are applied to the one generated summary, so switching them needs no new request...
+    render_summary_options()
+    # ...unless fast mode cut the notes and the new length may read more of them
+    if st.session_state.get('summary_extractive') and needs_more_input(
+        st.session_state.get('summary_input_budget'), st.session_state.summary_length
+    ):
+        st.session_state.summary_output = None
+        st.session_state.summary_generating = True
+        st.rerun()
+    summary_text = render_summary_text(
+        st.session_state.summary_output,
+        st.session_state.summary_style,
+        st.session_state.summary_length,
+        st.session_state.get('highlight_terms', False)
+    )
+    
     # Statistics FIRST
     if st.session_state.get('original_text'):
         original_words = len(st.session_state.original_text.split())
-        summary_words = len(st.session_state.summary_output.split())
+        summary_words = len(summary_text.split())
         reduction = ((original_words - summary_words) / original_words * 100) if original_words > 0 else 0
         
         col_stats1, col_stats2, col_stats3 = st.columns(3)
@@ -494,58 +705,44 @@ def display_summary_results():
             </div>
             """, unsafe_allow_html=True)
     
-    st.markdown("<br><br>", unsafe_allow_html=True)
-    
-    # Summary card SECOND
-        # Summary card SECOND with proper formatting (reduced spacing)
-    import html
-    
-    # Process the summary text
-    summary_raw = st.session_state.summary_output
-    
-    # Escape HTML to prevent injection
-    summary_escaped = html.escape(summary_raw)
-    
-    # Handle bold markdown if highlighting is enabled
-    if st.session_state.get('highlight_terms', False):
-        summary_escaped = re.sub(r'\*\*(.*?)\*\*', r'<strong style="color: #FFD700;">\1</strong>', summary_escaped)
-    
-    # Convert markdown bullet points to HTML (REDUCED margin)
-    summary_escaped = re.sub(r'^[\-\*]\s+(.+)$', r'<div style="margin-left: 1.5rem; margin-bottom: 0.3rem;">• \1</div>', summary_escaped, flags=re.MULTILINE)
-    
-    # Convert numbered lists to HTML (REDUCED margin)
-    summary_escaped = re.sub(r'^(\d+)\.\s+(.+)$', r'<div style="margin-left: 1.5rem; margin-bottom: 0.3rem;"><strong style="color: #FFD700;">\1.</strong> \2</div>', summary_escaped, flags=re.MULTILINE)
-    
-    # Convert double line breaks to paragraphs
-    summary_escaped = re.sub(r'\n\n', '</p><p style="margin-bottom: 0.8rem;">', summary_escaped)
-    
-    # Convert single line breaks to <br>
-    summary_escaped = summary_escaped.replace('\n', '<br>')
+    cleanup = st.session_state.get('summary_cleanup')
+    if cleanup and cleanup['chars_saved']:
+        st.caption(
+            f"🧹 Removed {cleanup['chars_saved']:,} characters of headers, page numbers and spacing "
+            f"before summarizing (~{cleanup['tokens_saved']:,} fewer input tokens)"
+        )
+    chunks = st.session_state.get('summary_chunks')
+    if chunks and chunks['reused']:
+        st.caption(
+            f"♻️ Reused {chunks['reused']} of {chunks['total']} section summaries from an earlier upload; "
+            "only new or changed sections were sent to the model"
+        )
+    selected_pages = st.session_state.get('summary_pages')
+    if selected_pages:
+        st.caption(
+            f"🎯 Summarized only page{'s' if len(selected_pages) > 1 else ''} {page_ranges(selected_pages)}, "
+            f"the ones that mention {st.session_state.get('summary_pages_query')}"
+        )
+    extractive = st.session_state.get('summary_extractive')
+    if extractive:
+        st.caption(
+            f"⚡ Fast mode kept the {extractive['sentences_kept']:,} most informative of "
+            f"{extractive['sentences_total']:,} sentences (~{extractive['tokens_before']:,} → "
+            f"~{extractive['tokens_after']:,} input tokens)"
+        )
     
-    # Wrap in paragraph tags
-    summary_html = f'<p style="margin-bottom: 0.8rem;">{summary_escaped}</p>'
+    st.markdown("<br><br>", unsafe_allow_html=True)
     
-    st.markdown(f"""
-    <div style="
-        background: linear-gradient(135deg, #1A1A1A 0%, #252525 100%);
-        padding: 2.5rem;
-        border-radius: 20px;
-        border: 2px solid #333333;
-        box-shadow: 0 8px 24px rgba(0, 0, 0, 0.4);
-        margin-bottom: 2rem;
-    ">
-        <h3 style="color: #FFD700; margin-top: 0; margin-bottom: 1.5rem;">
-            📋 {st.session_state.summary_length} Summary ({st.session_state.summary_style})
-        </h3>
-        <div style="color: #FFFFFF; line-height: 1.8; font-size: 1.05rem;">
-            {summary_html}
-        </div>
-    </div>
-    """, unsafe_allow_html=True)
+    # Summary card SECOND with proper formatting (reduced spacing)
+    summary_html = render_markdown_html(summary_text, st.session_state.get('highlight_terms', False))
+    render_summary_card(
+        f"📋 {st.session_state.summary_length} Summary ({st.session_state.summary_style})",
+        summary_html
+    )
 
     
     # Action buttons LAST
-    col1, col2, col3 = st.columns(3)
+    col1, col2, col3, col4 = st.columns(4)
     
     with col1:
         if st.button("📋 Copy Tip", use_container_width=True, type="secondary"):
@@ -554,7 +751,7 @@ def display_summary_results():
     with col2:
         st.download_button(
             label="💾 Download TXT",
-            data=st.session_state.summary_output,
+            data=summary_text,
             file_name="mybuddy_summary.txt",
             mime="text/plain",
             use_container_width=True,
@@ -562,9 +759,236 @@ def display_summary_results():
         )
     
     with col3:
-        if st.button("🔄 New Summary", use_container_width=True, type="secondary"):
+        if st.button("🔁 Regenerate", use_container_width=True, type="secondary", key="regen_summary_btn"):
             st.session_state.summary_output = None
-            st.session_state.summary_input_text = ""
-            st.session_state.pop('uploaded_file', None)
-            st.session_state.pop('original_text', None)
+            st.session_state.summary_regenerate = True
+            st.session_state.summary_generating = True
+            st.rerun()
+    
+    with col4:
+        if st.button("🔄 New Summary", use_container_width=True, type="secondary"):
+            reset_summary_state()
+            st.rerun()
+
+
+# --- Note Search ---
+def render_notes_search(uploads):
+    """Keyword search over every file this session has uploaded, listing the best-matching pages."""
+    with st.expander("🔍 Search your notes"):
+        query = st.text_input(
+            "Find pages that mention:",
+            placeholder='e.g., enzyme "active site"',
+            help="A page must contain every word; put phrases in quotes.",
+            key="notes_search_query"
+        )
+        if not query.strip():
+            return
+        # Files no session has added yet are read on a worker first
+        executor = get_job_executor()
+        job = executor.get(st.session_state.get('notes_library_job_id'))
+        if job is None:
+            missing = missing_from_library(uploads)
+            if missing:
+                try:
+                    job = submit_job(add_to_library, [library_pages(upload) for upload in missing])
+                except JobQueueFull as e:
+                    st.error(f"❌ {e}")
+                    return
+                st.session_state.notes_library_job_id = job.id
+        if job is not None and not job.done:
+            poll_job(job, render_library_progress)
+            return
+        if job is not None:
+            executor.forget(job.id)
+            st.session_state.pop('notes_library_job_id', None)
+            if job.status != DONE:
+                st.error(f"❌ Error adding your notes to the library: {job.error}")
+                return
+        results = search_notes(query)
+        st.session_state.notes_library_used = True
+        if not results:
+            st.caption(f"No page mentions {query}.")
+            return
+        st.caption(f"{len(results)} matching page{'s' if len(results) > 1 else ''}, best match first")
+        for result in results:
+            snippet = render_inline_html(' '.join(result['snippet'].split()))
+            st.markdown(f"""
+            <div style="margin-bottom: 0.7rem;">
+                <strong style="color: #FFD700;">📄 {html.escape(result['name'])} · page {result['page']}</strong><br>
+                <span style="color: #CCCCCC; font-size: 0.95rem;">{snippet}</span>
+            </div>
+            """, unsafe_allow_html=True)
+
+
+def render_library_progress(job):
+    """Shows which file is being added to the note library."""
+    st.caption(job.progress or "📚 Adding your files to the library...")
+    status = job_status_text(job)
+    if status:
+        st.caption(status)
+
+
+def page_ranges(numbers):
+    """Formats sorted page numbers compactly, e.g. [1, 2, 3, 7] as "1–3, 7"."""
+    ranges = []
+    for number in numbers:
+        if ranges and number == ranges[-1][1] + 1:
+            ranges[-1][1] = number
+        else:
+            ranges.append([number, number])
+    return ', '.join(str(first) if first == last else f"{first}–{last}" for first, last in ranges)
+
+
+# --- Batch Summaries ---
+def batch_documents(uploads, pages_query=None):
+    """Returns (name, pages) for each upload; the pages are read inside the job (see library_pages).
+
+    With pages_query, each file is cut to its pages that mention it, found in the note
+    library; a file with no such page is reported as failed.
+    """
+    return [(upload.name, library_pages(upload, pages_query or None)) for upload in uploads]
+
+
+def render_batch_file(result):
+    """Shows one file's summary in the current format, length and highlight setting."""
+    name = result['name']
+    if result['error']:
+        st.error(f"❌ {name}: {result['error']}")
+        return
+    for note in result['notes']:
+        st.warning(f"⚠️ {name}: {note}")
+    highlight = st.session_state.get('highlight_terms', False)
+    summary_text = render_summary_text(
+        result['summary'], st.session_state.summary_style, st.session_state.summary_length, highlight
+    )
+    render_summary_card(f"📄 {html.escape(name)}", render_markdown_html(summary_text, highlight))
+
+
+def render_batch_progress(job):
+    """Shows the files still in progress, then every summary that has already finished."""
+    names = st.session_state.get('summary_batch_names', [])
+    results = sorted(job.items, key=lambda result: result['index'])
+    finished = {result['index'] for result in results}
+    progress = dict(job.meta.get('files', {}))
+    
+    with st.container(border=True):
+        st.markdown(f'<h4 style="color: #FFD700; margin: 0;">⏳ {len(finished)} of {len(names)} files summarized</h4>', unsafe_allow_html=True)
+        status = job_status_text(job)
+        if status:
+            st.caption(status)
+        for index, name in enumerate(names):
+            if index not in finished:
+                st.caption(f"📄 {name}: {progress.get(index) or 'Waiting for a free worker...'}")
+        if len(finished) == len(names) and st.session_state.summary_batch_combine:
+            st.caption(f"🧩 Combining the summaries: {job.progress}")
+    
+    for result in results:
+        render_batch_file(result)
+
+
+def display_batch_summaries():
+    """Summarizes every uploaded file in one background job and shows each summary as soon as it is ready."""
+    st.markdown("""
+    <div style="text-align: center; margin-bottom: 2rem;">
+        <h1 style="color: #FFD700; margin: 0; font-size: 2.5rem; margin-bottom: 0.5rem;">📚 Your Summaries</h1>
+        <p style="color: #999999; margin: 0; font-size: 1rem;">One summary per file</p>
+    </div>
+    """, unsafe_allow_html=True)
+    
+    # Options are applied to the generated summaries, so switching them needs no new request...
+    render_summary_options()
+    # ...unless fast mode cut some file and the new length may read more of it
+    results = st.session_state.get('summary_batch_results')
+    if results and any(result.get('extractive') for result in results) and needs_more_input(
+        st.session_state.get('summary_batch_budget'), st.session_state.summary_length
+    ):
+        st.session_state.pop('summary_batch_results', None)
+        st.session_state.pop('summary_batch_combined', None)
+    if st.session_state.get('summary_pages_query'):
+        st.caption(f"🎯 Only the pages that mention {st.session_state.summary_pages_query} are summarized")
+    
+    executor = get_job_executor()
+    job = executor.get(st.session_state.get('summary_batch_job_id'))
+    
+    if job is None and 'summary_batch_results' not in st.session_state:
+        documents = batch_documents(
+            st.session_state.get('uploaded_files') or [], st.session_state.get('summary_pages_query')
+        )
+        if not documents:
+            st.session_state.summary_error = "None of the files contained text to summarize."
+            cancel_batch_summaries()
+            st.rerun()
+            return
+        extractive_tokens = extractive_budget(st.session_state.summary_length)
+        st.session_state.summary_batch_budget = extractive_tokens
+        try:
+            job = submit_job(
+                summarize_batch, get_gemini_client(), documents, build_summary_payload, build_section_payload,
+                get_section_pool(), get_batch_pool(), chunk_cache=get_summary_chunk_cache(),
+                extractive_tokens=extractive_tokens, combine=st.session_state.summary_batch_combine
+            )
+        except JobQueueFull as e:
+            st.session_state.summary_error = str(e)
+            cancel_batch_summaries()
             st.rerun()
+            return
+        st.session_state.summary_batch_job_id = job.id
+        st.session_state.summary_batch_names = [name for name, _ in documents]
+    
+    if job is not None and job.done:
+        executor.forget(job.id)
+        st.session_state.pop('summary_batch_job_id', None)
+        if job.status == DONE:
+            st.session_state.summary_batch_results = sorted(job.items, key=lambda result: result['index'])
+            st.session_state.summary_batch_combined = job.result
+            st.session_state.notes_library_used = True
+        else:
+            st.session_state.summary_error = f"Summary failed: {job.error}"
+            cancel_batch_summaries()
+        st.rerun()
+        return
+    
+    if job is not None:
+        poll_job(job, render_batch_progress)
+        return
+    
+    results = st.session_state.summary_batch_results
+    combined = st.session_state.get('summary_batch_combined')
+    highlight = st.session_state.get('highlight_terms', False)
+    download_parts = []
+    
+    if combined:
+        combined_text = render_summary_text(
+            combined, st.session_state.summary_style, st.session_state.summary_length, highlight
+        )
+        render_summary_card(
+            f"🧩 Combined Summary ({sum(1 for result in results if result['summary'])} files)",
+            render_markdown_html(combined_text, highlight)
+        )
+        download_parts.append(f"COMBINED SUMMARY\n\n{combined_text}")
+    
+    for result in results:
+        render_batch_file(result)
+        if result['summary']:
+            file_text = render_summary_text(
+                result['summary'], st.session_state.summary_style, st.session_state.summary_length, highlight
+            )
+            download_parts.append(f"{result['name']}\n\n{file_text}")
+    
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        st.download_button(
+            label="💾 Download All (TXT)",
+            data=f"\n\n{'=' * 60}\n\n".join(download_parts),
+            file_name="mybuddy_summaries.txt",
+            mime="text/plain",
+            use_container_width=True,
+            key="download_batch_btn"
+        )
+    
+    with col2:
+        if st.button("🔄 New Summary", use_container_width=True, type="secondary", key="new_batch_btn"):
+            reset_summary_state()
+            st.rerun()
+
@@ -0,0 +1,358 @@
+import hashlib
+import re
+from collections import deque
+from concurrent.futures import Future, as_completed
+
+from extractive import select_key_sentences
+from gemini_client import payload_key
+from pdf_extraction import truncation_notice
+from summary_variants import render_summary_text, stream_structured_summary
+from text_normalization import PageNormalizer
+
+CHUNK_TOKENS = 3000       # Estimated source tokens per map (chunk summary) request
+SINGLE_SHOT_TOKENS = 8000 # Documents up to this size skip map-reduce and go out in one call
+REDUCE_TOKENS = 12000     # Partial summaries above this are merged in groups before the final call
+MIN_SOURCE_CHARS = 50     # Less text than this is not worth summarizing
+PROMPT_ALLOWANCE = 1024   # Tokens of instructions reserved next to the notes in the final call
+
+# --- Content-Defined Chunks ---
+MIN_CHUNK_TOKENS = 1500   # No content-defined boundary before a chunk has this many tokens
+MAX_CHUNK_TOKENS = 6000   # A boundary is forced here if the content offered none
+ANCHOR_WINDOW = 3         # Sentences hashed together to decide whether a boundary follows them
+
+# --- Extractive Pre-Summary ---
+LONG_SENTENCE_TOKENS = 150  # Longer "sentences" (lists, tables, code) are ranked line by line
+
+PARAGRAPH_BREAK = re.compile(r'\n\s*\n')
+SENTENCE_BREAK = re.compile(r'(?<=[.!?])\s+|(?<=[.!?]["\')\]])\s+')
+
+
+class Chunker:
+    """Packs streamed text into chunks of at most max_tokens estimated tokens.
+
+    Chunks end on paragraph boundaries where possible, then on sentence boundaries,
+    and only split inside a sentence that is longer than a whole chunk.
+    """
+
+    def __init__(self, estimator, max_tokens=CHUNK_TOKENS):
+        self.estimator = estimator
+        self.measure = estimator.estimate
+        self.max_tokens = max_tokens
+        self._parts = []
+        self._tokens = 0
+
+    def add(self, text):
+        """Adds text (e.g. one page) and returns the chunks it completed."""
+        chunks = []
+        for piece, tokens, joiner in self._units(text):
+            chunks.extend(self._append(piece, tokens, joiner))
+        return chunks
+
+    def _units(self, text):
+        """Yields (text, tokens, joiner) for each paragraph, or each sentence of a paragraph too long to keep whole."""
+        for paragraph in PARAGRAPH_BREAK.split(text):
+            paragraph = paragraph.strip()
+            if not paragraph:
+                continue
+            tokens = self.measure(paragraph)
+            if tokens <= self.max_tokens:
+                yield paragraph, tokens, '\n\n'
+                continue
+            for sentence in SENTENCE_BREAK.split(paragraph):
+                for piece in self._split_long(sentence):
+                    yield piece, self.measure(piece), ' '
+
+    def flush(self):
+        """Returns the last, partly filled chunk (None if there is none)."""
+        chunk = ''.join(self._parts).strip() or None
+        self._parts, self._tokens = [], 0
+        return chunk
+
+    def _append(self, text, tokens, joiner):
+        chunks = []
+        if self._parts and self._tokens + tokens > self.max_tokens:
+            chunks.append(self.flush())
+        self._parts.append(joiner + text if self._parts else text)
+        self._tokens += tokens
+        return chunks
+
+    def _split_long(self, sentence):
+        tokens = self.measure(sentence)
+        while tokens > self.max_tokens:
+            head = sentence[:max(1, int(len(sentence) * self.max_tokens / tokens * 0.95))]
+            cut = head.rfind(' ', len(head) // 2)
+            head = head[:cut] if cut > 0 else head
+            yield head
+            sentence = sentence[len(head):].lstrip()
+            tokens = self.measure(sentence)
+        if sentence:
+            yield sentence
+
+
+class ContentDefinedChunker(Chunker):
+    """Chunker whose boundaries follow the content rather than the position in the document.
+
+    A hash over the last ANCHOR_WINDOW sentences decides whether a chunk may end after
+    them, with the odds set so chunks average about target_tokens. Inserting or editing
+    pages therefore only changes the chunks around the edit; every other chunk comes
+    out byte-identical to the previous upload, so its cached summary can be reused.
+    """
+
+    def __init__(self, estimator, target_tokens=CHUNK_TOKENS, min_tokens=MIN_CHUNK_TOKENS,
+                 max_tokens=MAX_CHUNK_TOKENS):
+        super().__init__(estimator, max_tokens)
+        # The raw count, not the calibrated estimate: boundaries must not move as calibration does.
+        self.measure = estimator.count
+        self.min_tokens = min_tokens
+        self.spread = max(1, target_tokens - min_tokens)
+        self._window = deque(maxlen=ANCHOR_WINDOW)
+
+    def _units(self, text):
+        # Sentence granularity keeps boundaries stable when a paragraph grows.
+        for paragraph in PARAGRAPH_BREAK.split(text):
+            joiner = '\n\n'
+            for sentence in SENTENCE_BREAK.split(paragraph.strip()):
+                for piece in self._split_long(sentence):
+                    if piece:
+                        yield piece, self.measure(piece), joiner
+                        joiner = ' '
+
+    def _append(self, text, tokens, joiner):
+        chunks = super()._append(text, tokens, joiner)
+        self._window.append(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest())
+        anchor = int.from_bytes(hashlib.blake2b(b''.join(self._window), digest_size=8).digest(), 'big')
+        # Each sentence ends a chunk with probability tokens / spread once the chunk is past min_tokens.
+        if self._tokens >= self.min_tokens and anchor < (tokens / self.spread) * 2 ** 64:
+            chunks.append(self.flush())
+        return chunks
+
+
+def split_sentences(text, measure):
+    """Returns the paragraphs of text as lists of sentences, breaking overly long sentences into lines."""
+    paragraphs = []
+    for paragraph in PARAGRAPH_BREAK.split(text):
+        sentences = []
+        for sentence in SENTENCE_BREAK.split(paragraph.strip()):
+            if measure(sentence) > LONG_SENTENCE_TOKENS:
+                sentences.extend(line.strip() for line in sentence.split('\n') if line.strip())
+            elif sentence:
+                sentences.append(sentence)
+        if sentences:
+            paragraphs.append(sentences)
+    return paragraphs
+
+
+def summarize_document(job, client, pages, build_payload, build_section_payload, section_pool, regenerate=False,
+                       chunk_cache=None, extractive_tokens=None):
+    """Job body that map-reduces a document into a summary while it is still being extracted.
+
+    Pages are normalized on the way in (see text_normalization) and cut into
+    content-defined chunks of about CHUNK_TOKENS. A document that stays under
+    SINGLE_SHOT_TOKENS goes to the model in one streamed call. Anything longer is
+    mapped: every chunk is summarized on section_pool as soon as it is complete,
+    under the shared rate limiter, so wall-clock time follows the number of workers
+    rather than the page count. The partial summaries are then reduced, in parallel groups while they exceed
+    REDUCE_TOKENS, and the final streamed call returns the structured summary
+    (see summary_variants) that every style and length is rendered from. Chunk summaries found in chunk_cache (keyed on the chunk's request)
+    are reused instead of requested, so re-uploading a document with a few pages
+    added only pays for the new chunks.
+
+    With extractive_tokens set, a document longer than that is instead cut down
+    locally to its most central sentences (see extractive) and summarized in a
+    single call, skipping the map step entirely. job.meta receives the cleaned
+    source text, what normalization and extraction saved, chunk reuse counts and
+    any notes for the user.
+    """
+    estimator = client.estimator
+    normalizer = PageNormalizer(estimator=estimator)
+    chunker = ContentDefinedChunker(estimator)
+    reused = 0
+    held = []                 # Chunks kept back until the document is known to need map-reduce
+    sections = []
+    source_parts = []
+    total_tokens = 0
+
+    def report(pages_read):
+        total = getattr(pages, 'page_count', None)
+        progress = f"📄 Read {pages_read} of {total} pages" if total else "📄 Reading your notes..."
+        if sections:
+            finished = sum(1 for section in sections if section.done())
+            progress += f" · {finished}/{len(sections)} sections summarized"
+        job.report(progress)
+
+    def summarize_in_parallel(texts):
+        nonlocal reused
+        futures = []
+        for text in texts:
+            payload = build_section_payload(text)
+            key = payload_key(payload)
+            cached = chunk_cache.get(key) if chunk_cache is not None else None
+            if cached is not None:
+                reused += 1
+                future = Future()
+                future.set_result(cached)
+            else:
+                future = section_pool.submit(summarize_chunk, payload, key)
+            futures.append(future)
+        sections.extend(futures)
+        return futures
+
+    def summarize_chunk(payload, key):
+        summary = client.generate(payload, cancel_event=job.cancel_event, ticket=job.ticket)
+        if chunk_cache is not None:
+            chunk_cache.set(key, summary)
+        return summary
+
+    pages_read = 0
+    try:
+        for pages_read, page in enumerate(normalizer.normalize(pages), start=1):
+            if job.cancelled:
+                return None
+            if page:
+                source_parts.append(page)
+                total_tokens += estimator.estimate(page)
+                held.extend(chunker.add(page))
+            if extractive_tokens is None and total_tokens > SINGLE_SHOT_TOKENS and held:
+                summarize_in_parallel(held)
+                held = []
+            report(pages_read)
+
+        source_text = '\n\n'.join(source_parts)
+        job.meta['source_text'] = source_text
+        job.meta['normalization'] = normalizer.report()
+        notice = truncation_notice(pages)
+        if notice:
+            job.meta.setdefault('notes', []).append(notice)
+        if len(source_text) < MIN_SOURCE_CHARS:
+            raise ValueError("There is not enough text to summarize. Scanned PDFs without a text layer can't be read.")
+
+        if extractive_tokens and total_tokens > extractive_tokens:
+            job.report("🔎 Picking the key sentences...")
+            final_text, job.meta['extractive'] = select_key_sentences(
+                split_sentences(source_text, estimator.count), extractive_tokens, estimator.estimate
+            )
+        elif total_tokens <= SINGLE_SHOT_TOKENS:
+            final_text = source_text
+        else:
+            last = chunker.flush()
+            summarize_in_parallel(held + ([last] if last else []))
+            summaries = []
+            for section in list(sections):
+                summaries.append(section.result())
+                report(pages_read)
+            job.meta['chunks'] = {"total": len(summaries), "reused": reused}
+            final_text = reduce_summaries(job, estimator, summaries, summarize_in_parallel)
+    finally:
+        for section in sections:
+            section.cancel()
+
+    if client.max_input_tokens:
+        budget = client.max_input_tokens - PROMPT_ALLOWANCE
+        fitted = estimator.truncate(final_text, budget)
+        if fitted != final_text:
+            job.meta.setdefault('notes', []).append(
+                f"The notes were too long for one request, so only the first ~{budget:,} tokens were summarized."
+            )
+            final_text = fitted
+
+    job.report("✨ Writing your summary...")
+    return stream_structured_summary(job, client, build_payload(final_text), regenerate)
+
+
+def reduce_summaries(job, estimator, summaries, summarize_in_parallel):
+    """Merges partial summaries in parallel groups until they fit REDUCE_TOKENS; returns the joined text."""
+    text = '\n\n'.join(summaries)
+    while estimator.estimate(text) > REDUCE_TOKENS and len(summaries) > 1:
+        chunker = Chunker(estimator, REDUCE_TOKENS)
+        groups = [chunk for summary in summaries for chunk in chunker.add(summary)]
+        last = chunker.flush()
+        groups += [last] if last else []
+        if len(groups) >= len(summaries):
+            break             # Each summary is already a group of its own; merging cannot shrink them further
+        job.report(f"🧩 Combining {len(summaries)} partial summaries...")
+        summaries = [future.result() for future in summarize_in_parallel(groups)]
+        text = '\n\n'.join(summaries)
+    return text
+
+
+class BatchFile:
+    """Stands in for the Job of one file in a batch: shares the batch's cancellation and
+    rate-limiter ticket (each call still queues on its own), but keeps its own meta and
+    reports progress under its index."""
+
+    def __init__(self, batch, index):
+        self.batch = batch
+        self.index = index
+        self.cancel_event = batch.cancel_event
+        self.ticket = batch.ticket
+        self.partial = ""
+        self.meta = {}
+
+    @property
+    def cancelled(self):
+        return self.batch.cancelled
+
+    def report(self, progress):
+        self.batch.meta.setdefault('files', {})[self.index] = progress
+
+    def publish(self, text):
+        self.partial = text
+
+
+def summarize_batch(job, client, documents, build_payload, build_section_payload, section_pool, file_pool,
+                    regenerate=False, chunk_cache=None, extractive_tokens=None, combine=False):
+    """Job body that summarizes several documents at once, emitting each file's result as it finishes.
+
+    documents is a list of (name, pages). Every file runs the full summarize_document
+    pipeline on file_pool, so its extraction, normalization and map calls overlap
+    with the other files'; all API calls share the batch's ticket, so the batch
+    gets this session's fair share of the rate limiter rather than one per file.
+    The limiter queues every concurrent call on that ticket separately, so files and
+    sections waiting at once are all admitted in turn.
+    Each finished file is emitted as {"index", "name", "summary", "notes", "extractive", "error"}
+    (extractive holds the fast-mode stats when the file was cut to its key sentences).
+    A file that fails is reported with its error instead of failing the batch.
+    With combine, the per-file summaries (not the raw notes) are then summarized
+    together and the combined summary is returned; otherwise None.
+    """
+    def summarize_file(index, name, pages):
+        file_job = BatchFile(job, index)
+        summary = summarize_document(
+            file_job, client, pages, build_payload, build_section_payload, section_pool,
+            regenerate=regenerate, chunk_cache=chunk_cache, extractive_tokens=extractive_tokens,
+        )
+        return summary, file_job.meta.get('notes', []), file_job.meta.get('extractive')
+
+    futures = {
+        file_pool.submit(summarize_file, index, name, pages): (index, name)
+        for index, (name, pages) in enumerate(documents)
+    }
+    summaries = {}
+    try:
+        for future in as_completed(futures):
+            index, name = futures[future]
+            if job.cancelled:
+                return None
+            try:
+                summary, notes, extractive = future.result()
+            except Exception as e:
+                job.emit({"index": index, "name": name, "summary": None, "notes": [], "extractive": None, "error": str(e)})
+                continue
+            summaries[index] = (name, summary)
+            job.emit({"index": index, "name": name, "summary": summary, "notes": notes, "extractive": extractive, "error": None})
+    finally:
+        for future in futures:
+            future.cancel()
+
+    if not summaries:
+        raise ValueError("None of the files could be summarized.")
+    if not combine or len(summaries) < 2:
+        return None
+    pages = [
+        f"From {name}:\n\n{render_summary_text(summary, 'Both', 'Detailed', False)}"
+        for name, summary in (summaries[index] for index in sorted(summaries))
+    ]
+    return summarize_document(
+        job, client, pages, build_payload, build_section_payload, section_pool,
+        regenerate=regenerate, chunk_cache=chunk_cache,
+    )
@@ -0,0 +1,87 @@
+import json
+import re
+
+from gemini_client import GeminiResponseError, payload_key
+from json_stream import JsonItemStream
+
+# What each summary length shows of the one structured summary: (key points, paragraphs).
+LENGTHS = {"Short": (4, 1), "Medium": (7, 2), "Detailed": (12, 3)}
+HIGHLIGHT_TERMS = 6       # Most important key terms bolded when highlighting is on
+
+BOLD = re.compile(r'\*\*')
+
+
+def is_valid_summary(summary):
+    """Checks that a structured summary has the key points and paragraphs every variant is built from."""
+    return (
+        isinstance(summary, dict)
+        and any(isinstance(item, dict) and item.get('point') for item in summary.get('key_points') or [])
+        and any(isinstance(paragraph, str) and paragraph.strip() for paragraph in summary.get('paragraphs') or [])
+    )
+
+
+def stream_structured_summary(job, client, payload, regenerate=False):
+    """Streams the structured summary request, publishing key points as they arrive; returns the parsed summary.
+
+    Raises GeminiResponseError for a truncated or malformed response, which is also
+    dropped from the response cache so it is never served again.
+    """
+    parser = JsonItemStream(item_depth=2)
+    parts = []
+    points = []
+    try:
+        for chunk in client.stream(payload, use_cache=not regenerate, cancel_event=job.cancel_event, ticket=job.ticket):
+            parts.append(chunk)
+            arrived = [item['point'] for item in parser.feed(chunk) if item.get('point')]
+            if arrived:
+                points.extend(arrived)
+                job.publish('\n'.join(f"- {point}" for point in points))
+        summary = json.loads(''.join(parts))
+        if not is_valid_summary(summary):
+            raise GeminiResponseError("The summary response is missing its key points or paragraphs.")
+    except (GeminiResponseError, ValueError):
+        if client.cache is not None:
+            client.cache.delete(payload_key(payload))
+        raise
+    return summary
+
+
+def render_summary_text(summary, style, length, highlight):
+    """Returns the markdown for one style/length/highlight variant of a structured summary."""
+    point_count, paragraph_count = LENGTHS[length]
+    points = [BOLD.sub('', item['point']).strip() for item in summary['key_points']
+              if isinstance(item, dict) and item.get('point')][:point_count]
+    paragraphs = [BOLD.sub('', paragraph).strip() for paragraph in summary['paragraphs']
+                  if isinstance(paragraph, str) and paragraph.strip()][:paragraph_count]
+
+    blocks = []
+    if style in ("Paragraph", "Both"):
+        blocks.extend(paragraphs)
+    if style in ("Bullet Points", "Both"):
+        blocks.append('\n'.join(f"- {point}" for point in points))
+    text = '\n\n'.join(blocks)
+    return highlight_terms(text, summary.get('key_terms') or []) if highlight else text
+
+
+def highlight_terms(text, key_terms, limit=HIGHLIGHT_TERMS):
+    """Bolds every whole-word occurrence of the limit most important key terms in one pass."""
+    ranked = sorted(
+        (item for item in key_terms if isinstance(item, dict) and str(item.get('term') or '').strip()),
+        key=lambda item: item.get('importance') if isinstance(item.get('importance'), int) else 0,
+        reverse=True,
+    )
+    terms = []
+    for item in ranked:
+        term = str(item['term']).strip()
+        if term.lower() in text.lower() and term.lower() not in (t.lower() for t in terms):
+            terms.append(term)
+        if len(terms) == limit:
+            break
+    if not terms:
+        return text
+    # Longest first, so "cell membrane" wins over "cell" where both match.
+    pattern = re.compile(
+        r'(?<!\w)(' + '|'.join(re.escape(term) for term in sorted(terms, key=len, reverse=True)) + r')(?!\w)',
+        re.IGNORECASE,
+    )
+    return pattern.sub(r'**\1**', text)
@@ -0,0 +1,72 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from cache import TieredCache
+from gemini_client import payload_key
+
+
+class TieredCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.directory.name, "cache.db")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_memory_tier_evicts_the_least_recently_used(self):
+        cache = TieredCache(max_entries=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual((cache.get("a"), cache.get("c")), (1, 3))
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_expired_entries_are_misses(self):
+        cache = TieredCache(ttl=10, db_path=self.db_path)
+        with mock.patch("cache.time.time", return_value=1000):
+            cache.set("a", {"text": "hi"})
+        with mock.patch("cache.time.time", return_value=1011):
+            self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.stats()["disk_entries"], 0)
+
+    def test_disk_tier_survives_a_restart_and_is_promoted(self):
+        TieredCache(db_path=self.db_path).set("a", {"text": "hi"})
+        cache = TieredCache(db_path=self.db_path)
+        self.assertEqual(cache.get("a"), {"text": "hi"})
+        self.assertEqual(cache.get("a"), {"text": "hi"})
+        stats = cache.stats()
+        self.assertEqual((stats["disk_hits"], stats["memory_hits"]), (1, 1))
+
+    def test_disk_tier_keeps_the_most_recently_used(self):
+        cache = TieredCache(max_entries=1, db_path=self.db_path, max_disk_entries=2)
+        for now, key in enumerate("abc"):
+            with mock.patch("cache.time.time", return_value=1000 + now):
+                cache.set(key, key)
+        with mock.patch("cache.time.time", return_value=1010):
+            self.assertIsNone(cache.get("a"))
+            self.assertEqual(cache.get("b"), "b")
+
+    def test_delete_removes_every_tier(self):
+        cache = TieredCache(db_path=self.db_path)
+        cache.set("a", 1)
+        cache.delete("a")
+        self.assertIsNone(cache.get("a"))
+        self.assertIsNone(TieredCache(db_path=self.db_path).get("a"))
+
+
+class PayloadKeyTest(unittest.TestCase):
+
+    def test_key_ignores_field_order_and_fields_that_do_not_affect_output(self):
+        payload = {"contents": [{"parts": [{"text": "Hi"}]}], "generationConfig": {"temperature": 0.7, "topK": 40}}
+        reordered = {"generationConfig": {"topK": 40, "temperature": 0.7}, "contents": [{"parts": [{"text": "Hi"}]}]}
+        self.assertEqual(payload_key(payload), payload_key({**reordered, "unused": True}))
+        self.assertNotEqual(payload_key(payload), payload_key({**payload, "contents": [{"parts": [{"text": "Hey"}]}]}))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+
+import numpy as np
+
+from extractive import DAMPING, select_key_sentences, textrank_scores, tfidf_rows
+from summary_pipeline import split_sentences
+from token_budget import TokenEstimator
+
+SENTENCES = [
+    "Photosynthesis converts light energy into chemical energy in plants.",
+    "Chlorophyll absorbs light energy for photosynthesis in the chloroplast.",
+    "Plants store the chemical energy from photosynthesis as glucose.",
+    "The author thanks the library staff.",
+]
+
+
+def dense_textrank(sentences, iterations=200):
+    rows, columns, weights = tfidf_rows(sentences)
+    matrix = np.zeros((len(sentences), int(columns.max()) + 1))
+    matrix[rows, columns] = weights
+    similarity = matrix @ matrix.T
+    np.fill_diagonal(similarity, 0)
+    degree = similarity.sum(axis=1)
+    transition = np.divide(similarity, degree[:, None], out=np.zeros_like(similarity), where=degree[:, None] > 0)
+    scores = np.full(len(sentences), 1 / len(sentences))
+    for _ in range(iterations):
+        scores = (1 - DAMPING) / len(sentences) + DAMPING * transition.T @ scores
+    return scores
+
+
+class TextRankTest(unittest.TestCase):
+
+    def test_sparse_iteration_matches_the_dense_matrix(self):
+        np.testing.assert_allclose(textrank_scores(SENTENCES), dense_textrank(SENTENCES), atol=1e-5)
+
+    def test_off_topic_sentence_ranks_last(self):
+        self.assertEqual(int(np.argmin(textrank_scores(SENTENCES))), 3)
+
+    def test_sentences_without_terms_are_scored(self):
+        self.assertEqual(len(textrank_scores(["The end.", "And so on."])), 2)
+        self.assertEqual(len(textrank_scores([])), 0)
+
+
+class SelectKeySentencesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.measure = TokenEstimator().estimate
+
+    def test_keeps_the_best_sentences_in_document_order_within_budget(self):
+        paragraphs = [SENTENCES[:2], SENTENCES[2:]]
+        budget = self.measure(SENTENCES[0]) + self.measure(SENTENCES[2])
+        text, stats = select_key_sentences(paragraphs, budget, self.measure)
+        self.assertEqual(text, f"{SENTENCES[0]}\n\n{SENTENCES[2]}")
+        self.assertEqual((stats["sentences_total"], stats["sentences_kept"]), (4, 2))
+        self.assertLessEqual(stats["tokens_after"], budget)
+
+    def test_skips_short_sentences_and_repeats(self):
+        paragraphs = [["Photosynthesis.", SENTENCES[0], SENTENCES[1], SENTENCES[0].upper()]]
+        text, _ = select_key_sentences(paragraphs, 1000, self.measure)
+        self.assertEqual(text, f"{SENTENCES[0]} {SENTENCES[1]}")
+
+
+class SplitSentencesTest(unittest.TestCase):
+
+    def test_splits_paragraphs_and_long_sentences_into_lines(self):
+        table = '\n'.join(f"row {n}: " + "value " * 20 for n in range(10))
+        paragraphs = split_sentences(f"One sentence. Two sentence!\n\n{table}", TokenEstimator().estimate)
+        self.assertEqual(paragraphs[0], ["One sentence.", "Two sentence!"])
+        self.assertEqual(len(paragraphs[1]), 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,225 @@
+import json
+import threading
+import time
+import unittest
+from unittest import mock
+
+import requests
+
+from gemini_client import (
+    CircuitBreaker, CircuitOpenError, GeminiAPIError, GeminiClient, GenerationCancelled, parse_retry_after,
+)
+from mock_gemini_server import MockConfig, start_mock_server
+
+PAYLOAD = {"contents": [{"parts": [{"text": "Explain photosynthesis."}]}]}
+
+
+class FakeResponse:
+
+    def __init__(self, status_code, headers=None, body=None, text="Hello"):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.body = body
+        self.text = text
+        self.encoding = None
+
+    def json(self):
+        if self.body is None:
+            raise ValueError("No JSON")
+        return self.body
+
+    def iter_lines(self, decode_unicode=False):
+        yield "data: " + json.dumps({"candidates": [{"content": {"parts": [{"text": self.text}]}}]})
+
+    def close(self):
+        pass
+
+
+class ParseRetryAfterTest(unittest.TestCase):
+
+    def test_reads_seconds_from_the_header(self):
+        self.assertEqual(parse_retry_after(FakeResponse(429, {"Retry-After": "7"})), 7.0)
+
+    def test_reads_the_retry_info_detail(self):
+        body = {"error": {"details": [{"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": "12s"}]}}
+        self.assertEqual(parse_retry_after(FakeResponse(429, body=body)), 12.0)
+
+    def test_no_hint_is_none(self):
+        self.assertIsNone(parse_retry_after(FakeResponse(503)))
+        self.assertIsNone(parse_retry_after(FakeResponse(503, {"Retry-After": "soon"}, body={})))
+
+
+class CircuitBreakerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch("gemini_client.time.monotonic", side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=30)
+
+    def test_opens_after_consecutive_failures(self):
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, "closed")
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, "open")
+        self.assertFalse(self.breaker.allow_request())
+        self.assertEqual(self.breaker.retry_in(), 30)
+
+    def test_half_open_lets_one_probe_through(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.now += 30
+        self.assertEqual(self.breaker.state, "half-open")
+        self.assertTrue(self.breaker.allow_request())
+        self.assertFalse(self.breaker.allow_request())
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, "open")
+        self.now += 30
+        self.assertTrue(self.breaker.allow_request())
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, "closed")
+
+
+class RetryTest(unittest.TestCase):
+    """Runs a GeminiClient against scripted responses, with backoff sleeps recorded instead of slept."""
+
+    def setUp(self):
+        self.client = GeminiClient("test-key", "http://mock/v1beta/models/m:generateContent", max_retries=3)
+        self.responses = []
+        self.client._session.post = mock.Mock(side_effect=self.respond)
+        # Backoff sleeps wait on the request's flight, which wakes early if every caller cancels.
+        patcher = mock.patch("gemini_client.Flight.wait", return_value=False)
+        self.sleep = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.client.close()
+
+    def respond(self, *args, **kwargs):
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    def test_transient_errors_are_retried(self):
+        self.responses = [FakeResponse(503), requests.exceptions.ConnectionError("reset"), FakeResponse(200)]
+        self.assertEqual(self.client.generate(PAYLOAD), "Hello")
+        self.assertEqual(self.client._session.post.call_count, 3)
+        for (delay,), _ in self.sleep.call_args_list:
+            self.assertLessEqual(delay, self.client.max_delay)
+
+    def test_retry_after_sets_the_backoff(self):
+        self.responses = [FakeResponse(429, {"Retry-After": "4"}), FakeResponse(200)]
+        self.client.generate(PAYLOAD)
+        self.sleep.assert_called_once_with(4.0)
+
+    def test_client_errors_are_not_retried(self):
+        self.responses = [FakeResponse(400)]
+        with self.assertRaises(GeminiAPIError) as raised:
+            self.client.generate(PAYLOAD)
+        self.assertEqual(raised.exception.status_code, 400)
+        self.assertEqual(self.client.breaker.state, "closed")
+
+    def test_retries_run_out_with_the_last_error(self):
+        self.responses = [FakeResponse(500)] * 3
+        with self.assertRaisesRegex(GeminiAPIError, "HTTP 500"):
+            self.client.generate(PAYLOAD)
+
+    def test_open_circuit_fails_fast(self):
+        self.client.breaker = CircuitBreaker(failure_threshold=2)
+        self.responses = [FakeResponse(502), FakeResponse(502)]
+        with self.assertRaises(CircuitOpenError):
+            self.client.generate(PAYLOAD)
+        self.assertEqual(self.client._session.post.call_count, 2)
+
+    def test_quota_errors_do_not_open_the_circuit(self):
+        self.client.breaker = CircuitBreaker(failure_threshold=1)
+        self.responses = [FakeResponse(429), FakeResponse(200)]
+        self.client.generate(PAYLOAD)
+        self.assertEqual(self.client.breaker.state, "closed")
+
+
+class MockServerTest(unittest.TestCase):
+    """Runs a GeminiClient against a local mock server."""
+
+    config = {}
+
+    def setUp(self):
+        self.server, url = start_mock_server(MockConfig(**self.config))
+        self.client = GeminiClient("test-key", url)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class GenerateTest(MockServerTest):
+
+    config = {"latency": "fixed:0", "chunk_delay": "fixed:0.2"}
+
+    def test_generate_returns_the_whole_text(self):
+        text = self.client.generate(PAYLOAD)
+        self.assertIn("**", text)
+
+    def test_cancelled_generate_stops_at_the_next_chunk(self):
+        cancel = threading.Event()
+        threading.Timer(0.3, cancel.set).start()
+        started = time.monotonic()
+        with self.assertRaises(GenerationCancelled):
+            self.client.generate(PAYLOAD, cancel_event=cancel)
+        # The full response takes about 3 s to stream.
+        self.assertLess(time.monotonic() - started, 1)
+
+
+class SingleFlightTest(MockServerTest):
+
+    config = {"latency": "fixed:0.2", "chunk_delay": "fixed:0.01"}
+
+    def follow(self, results):
+        results.append(self.client.generate(PAYLOAD))
+
+    def start_follower(self, results):
+        follower = threading.Thread(target=self.follow, args=(results,))
+        follower.start()
+        time.sleep(0.05)   # Joins while the leader waits for the response
+        return follower
+
+    def test_identical_concurrent_calls_share_one_request(self):
+        results = []
+        followers = [threading.Thread(target=self.follow, args=(results,)) for _ in range(4)]
+        for follower in followers:
+            follower.start()
+        for follower in followers:
+            follower.join()
+        self.assertEqual(len(set(results)), 1)
+        self.assertEqual(self.server.RequestHandlerClass.config.stats["streams"], 1)
+        self.assertEqual(self.client.coalesced, 3)
+
+    def test_followers_finish_when_the_leader_stops_reading(self):
+        leader = self.client.stream(PAYLOAD)
+        results = []
+        follower = None
+        for position, chunk in enumerate(leader):
+            if position == 0:
+                follower = self.start_follower(results)
+                break
+        leader.close()
+        follower.join(5)
+        self.assertEqual(len(results), 1)
+        self.assertTrue(results[0].startswith(chunk))
+        self.assertEqual(self.server.RequestHandlerClass.config.stats["streams"], 1)
+
+    def test_abandoned_flight_without_followers_is_dropped(self):
+        leader = self.client.stream(PAYLOAD)
+        next(leader)
+        leader.close()
+        self.assertEqual(self.client._flights, {})
+        self.assertTrue(self.client.generate(PAYLOAD))
+
+
+if __name__ == "__main__":
+    unittest.main()
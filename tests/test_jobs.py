@@ -0,0 +1,62 @@
+import threading
+import time
+import unittest
+
+from jobs import CANCELLED, DONE, FAILED, JobExecutor, JobQueueFull
+
+
+class JobExecutorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.executor = JobExecutor(workers=2, queue_depth=1)
+
+    def wait(self, job, timeout=5):
+        deadline = time.monotonic() + timeout
+        while not job.done and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return job
+
+    def test_result_and_error_are_published(self):
+        done = self.wait(self.executor.submit(lambda job, value: value * 2, 21))
+        self.assertEqual((done.status, done.result), (DONE, 42))
+
+        def fail(job):
+            raise ValueError("bad input")
+
+        failed = self.wait(self.executor.submit(fail))
+        self.assertEqual((failed.status, failed.error), (FAILED, "bad input"))
+
+    def test_a_finished_job_always_has_finished_at(self):
+        # _prune runs on every submit and compares finished_at for every done job.
+        for _ in range(200):
+            job = self.executor.submit(lambda job: None)
+            while not job.done:
+                pass
+            self.assertIsNotNone(job.finished_at)
+
+    def test_prune_skips_jobs_without_finished_at(self):
+        job = self.wait(self.executor.submit(lambda job: None))
+        job.finished_at = None
+        self.executor.submit(lambda job: None)
+        self.assertIs(self.executor.get(job.id), job)
+
+    def test_finished_jobs_expire_after_retention(self):
+        executor = JobExecutor(workers=1, queue_depth=1, retention=0)
+        job = self.wait(executor.submit(lambda job: None))
+        self.wait(executor.submit(lambda job: None))
+        self.assertIsNone(executor.get(job.id))
+
+    def test_saturated_executor_rejects_and_cancel_frees_a_slot(self):
+        release = threading.Event()
+        jobs = [self.executor.submit(lambda job: release.wait(5)) for _ in range(3)]
+        with self.assertRaises(JobQueueFull):
+            self.executor.submit(lambda job: None)
+        self.executor.cancel(jobs[2].id)
+        self.assertEqual(jobs[2].status, CANCELLED)
+        self.assertIsNotNone(jobs[2].finished_at)
+        self.executor.submit(lambda job: None)
+        release.set()
+
+
+if __name__ == "__main__":
+    unittest.main()
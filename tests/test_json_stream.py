@@ -0,0 +1,78 @@
+import json
+import unittest
+from unittest import mock
+
+from gemini_client import GeminiResponseError
+from json_stream import JsonItemStream
+from utils import is_valid_card, iter_structured_items
+
+CARDS = [
+    {"question": "What is {ATP}?", "answer": "The cell's \"energy\" currency [mostly]."},
+    {"question": "Osmosis", "answer": "Water moving across a membrane.\\n"},
+]
+
+
+def pieces(text, size):
+    return [text[start:start + size] for start in range(0, len(text), size)]
+
+
+class FakeCache(dict):
+
+    def delete(self, key):
+        self.pop(key, None)
+
+
+class FakeClient:
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.cache = FakeCache(key="cached")
+
+    def stream(self, payload, use_cache=True, cancel_event=None, ticket=None):
+        yield from self.chunks
+
+
+class JsonItemStreamTest(unittest.TestCase):
+
+    def feed_all(self, parser, chunks):
+        items = []
+        for chunk in chunks:
+            items.extend(parser.feed(chunk))
+        return items
+
+    def test_items_arrive_as_soon_as_they_close(self):
+        parser = JsonItemStream()
+        text = json.dumps(CARDS)
+        first_end = len("[" + json.dumps(CARDS[0]))
+        self.assertEqual(parser.feed(text[:first_end - 1]), [])
+        self.assertEqual(parser.feed(text[first_end - 1:first_end + 2]), [CARDS[0]])
+        self.assertFalse(parser.complete)
+        self.assertEqual(parser.feed(text[first_end + 2:]), [CARDS[1]])
+        self.assertTrue(parser.complete)
+
+    def test_any_chunking_gives_the_same_items(self):
+        text = json.dumps(CARDS, indent=2)
+        for size in (1, 2, 7, len(text)):
+            self.assertEqual(self.feed_all(JsonItemStream(), pieces(text, size)), CARDS)
+
+    def test_item_depth_two_reads_an_array_under_a_key(self):
+        text = json.dumps({"title": "Cells", "cards": CARDS})
+        self.assertEqual(self.feed_all(JsonItemStream(item_depth=2), pieces(text, 5)), CARDS)
+
+
+class IterStructuredItemsTest(unittest.TestCase):
+
+    def test_invalid_items_are_skipped(self):
+        text = json.dumps([CARDS[0], {"question": "No answer"}, CARDS[1]])
+        items = list(iter_structured_items(FakeClient(pieces(text, 9)), {}, is_valid_card))
+        self.assertEqual(items, CARDS)
+
+    def test_truncated_response_raises_and_is_uncached(self):
+        client = FakeClient([json.dumps(CARDS)[:-1]])
+        with mock.patch("utils.payload_key", return_value="key"), self.assertRaises(GeminiResponseError):
+            list(iter_structured_items(client, {}, is_valid_card))
+        self.assertEqual(client.cache, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
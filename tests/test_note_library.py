@@ -0,0 +1,98 @@
+import unittest
+from unittest import mock
+
+from note_library import LibraryPages, NoteLibrary, match_query
+
+PAGES = [
+    "Enzymes lower the activation energy of a reaction.",
+    "The active site binds the substrate.",
+    "Competitive inhibitors block the active site.",
+]
+
+
+class MatchQueryTest(unittest.TestCase):
+
+    def test_quotes_every_term_and_phrase(self):
+        self.assertEqual(match_query('enzyme "active site"'), '"enzyme" "active site"')
+
+    def test_operators_and_punctuation_are_searched_literally(self):
+        self.assertEqual(match_query('NOT cell-wall'), '"NOT" "cell" "wall"')
+        self.assertIsNone(match_query('  ?!  '))
+
+
+class NoteLibraryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.library = NoteLibrary()
+        self.library.add("alice", "doc", "enzymes.pdf", PAGES)
+
+    def test_search_returns_pages_with_offsets_and_snippets(self):
+        results = self.library.search("alice", '"active site"')
+        self.assertEqual({result["page"] for result in results}, {2, 3})
+        first = next(result for result in results if result["page"] == 2)
+        self.assertEqual(first["start"], len(PAGES[0]) + 2)
+        self.assertEqual(first["snippet"], "The **active site** binds the substrate.")
+
+    def test_documents_are_only_visible_to_their_owners(self):
+        self.assertEqual(self.library.search("bob", "enzymes"), [])
+        self.assertTrue(self.library.attach("bob", "doc", "copy.pdf"))
+        self.assertEqual(self.library.search("bob", "enzymes")[0]["name"], "copy.pdf")
+        self.assertFalse(self.library.attach("bob", "unknown", "other.pdf"))
+
+    def test_matching_pages_need_every_term(self):
+        self.assertEqual(self.library.matching_pages("alice", "doc", "active site"), [2, 3])
+        self.assertEqual(self.library.matching_pages("alice", "doc", "active inhibitors"), [3])
+        self.assertEqual(self.library.pages("doc", [3]), [(3, PAGES[2])])
+
+    def test_expired_ownership_is_pruned_on_read(self):
+        with mock.patch("note_library.time.time", return_value=self._added_at() + self.library.ttl + 1):
+            self.assertEqual(self.library.search("alice", "enzymes"), [])
+            self.assertEqual(self.library.pages("doc"), [])
+
+    def test_least_recently_added_documents_are_evicted_over_max_chars(self):
+        library = NoteLibrary(max_chars=len(PAGES[0]) * 2)
+        for number in range(3):
+            library.add("alice", f"doc{number}", f"{number}.pdf", [PAGES[0]])
+        self.assertEqual(library.pages("doc0"), [])
+        self.assertEqual(len(library.pages("doc1")), 1)
+        self.assertEqual(len(library.pages("doc2")), 1)
+
+    def test_the_newest_document_stays_even_over_max_chars(self):
+        library = NoteLibrary(max_chars=10)
+        library.add("alice", "doc", "enzymes.pdf", PAGES)
+        self.assertEqual(len(library.pages("doc")), 3)
+
+    def _added_at(self):
+        return self.library._db.execute("SELECT added_at FROM owners").fetchone()[0]
+
+
+class LibraryPagesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.library = NoteLibrary()
+
+    def test_pages_are_stored_once_they_have_been_read(self):
+        source = LibraryPages(self.library, "alice", "doc", "enzymes.pdf", iter(PAGES))
+        self.assertEqual(list(source), PAGES)
+        self.assertEqual(self.library.matching_pages("alice", "doc", "substrate"), [2])
+
+    def test_query_yields_only_matching_pages_and_their_numbers(self):
+        source = LibraryPages(self.library, "alice", "doc", "enzymes.pdf", iter(PAGES), query="inhibitors")
+        self.assertEqual(list(source), [PAGES[2]])
+        self.assertEqual(source.numbers, [3])
+
+    def test_stored_documents_are_not_read_again(self):
+        self.library.add("bob", "doc", "enzymes.pdf", PAGES)
+        unread = mock.MagicMock()
+        source = LibraryPages(self.library, "alice", "doc", "enzymes.pdf", unread, query="substrate")
+        self.assertEqual(list(source), [PAGES[1]])
+        unread.__iter__.assert_not_called()
+
+    def test_no_matching_page_is_an_error(self):
+        source = LibraryPages(self.library, "alice", "doc", "enzymes.pdf", iter(PAGES), query="ribosome")
+        with self.assertRaisesRegex(ValueError, "No page of enzymes.pdf mentions ribosome"):
+            list(source)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+import io
+import unittest
+
+import pypdfium2
+
+from pdf_extraction import ACCURATE_MAX_PAGE_BYTES, ACCURATE_MAX_PAGES, choose_backend, count_pages, extract_pdf_pages
+
+
+def blank_pdf(pages):
+    pdf = pypdfium2.PdfDocument.new()
+    for _ in range(pages):
+        pdf.new_page(612, 792)
+    data = io.BytesIO()
+    pdf.save(data)
+    pdf.close()
+    return data.getvalue()
+
+
+class ChooseBackendTest(unittest.TestCase):
+
+    def test_short_light_documents_use_the_accurate_backend(self):
+        self.assertEqual(choose_backend(ACCURATE_MAX_PAGES, 20_000 * ACCURATE_MAX_PAGES), "pdfplumber")
+
+    def test_long_documents_use_the_fast_backend(self):
+        self.assertEqual(choose_backend(ACCURATE_MAX_PAGES + 1, 1000), "pdfium")
+
+    def test_short_heavy_documents_use_the_fast_backend(self):
+        self.assertEqual(choose_backend(2, 2 * ACCURATE_MAX_PAGE_BYTES + 1), "pdfium")
+
+    def test_an_explicit_backend_wins(self):
+        self.assertEqual(choose_backend(500, 10 ** 9, "pdfplumber"), "pdfplumber")
+        with self.assertRaises(ValueError):
+            choose_backend(1, 1, "ocr")
+
+
+class CountPagesTest(unittest.TestCase):
+
+    def test_counts_pages_of_bytes(self):
+        self.assertEqual(count_pages(blank_pdf(3)), 3)
+
+    def test_extraction_reads_every_page(self):
+        extracted = extract_pdf_pages(blank_pdf(3))
+        self.assertEqual((extracted.page_count, len(extracted.pages)), (3, 3))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+import threading
+import time
+import unittest
+
+from rate_limiter import INTERACTIVE, PREFETCH, RateLimiter, Ticket
+
+
+class SharedTicketTest(unittest.TestCase):
+    """Concurrent calls on one ticket (the sections of one summary) must each get a slot."""
+
+    def acquire_concurrently(self, limiter, tickets, timeout):
+        results = [None] * len(tickets)
+
+        def call(index):
+            results[index] = limiter.acquire(tickets[index], timeout=timeout)
+
+        threads = [threading.Thread(target=call, args=(index,)) for index in range(len(tickets))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_every_call_sharing_a_ticket_is_admitted(self):
+        # 2 requests per second with a burst of one: 6 calls need about 2.5 s.
+        limiter = RateLimiter(120, burst_seconds=0.5)
+        ticket = Ticket("session", INTERACTIVE)
+        started = time.monotonic()
+        results = self.acquire_concurrently(limiter, [ticket] * 6, timeout=10)
+        self.assertEqual(results, [True] * 6)
+        self.assertLess(time.monotonic() - started, 6)
+        self.assertEqual(limiter.stats()["admitted"], 6)
+        self.assertEqual(limiter.stats()["timeouts"], 0)
+        self.assertEqual(limiter.stats()["waiting"], 0)
+
+    def test_shared_tickets_across_sessions(self):
+        limiter = RateLimiter(240, burst_seconds=0.25)
+        first, second = Ticket("a"), Ticket("b", PREFETCH)
+        results = self.acquire_concurrently(limiter, [first] * 4 + [second] * 4, timeout=10)
+        self.assertEqual(results, [True] * 8)
+        self.assertEqual(limiter.stats()["waiting"], 0)
+
+    def test_a_batch_sharing_one_ticket_does_not_starve_other_sessions(self):
+        # A multi-file batch: 4 files x 8 sections waiting at once on one ticket.
+        limiter = RateLimiter(600, burst_seconds=0.1)
+        batch = Ticket("batch")
+        admitted = []
+        lock = threading.Lock()
+
+        def call(ticket, label):
+            if limiter.acquire(ticket, timeout=20):
+                with lock:
+                    admitted.append(label)
+
+        threads = [threading.Thread(target=call, args=(batch, "batch")) for _ in range(32)]
+        for thread in threads:
+            thread.start()
+        deadline = time.monotonic() + 2
+        while limiter.stats()["waiting"] < 20 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        other = threading.Thread(target=call, args=(Ticket("other"), "other"))
+        other.start()
+        for thread in threads + [other]:
+            thread.join()
+        self.assertEqual(len(admitted), 33)
+        self.assertEqual(limiter.stats()["timeouts"], 0)
+        # Sessions take turns, so the other session's call does not wait behind the whole batch.
+        self.assertLess(admitted.index("other"), len(admitted) - 10)
+
+    def test_position_reports_the_first_waiting_call(self):
+        limiter = RateLimiter(60, burst_seconds=1)
+        self.assertTrue(limiter.acquire(Ticket("other")))   # Empties the bucket
+        ticket = Ticket("session")
+        cancel = threading.Event()
+        threads = [
+            threading.Thread(target=limiter.acquire, args=(ticket,), kwargs={"timeout": 5, "cancel_event": cancel})
+            for _ in range(3)
+        ]
+        for thread in threads:
+            thread.start()
+        deadline = time.monotonic() + 2
+        while limiter.stats()["waiting"] < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(limiter.position(ticket), 0)
+        self.assertIsNone(limiter.position(Ticket("session")))
+        cancel.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(limiter.stats()["waiting"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
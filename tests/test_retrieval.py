@@ -0,0 +1,118 @@
+import unittest
+
+from note_library import LibraryPages, NoteLibrary
+from retrieval import DocumentIndex, hashed_counts, select_passages, stem
+from token_budget import TokenEstimator
+from utils import find_notes, grounded
+
+PAGES = [
+    "Enzymes lower the activation energy of a reaction.",
+    "Photosynthesis turns light into chemical energy in the chloroplast.",
+    "Competitive inhibitors block the active site of an enzyme.",
+]
+
+
+class DictCache:
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value):
+        self.data[key] = value
+
+
+class HashingTest(unittest.TestCase):
+
+    def test_stem_strips_one_suffix_from_long_words_only(self):
+        self.assertEqual(stem("enzymes"), "enzym")
+        self.assertEqual(stem("binding"), "bind")
+        self.assertEqual(stem("bus"), "bus")
+
+    def test_stop_words_are_ignored_and_forms_share_a_bucket(self):
+        self.assertEqual(len(hashed_counts("the and of")[0]), 0)
+        self.assertEqual(list(hashed_counts("proteins")[0]), list(hashed_counts("protein")[0]))
+
+
+class DocumentIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.index = DocumentIndex.build(PAGES, TokenEstimator())
+
+    def test_search_ranks_the_matching_page_first(self):
+        best, score = self.index.search("chloroplast light")[0]
+        self.assertEqual(self.index.pages[best], 2)
+        self.assertGreater(score, 0)
+
+    def test_search_without_shared_terms_finds_nothing(self):
+        self.assertEqual(self.index.search("volcano"), [])
+        self.assertEqual(DocumentIndex.build([], TokenEstimator()).search("enzyme"), [])
+
+    def test_as_dict_round_trip_keeps_the_ranking(self):
+        restored = DocumentIndex.from_dict(self.index.as_dict())
+        self.assertEqual(restored.chunks, self.index.chunks)
+        self.assertEqual(restored.pages, self.index.pages)
+        self.assertEqual(
+            [chunk for chunk, _ in restored.search("active site inhibitors")],
+            [chunk for chunk, _ in self.index.search("active site inhibitors")],
+        )
+
+
+class SelectPassagesTest(unittest.TestCase):
+
+    def setUp(self):
+        estimator = TokenEstimator()
+        self.measure = estimator.estimate
+        self.indexes = [
+            ("biology.pdf", DocumentIndex.build(PAGES, estimator)),
+            ("notes.txt", DocumentIndex.build(["Enzymes are proteins."], estimator)),
+        ]
+
+    def test_labels_pages_only_for_multi_page_documents(self):
+        passages = select_passages(self.indexes, "enzymes", 1000, self.measure)
+        self.assertIn("[biology.pdf, page 1]\nEnzymes lower", passages)
+        self.assertIn("[notes.txt]\nEnzymes are proteins.", passages)
+
+    def test_keeps_to_the_token_budget(self):
+        passages = select_passages(self.indexes, "enzymes", self.measure("Enzymes are proteins."), self.measure)
+        self.assertEqual(passages, "[notes.txt]\nEnzymes are proteins.")
+        self.assertEqual(select_passages(self.indexes, "volcano", 1000, self.measure), "")
+
+
+class FindNotesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.library = NoteLibrary()
+        self.cache = DictCache()
+        self.estimator = TokenEstimator()
+
+    def source(self, pages):
+        return LibraryPages(self.library, "alice", "doc", "biology.pdf", iter(pages))
+
+    def test_adds_the_document_and_caches_its_index(self):
+        notes = find_notes("chloroplast", [self.source(PAGES)], self.cache, self.estimator)
+        self.assertIn("[biology.pdf, page 2]", notes)
+        self.assertIn("doc", self.cache.data)
+        self.assertEqual(len(self.library.pages("doc")), 3)
+
+    def test_unreadable_notes_raise_value_error(self):
+        def broken():
+            raise OSError("disk gone")
+            yield
+
+        with self.assertRaisesRegex(ValueError, "Could not read your uploaded notes: disk gone"):
+            find_notes("enzymes", [self.source(broken())], self.cache, self.estimator)
+
+    def test_grounded_appends_the_passages_to_the_prompt(self):
+        payload = {"contents": [{"parts": [{"text": "Explain enzymes."}]}], "model": "m"}
+        self.assertIs(grounded(payload, None), payload)
+        self.assertIs(grounded(payload, lambda: None), payload)
+        text = grounded(payload, lambda: "[notes.txt]\nEnzymes are proteins.")["contents"][0]["parts"][0]["text"]
+        self.assertTrue(text.startswith("Explain enzymes.\n\nBase your answer on these excerpts"))
+        self.assertEqual(payload["contents"][0]["parts"][0]["text"], "Explain enzymes.")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+import unittest
+
+from summary_pipeline import Chunker, ContentDefinedChunker
+from token_budget import TokenEstimator
+
+
+def paragraph(topic, sentences=5):
+    return ' '.join(f"The {topic} sentence number {n} explains one more detail." for n in range(sentences))
+
+
+class ChunkerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.estimator = TokenEstimator()
+
+    def chunk(self, pages, max_tokens):
+        chunker = Chunker(self.estimator, max_tokens)
+        chunks = [chunk for page in pages for chunk in chunker.add(page)]
+        return chunks + [chunker.flush()]
+
+    def test_every_chunk_fits_the_budget_and_nothing_is_lost(self):
+        pages = ['\n\n'.join(paragraph(f"page {page} part {part}") for part in range(3)) for page in range(4)]
+        chunks = self.chunk(pages, 150)
+        self.assertGreater(len(chunks), 1)
+        for chunk in chunks:
+            self.assertLessEqual(self.estimator.estimate(chunk), 150)
+        self.assertEqual(' '.join(chunks).split(), ' '.join(pages).split())
+
+    def test_chunks_end_on_paragraph_boundaries(self):
+        paragraphs = [paragraph(f"part {part}") for part in range(4)]
+        limit = self.estimator.estimate(paragraphs[0]) * 2 + 5
+        chunks = self.chunk(['\n\n'.join(paragraphs)], limit)
+        self.assertEqual(chunks, ['\n\n'.join(paragraphs[:2]), '\n\n'.join(paragraphs[2:])])
+
+    def test_a_paragraph_longer_than_a_chunk_is_split_by_sentence(self):
+        text = paragraph("long", 20)
+        chunks = self.chunk([text], 60)
+        self.assertGreater(len(chunks), 2)
+        for chunk in chunks:
+            self.assertTrue(chunk.endswith("detail."))
+
+    def test_a_sentence_longer_than_a_chunk_is_cut_between_words(self):
+        words = ["photosynthesis"] * 200
+        chunks = self.chunk([' '.join(words)], 50)
+        for chunk in chunks:
+            self.assertLessEqual(self.estimator.estimate(chunk), 50)
+        self.assertEqual(' '.join(chunks).split(), words)
+
+    def test_flush_without_text_is_none(self):
+        self.assertIsNone(Chunker(self.estimator).flush())
+
+
+class ContentDefinedChunkerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.estimator = TokenEstimator()
+        self.pages = [paragraph(f"page {page}", 3) for page in range(80)]
+
+    def chunk(self, pages):
+        chunker = ContentDefinedChunker(self.estimator, target_tokens=200, min_tokens=100, max_tokens=400)
+        chunks = [chunk for page in pages for chunk in chunker.add(page)]
+        return chunks + [chunker.flush()]
+
+    def test_chunks_stay_between_min_and_max_tokens(self):
+        chunks = self.chunk(self.pages)
+        self.assertGreater(len(chunks), 5)
+        for chunk in chunks[:-1]:
+            self.assertGreaterEqual(self.estimator.count(chunk), 100)
+            self.assertLessEqual(self.estimator.count(chunk), 400)
+
+    def test_an_inserted_page_only_changes_the_chunks_around_it(self):
+        before = self.chunk(self.pages)
+        edited = self.pages[:40] + [paragraph("inserted", 3)] + self.pages[40:]
+        after = self.chunk(edited)
+        changed = set(after) - set(before)
+        self.assertLessEqual(len(changed), 3)
+        self.assertTrue(any("inserted" in chunk for chunk in changed))
+
+
+if __name__ == "__main__":
+    unittest.main()
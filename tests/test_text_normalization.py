@@ -0,0 +1,66 @@
+import unittest
+
+from text_normalization import clean_text, normalize_pages
+
+
+def page(number, lines):
+    return "\n".join(["Cell Biology — Lecture 4", *lines, f"Page {number} of 9"])
+
+
+TOPICS = ["Mitochondria", "Ribosomes", "Lysosomes", "Chloroplasts", "Vacuoles"]
+
+
+def body(number):
+    topic = TOPICS[number - 1]
+    return [
+        f"{topic} are organelles.",
+        "The inner membrane folds into cristae.",
+        f"{topic} appear in most eukaryotic cells.",
+    ]
+
+
+class PageNormalizerTest(unittest.TestCase):
+
+    def test_running_headers_and_page_numbers_are_removed(self):
+        cleaned, report = normalize_pages([page(number, body(number)) for number in range(1, 6)])
+        for number, text in enumerate(cleaned, start=1):
+            self.assertEqual(text, "\n".join(body(number)))
+        self.assertEqual(report["headers_removed"], 5)
+        self.assertEqual(report["page_numbers_removed"], 5)
+        self.assertGreater(report["chars_saved"], 0)
+
+    def test_body_lines_repeated_on_short_pages_are_kept(self):
+        # Slides: every line is near an edge, and the key point repeats on each one.
+        slides = [f"Key point: ATP is the energy currency\nExample {number}\nMore detail {number}" for number in range(5)]
+        cleaned, report = normalize_pages(slides)
+        self.assertEqual(cleaned, slides)
+        self.assertEqual(report["headers_removed"], 0)
+
+    def test_boilerplate_is_removed_from_page_edges_only(self):
+        pages = [
+            page(number, [body(number)[0], "Copyright law protects original works.", *body(number)[1:]])
+            + "\n© 2024 University Press"
+            for number in range(1, 4)
+        ]
+        cleaned, report = normalize_pages(pages)
+        for text in cleaned:
+            self.assertIn("Copyright law protects original works.", text)
+            self.assertNotIn("©", text)
+        self.assertGreater(report["headers_removed"] + report["boilerplate_removed"], 0)
+
+    def test_single_page_input_is_only_cleaned(self):
+        notes = "Copyright\n12\nFair use   allows quoting."
+        cleaned, report = normalize_pages([notes])
+        self.assertEqual(cleaned, ["Copyright\n12\nFair use allows quoting."])
+        self.assertEqual(report["page_numbers_removed"], 0)
+
+
+class CleanTextTest(unittest.TestCase):
+
+    def test_rejoins_hyphenation_and_drops_leaders_and_control_characters(self):
+        text = "photo-\nsynthesis\x0c\nContents . . . . . . 4\n\n\n\nEnd"
+        self.assertEqual(clean_text(text), "photosynthesis\nContents 4\n\nEnd")
+
+
+if __name__ == "__main__":
+    unittest.main()
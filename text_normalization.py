@@ -0,0 +1,135 @@
+import re
+from collections import Counter, deque
+
+from token_budget import TokenEstimator
+
+LOOKAHEAD = 4             # Pages read ahead to recognise a running header or footer on the current page
+EDGE_LINES = 2            # Lines at the top and bottom of a page checked for headers, footers and page numbers
+MIN_REPEATS = 3           # Pages an edge line must appear on to count as a running header or footer
+MAX_EDGE_CHARS = 120      # Longer lines are body text, never headers
+
+PAGE_NUMBER = re.compile(r'^(?:page\s+)?[-–—(\[]?\s*\d{1,4}\s*[-–—)\]]?(?:\s*(?:of|/)\s*\d{1,4})?$', re.IGNORECASE)
+ROMAN_PAGE_NUMBER = re.compile(r'^(?=[ivx])x{0,3}(?:ix|iv|v?i{0,3})$')   # Front matter, lowercase only
+# Checked on edge lines only: body text may well discuss copyright.
+BOILERPLATE = re.compile(
+    r'^(?:(?:©|\(c\)|copyright\b).*|.*\ball rights reserved\b.*|this page (?:is )?intentionally left blank\.?)$',
+    re.IGNORECASE,
+)
+CONTROL_CHARS = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f\u00ad\ufffe]')   # Includes soft hyphens
+DOT_LEADER = re.compile(r'(?:[ \t]*\.){4,}[ \t]*')
+HYPHEN_BREAK = re.compile(r'([a-z])-\n([a-z])')
+SPACE_RUN = re.compile(r'[ \t\u00a0]+')
+BLANK_RUN = re.compile(r'\n{3,}')
+DIGITS = re.compile(r'\d+')
+
+
+def edge_signature(line):
+    """Returns the form of a line compared across pages: lowercased, digits masked, spaces collapsed."""
+    line = line.strip()
+    if not line or len(line) > MAX_EDGE_CHARS:
+        return None
+    return SPACE_RUN.sub(' ', DIGITS.sub('#', line.lower()))
+
+
+def clean_text(text):
+    """Rejoins hyphenated line breaks and drops control characters, dot leaders and whitespace runs."""
+    text = CONTROL_CHARS.sub('', text.replace('\r\n', '\n').replace('\r', '\n'))
+    text = DOT_LEADER.sub(' ', text)
+    text = HYPHEN_BREAK.sub(r'\1\2', text)
+    text = '\n'.join(SPACE_RUN.sub(' ', line).strip() for line in text.split('\n'))
+    return BLANK_RUN.sub('\n\n', text).strip()
+
+
+class PageNormalizer:
+    """Strips running headers and footers, page numbers and boilerplate from page texts as they stream in.
+
+    A line near the top or bottom of a page is a running header or footer when it
+    (digits aside) sits near the edge of at least MIN_REPEATS pages among those read
+    so far and the next LOOKAHEAD, so pages come out LOOKAHEAD pages behind the input.
+    Only those edge lines are ever removed, and only when the input has more than one
+    page: a single page (pasted notes, a text file) has no headers or page numbers,
+    so it is just cleaned. Pages too short to have a body between their edges keep
+    every line.
+    Counters of what was removed, with token estimates from estimator, are kept for report().
+    """
+
+    def __init__(self, lookahead=LOOKAHEAD, estimator=None):
+        self.lookahead = lookahead
+        self.estimator = estimator or TokenEstimator()
+        self.chars_in = 0
+        self.chars_out = 0
+        self.tokens_in = 0
+        self.tokens_out = 0
+        self.headers_removed = 0
+        self.page_numbers_removed = 0
+        self.boilerplate_removed = 0
+        self._seen = Counter()   # Edge signature -> pages it appeared on
+
+    def normalize(self, pages):
+        """Yields one cleaned text per page of pages, in order."""
+        window = deque()
+        count = 0
+        for page in pages:
+            count += 1
+            page = page or ""
+            self.chars_in += len(page)
+            self.tokens_in += self.estimator.estimate(page)
+            lines = page.replace('\r\n', '\n').split('\n')
+            self._seen.update({edge_signature(lines[index]) for index in self._edges(lines)} - {None})
+            window.append(lines)
+            if len(window) > self.lookahead:
+                yield self._finish(window.popleft())
+        while window:
+            yield self._finish(window.popleft(), paged=count > 1)
+
+    def report(self):
+        """Returns what normalization saved, in characters and estimated prompt tokens."""
+        saved = max(0, self.chars_in - self.chars_out)
+        return {
+            "chars_before": self.chars_in,
+            "chars_after": self.chars_out,
+            "chars_saved": saved,
+            "tokens_saved": max(0, self.tokens_in - self.tokens_out),
+            "headers_removed": self.headers_removed,
+            "boilerplate_removed": self.boilerplate_removed,
+            "page_numbers_removed": self.page_numbers_removed,
+        }
+
+    def _edges(self, lines):
+        """Returns the indices of the first and last EDGE_LINES non-blank lines.
+
+        A page with no more lines than that (a slide, a title page) is all edge, so it
+        has none: its lines are body text however often they repeat.
+        """
+        content = [index for index, line in enumerate(lines) if line.strip()]
+        if len(content) <= 2 * EDGE_LINES:
+            return set()
+        return set(content[:EDGE_LINES] + content[-EDGE_LINES:])
+
+    def _finish(self, lines, paged=True):
+        edges = self._edges(lines) if paged else set()
+        kept = []
+        for index, line in enumerate(lines):
+            if index in edges:
+                stripped = SPACE_RUN.sub(' ', line).strip()
+                if PAGE_NUMBER.match(stripped) or ROMAN_PAGE_NUMBER.match(stripped):
+                    self.page_numbers_removed += 1
+                    continue
+                if self._seen[edge_signature(line)] >= MIN_REPEATS:
+                    self.headers_removed += 1
+                    continue
+                if BOILERPLATE.match(stripped):
+                    self.boilerplate_removed += 1
+                    continue
+            kept.append(line)
+        text = clean_text('\n'.join(kept))
+        self.chars_out += len(text)
+        self.tokens_out += self.estimator.estimate(text)
+        return text
+
+
+def normalize_pages(pages, estimator=None):
+    """Returns (cleaned page texts, PageNormalizer.report()) for a list of pages."""
+    normalizer = PageNormalizer(estimator=estimator)
+    cleaned = list(normalizer.normalize(pages))
+    return cleaned, normalizer.report()
@@ -0,0 +1,88 @@
+import math
+import re
+import threading
+
+MESSAGE_OVERHEAD = 4      # Tokens of framing per instruction or content block
+WORD_PIECE_CHARS = 6      # Letters a typical subword token covers in long words
+CALIBRATION_WEIGHT = 0.2  # How far one observed usageMetadata count moves the correction factor
+MIN_RATIO = 0.5           # Bounds on the correction factor, so one odd response cannot derail it
+MAX_RATIO = 2.0
+
+# ASCII words, single digits (tokenized one by one), and any other visible character.
+TOKEN_PIECE = re.compile(r'[A-Za-z]+|\d|[^\sA-Za-z\d]')
+SENTENCE_END = re.compile(r'[.!?]["\')\]]*\s|\n\s*\n')
+
+
+def payload_texts(payload):
+    """Returns (text of every systemInstruction and contents part, number of blocks) for a request."""
+    blocks = [payload.get('systemInstruction') or {}] + list(payload.get('contents') or [])
+    return [part.get('text', '') for block in blocks for part in block.get('parts') or []], len(blocks)
+
+
+class TokenEstimator:
+    """Fast local prompt-token estimates, calibrated against the usageMetadata the API reports.
+
+    count() is a tokenizer-free heuristic (short words are one token, long words one
+    per WORD_PIECE_CHARS letters, digits and symbols one each). estimate() scales it by
+    a correction factor that observe() keeps moving toward the real counts.
+    """
+
+    def __init__(self):
+        self.ratio = 1.0
+        self._lock = threading.Lock()
+        self._stats = {"observed": 0, "estimated_tokens": 0, "actual_tokens": 0, "abs_error_pct": 0.0}
+
+    def count(self, text):
+        """Returns the uncalibrated token count of text."""
+        tokens = 0
+        for piece in TOKEN_PIECE.findall(text):
+            tokens += 1 + (len(piece) - 1) // WORD_PIECE_CHARS if piece.isalpha() else 1
+        return tokens
+
+    def estimate(self, text):
+        """Returns the calibrated token estimate for text."""
+        return math.ceil(self.count(text) * self.ratio)
+
+    def count_payload(self, payload):
+        """Returns the uncalibrated prompt-token count of a generateContent request."""
+        texts, blocks = payload_texts(payload)
+        return sum(self.count(text) for text in texts) + MESSAGE_OVERHEAD * blocks
+
+    def estimate_payload(self, payload):
+        """Returns the calibrated prompt-token estimate of a generateContent request."""
+        return math.ceil(self.count_payload(payload) * self.ratio)
+
+    def observe(self, counted, actual):
+        """Records that a prompt counted as counted tokens was billed as actual prompt tokens."""
+        if counted <= 0 or not actual:
+            return
+        with self._lock:
+            estimated = counted * self.ratio
+            stats = self._stats
+            stats["observed"] += 1
+            stats["estimated_tokens"] += round(estimated)
+            stats["actual_tokens"] += actual
+            error = abs(estimated - actual) / actual * 100
+            stats["abs_error_pct"] += (error - stats["abs_error_pct"]) / stats["observed"]
+            target = min(MAX_RATIO, max(MIN_RATIO, actual / counted))
+            self.ratio += (target - self.ratio) * CALIBRATION_WEIGHT
+
+    def truncate(self, text, max_tokens):
+        """Returns text cut at a sentence boundary so it fits max_tokens (unchanged if it already fits)."""
+        tokens = self.estimate(text)
+        while tokens > max_tokens and text:
+            keep = int(len(text) * max_tokens / tokens * 0.98)
+            cut = text[:keep]
+            # Prefer to end on a sentence or paragraph if one is close to the cut.
+            ends = [match.end() for match in SENTENCE_END.finditer(cut, int(keep * 0.8))]
+            text = cut[:ends[-1]].rstrip() if ends else cut.rstrip()
+            tokens = self.estimate(text)
+        return text
+
+    def stats(self):
+        """Returns estimated vs actual prompt tokens over every observed response."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["ratio"] = round(self.ratio, 3)
+        stats["abs_error_pct"] = round(stats["abs_error_pct"], 1)
+        return stats
@@ -0,0 +1,101 @@
+import hashlib
+import os
+import tempfile
+import threading
+import time
+import uuid
+import weakref
+
+SPILL_BYTES = 1024 * 1024          # Uploads larger than this are written to disk instead of kept in memory
+STALE_SECONDS = 24 * 60 * 60       # Spilled files older than this are left over from a crashed process
+DEFAULT_DIR = os.path.join(tempfile.gettempdir(), "mybuddy-uploads")
+
+
+class StoredUpload:
+    """What a session keeps of an upload: its name, type, size, SHA-256 and where the bytes live.
+
+    Small uploads hold their bytes; larger ones hold only the path of a spilled file,
+    which is deleted when the last reference to the handle goes away (the session
+    ended or a new file replaced it) or when the process exits.
+    """
+
+    def __init__(self, file_id, name, type, size, sha256, data=None, path=None):
+        self.file_id = file_id
+        self.name = name
+        self.type = type
+        self.size = size
+        self.sha256 = sha256
+        self.data = data
+        self.path = path
+        if path is not None:
+            self._cleanup = weakref.finalize(self, remove_quietly, path)
+
+    @property
+    def source(self):
+        """Bytes or a file path, whichever open_pdf should read."""
+        return self.path if self.path is not None else self.data
+
+    def getvalue(self):
+        """Returns the upload's bytes, reading them from disk if they were spilled."""
+        if self.path is None:
+            return self.data
+        with open(self.path, 'rb') as f:
+            return f.read()
+
+    def discard(self):
+        """Deletes the spilled file now instead of waiting for the handle to be collected."""
+        if self.path is not None:
+            self._cleanup()
+
+
+def remove_quietly(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class UploadStore:
+    """Turns Streamlit UploadedFiles into StoredUploads, spilling large ones to directory."""
+
+    def __init__(self, directory=DEFAULT_DIR, spill_bytes=SPILL_BYTES, stale_seconds=STALE_SECONDS):
+        self.directory = directory
+        self.spill_bytes = spill_bytes
+        self._lock = threading.Lock()
+        self._stats = {"in_memory": 0, "spilled": 0, "spilled_bytes": 0}
+        os.makedirs(directory, exist_ok=True)
+        self.sweep(stale_seconds)
+
+    def put(self, uploaded_file):
+        """Returns a StoredUpload for uploaded_file without copying its contents in memory."""
+        # UploadedFile is a BytesIO over the uploaded bytes; getvalue() hands back that same
+        # object, whereas read() or getbuffer() would copy it.
+        data = uploaded_file.getvalue()
+        sha256 = hashlib.sha256(data).hexdigest()
+        size = len(data)
+        file_id = getattr(uploaded_file, 'file_id', sha256)
+        if size <= self.spill_bytes:
+            with self._lock:
+                self._stats["in_memory"] += 1
+            return StoredUpload(file_id, uploaded_file.name, uploaded_file.type, size, sha256, data=data)
+        path = os.path.join(self.directory, f"{sha256[:16]}-{uuid.uuid4().hex}")
+        with open(path, 'wb') as f:
+            f.write(data)
+        with self._lock:
+            self._stats["spilled"] += 1
+            self._stats["spilled_bytes"] += size
+        return StoredUpload(file_id, uploaded_file.name, uploaded_file.type, size, sha256, path=path)
+
+    def sweep(self, stale_seconds=STALE_SECONDS):
+        """Deletes spilled files no process has touched for stale_seconds."""
+        cutoff = time.time() - stale_seconds
+        for entry in os.scandir(self.directory):
+            try:
+                if entry.is_file() and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+            except OSError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
@@ -1,10 +1,18 @@
 import streamlit as st
 import os
-import json 
-import requests
-import time
-import pdfplumber
-from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from gemini_client import GeminiClient, GeminiResponseError, payload_key, stream_url_for
+from json_stream import JsonItemStream
+from jobs import JobExecutor
+from cache import TieredCache
+from rate_limiter import RateLimiter, Ticket, INTERACTIVE
+from token_budget import TokenEstimator
+from pdf_extraction import ExtractedPdf, PdfPageStream, create_pool
+from uploads import DEFAULT_DIR, UploadStore
+from retrieval import DocumentIndex, select_passages
+from note_library import LibraryPages, NoteLibrary
 
 # --- Configuration for Gemini API ---
 try:
@@ -22,9 +30,77 @@ if not GEMINI_API_KEY:
     """)
     st.stop()
 
-GEMINI_API_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash-preview-05-20:generateContent"
+# Override GEMINI_API_URL to point the app at another endpoint, e.g. mock_gemini_server.py
+GEMINI_API_URL = os.getenv(
+    "GEMINI_API_URL",
+    "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash-preview-05-20:generateContent",
+)
+GEMINI_STREAM_URL = os.getenv("GEMINI_STREAM_URL", stream_url_for(GEMINI_API_URL))
 MAX_RETRIES = 5
-BASE_DELAY = 2
+BASE_DELAY = 1
+MAX_DELAY = 20          # Cap on a single backoff sleep (seconds)
+REQUEST_DEADLINE = 90   # Total budget per generation, retries included (seconds)
+
+# --- Response Cache ---
+RESPONSE_CACHE_MAX_ENTRIES = 512            # In-memory LRU size
+RESPONSE_CACHE_TTL = 24 * 60 * 60           # Seconds before a cached response is regenerated
+RESPONSE_CACHE_DB = os.getenv("MYBUDDY_RESPONSE_CACHE_DB", "")  # SQLite path for the disk tier; empty = memory only
+RESPONSE_CACHE_MAX_DISK_ENTRIES = 20000
+
+# --- Background Jobs ---
+JOB_WORKERS = int(os.getenv("MYBUDDY_JOB_WORKERS", "8"))          # Generations running at once
+JOB_QUEUE_DEPTH = int(os.getenv("MYBUDDY_JOB_QUEUE_DEPTH", "32"))  # Generations allowed to wait for a worker
+
+# --- API Quota ---
+RATE_LIMIT_RPM = int(os.getenv("MYBUDDY_RATE_LIMIT_RPM", "60"))        # Requests per minute across all sessions
+RATE_LIMIT_TPM = int(os.getenv("MYBUDDY_RATE_LIMIT_TPM", "1000000"))   # Tokens per minute across all sessions
+
+# --- Input Budget ---
+MAX_INPUT_TOKENS = int(os.getenv("MYBUDDY_MAX_INPUT_TOKENS", "1000000"))  # Estimated prompt tokens a request may carry
+TOPIC_MAX_TOKENS = int(os.getenv("MYBUDDY_TOPIC_MAX_TOKENS", "2000"))     # Longer topics are cut before prompting
+
+# --- PDF Extraction ---
+PDF_WORKERS = int(os.getenv("MYBUDDY_PDF_WORKERS", str(os.cpu_count() or 1)))  # Processes parsing PDF pages
+PDF_MAX_PAGES = int(os.getenv("MYBUDDY_PDF_MAX_PAGES", "300"))                 # Pages read per document
+PDF_TIME_BUDGET = float(os.getenv("MYBUDDY_PDF_TIME_BUDGET", "60"))            # Seconds spent reading one document
+PDF_BACKEND = os.getenv("MYBUDDY_PDF_BACKEND", "auto")                         # auto, pdfium (fast) or pdfplumber (accurate)
+
+# --- Uploads ---
+UPLOAD_SPILL_BYTES = int(os.getenv("MYBUDDY_UPLOAD_SPILL_BYTES", str(1024 * 1024)))  # Larger uploads are kept on disk
+UPLOAD_DIR = os.getenv("MYBUDDY_UPLOAD_DIR", DEFAULT_DIR)                            # Where spilled uploads are written
+
+# --- Summaries ---
+SUMMARY_SECTION_WORKERS = int(os.getenv("MYBUDDY_SUMMARY_SECTION_WORKERS", "8"))  # Section summaries requested at once per process
+BATCH_MAX_FILES = int(os.getenv("MYBUDDY_BATCH_MAX_FILES", "20"))         # Files summarized together from one upload
+BATCH_FILE_WORKERS = int(os.getenv("MYBUDDY_BATCH_FILE_WORKERS", "4"))    # Files of batches processed at once per process
+# Fast mode: longer notes are cut locally to their key sentences before Short and Medium summaries.
+EXTRACTIVE_TOKENS = {
+    "Short": int(os.getenv("MYBUDDY_EXTRACTIVE_SHORT_TOKENS", "3000")),
+    "Medium": int(os.getenv("MYBUDDY_EXTRACTIVE_MEDIUM_TOKENS", "6000")),
+}
+
+# --- Extraction Cache ---
+EXTRACTION_CACHE_MAX_ENTRIES = 64                # Documents kept in memory
+EXTRACTION_CACHE_TTL = 7 * 24 * 60 * 60          # Seconds before a document is parsed again
+EXTRACTION_CACHE_DB = os.getenv("MYBUDDY_EXTRACTION_CACHE_DB", "")  # SQLite path for the disk tier; empty = memory only
+EXTRACTION_CACHE_MAX_DISK_ENTRIES = 2000
+
+# --- Chunk Summary Cache ---
+SUMMARY_CACHE_MAX_ENTRIES = 2048                 # Chunk summaries kept in memory
+SUMMARY_CACHE_TTL = 60 * 24 * 60 * 60            # Seconds a chunk summary stays reusable across re-uploads
+SUMMARY_CACHE_DB = os.getenv("MYBUDDY_SUMMARY_CACHE_DB", "")  # SQLite path for the disk tier; empty = memory only
+SUMMARY_CACHE_MAX_DISK_ENTRIES = 50000
+
+# --- Retrieval Index ---
+RETRIEVAL_CACHE_MAX_ENTRIES = 64                 # Document indexes kept in memory
+RETRIEVAL_CACHE_TTL = 7 * 24 * 60 * 60           # Seconds before a document is indexed again
+RETRIEVAL_CACHE_DB = os.getenv("MYBUDDY_RETRIEVAL_CACHE_DB", "")  # SQLite path for the disk tier; empty = memory only
+RETRIEVAL_CACHE_MAX_DISK_ENTRIES = 2000
+RETRIEVAL_TOKENS = int(os.getenv("MYBUDDY_RETRIEVAL_TOKENS", "2500"))  # Tokens of uploaded notes sent with a quiz, deck or explanation
+
+# --- Note Library ---
+LIBRARY_TTL = 24 * 60 * 60                        # Seconds an upload stays searchable in its session after it was last added
+LIBRARY_MAX_CHARS = int(os.getenv("MYBUDDY_LIBRARY_MAX_CHARS", "20000000"))  # Page text kept for all sessions; the oldest uploads are evicted beyond it
 
 # --- JSON Schema for Structured Quiz Output ---
 QUIZ_SCHEMA = {
@@ -57,52 +133,222 @@ FLASHCARD_SCHEMA = {
     }
 }
 
+# Generated once per document; every summary style, length and highlight variant is rendered from it.
+SUMMARY_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "key_points": {
+            "type": "ARRAY",
+            "items": {
+                "type": "OBJECT",
+                "properties": {"point": {"type": "STRING", "description": "One key point as a single plain sentence."}},
+                "required": ["point"]
+            },
+            "description": "Exactly 12 key points, ranked from most to least important."
+        },
+        "paragraphs": {
+            "type": "ARRAY",
+            "items": {"type": "STRING"},
+            "description": "Exactly 3 plain-text paragraphs: a 3-5 sentence overview first, then two that each add more detail."
+        },
+        "key_terms": {
+            "type": "ARRAY",
+            "items": {
+                "type": "OBJECT",
+                "properties": {
+                    "term": {"type": "STRING", "description": "A technical term or concept exactly as it appears in the summary."},
+                    "importance": {"type": "INTEGER", "description": "How central the term is, from 1 (minor) to 5 (essential)."}
+                },
+                "required": ["term", "importance"]
+            },
+            "description": "Up to 10 key terms of the notes."
+        }
+    },
+    "propertyOrdering": ["key_points", "paragraphs", "key_terms"],
+    "required": ["key_points", "paragraphs", "key_terms"]
+}
+
+# --- Shared API Client ---
+
+@st.cache_resource
+def get_response_cache():
+    """Returns the process-wide cache of generated responses, keyed on the canonical payload hash."""
+    return TieredCache(
+        max_entries=RESPONSE_CACHE_MAX_ENTRIES,
+        ttl=RESPONSE_CACHE_TTL,
+        db_path=RESPONSE_CACHE_DB or None,
+        max_disk_entries=RESPONSE_CACHE_MAX_DISK_ENTRIES,
+        table="responses",
+    )
+
+def get_response_cache_stats():
+    """Returns hit/miss counters for the shared response cache."""
+    return get_response_cache().stats()
+
+@st.cache_resource
+def get_rate_limiter():
+    """Returns the process-wide admission queue that keeps every session inside the API quota."""
+    return RateLimiter(RATE_LIMIT_RPM, RATE_LIMIT_TPM)
+
+@st.cache_resource
+def get_token_estimator():
+    """Returns the process-wide prompt-token estimator, calibrated by every response's usageMetadata."""
+    return TokenEstimator()
+
+@st.cache_resource
+def get_gemini_client():
+    """Returns the process-wide Gemini client so every session reuses the same connection pool."""
+    return GeminiClient(
+        GEMINI_API_KEY,
+        GEMINI_API_URL,
+        stream_url=GEMINI_STREAM_URL,
+        max_retries=MAX_RETRIES,
+        base_delay=BASE_DELAY,
+        max_delay=MAX_DELAY,
+        deadline=REQUEST_DEADLINE,
+        cache=get_response_cache(),
+        limiter=get_rate_limiter(),
+        estimator=get_token_estimator(),
+        max_input_tokens=MAX_INPUT_TOKENS,
+    )
+
+@st.cache_resource
+def get_job_executor():
+    """Returns the process-wide bounded pool that runs generations off the script thread."""
+    return JobExecutor(JOB_WORKERS, JOB_QUEUE_DEPTH)
+
+@st.cache_resource
+def get_extraction_cache():
+    """Returns the process-wide cache of extracted PDF pages, keyed on a SHA-256 of the file bytes."""
+    return TieredCache(
+        max_entries=EXTRACTION_CACHE_MAX_ENTRIES,
+        ttl=EXTRACTION_CACHE_TTL,
+        db_path=EXTRACTION_CACHE_DB or None,
+        max_disk_entries=EXTRACTION_CACHE_MAX_DISK_ENTRIES,
+        table="extractions",
+    )
+
+@st.cache_resource
+def get_summary_chunk_cache():
+    """Returns the process-wide store of per-chunk summaries, so re-uploaded documents only pay for changed chunks."""
+    return TieredCache(
+        max_entries=SUMMARY_CACHE_MAX_ENTRIES,
+        ttl=SUMMARY_CACHE_TTL,
+        db_path=SUMMARY_CACHE_DB or None,
+        max_disk_entries=SUMMARY_CACHE_MAX_DISK_ENTRIES,
+        table="chunk_summaries",
+    )
+
+@st.cache_resource
+def get_retrieval_cache():
+    """Returns the process-wide cache of document retrieval indexes, keyed on a SHA-256 of the file bytes."""
+    return TieredCache(
+        max_entries=RETRIEVAL_CACHE_MAX_ENTRIES,
+        ttl=RETRIEVAL_CACHE_TTL,
+        db_path=RETRIEVAL_CACHE_DB or None,
+        max_disk_entries=RETRIEVAL_CACHE_MAX_DISK_ENTRIES,
+        table="retrieval_indexes",
+    )
+
+@st.cache_resource
+def get_note_library():
+    """Returns the process-wide, in-memory full-text library of uploaded documents, searchable per session."""
+    return NoteLibrary(ttl=LIBRARY_TTL, max_chars=LIBRARY_MAX_CHARS)
+
+@st.cache_resource
+def get_section_pool():
+    """Returns the process-wide thread pool that requests section summaries of long documents."""
+    return ThreadPoolExecutor(max_workers=SUMMARY_SECTION_WORKERS, thread_name_prefix="mybuddy-section")
+
+@st.cache_resource
+def get_batch_pool():
+    """Returns the process-wide thread pool that runs the per-file pipelines of batch summaries."""
+    return ThreadPoolExecutor(max_workers=BATCH_FILE_WORKERS, thread_name_prefix="mybuddy-batch")
+
+@st.cache_resource
+def get_upload_store():
+    """Returns the process-wide store that keeps large uploads on disk instead of in session memory."""
+    return UploadStore(UPLOAD_DIR, UPLOAD_SPILL_BYTES)
+
+def store_upload(uploaded_file, current=None):
+    """Returns the StoredUpload for uploaded_file, reusing current if it already holds the same file."""
+    if current is not None and current.file_id == getattr(uploaded_file, 'file_id', None):
+        return current
+    return get_upload_store().put(uploaded_file)
+
+def store_uploads(uploaded_files, current=None):
+    """Returns StoredUploads for a multi-file upload, reusing the handles in current for files already stored."""
+    stored = {upload.file_id: upload for upload in current or []}
+    return [store_upload(uploaded_file, stored.get(getattr(uploaded_file, 'file_id', None)))
+            for uploaded_file in uploaded_files]
+
+@st.cache_resource
+def get_pdf_pool():
+    """Returns the process-wide worker pool that parses PDF pages in parallel."""
+    return create_pool(PDF_WORKERS)
+
+def current_session_id():
+    """Returns the id of the browser session running this script, or None outside a script run."""
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else None
+
+def submit_job(body, *args, priority=INTERACTIVE, **kwargs):
+    """Queues body(job, *args, **kwargs) on the job pool; its API calls are admitted as this session at priority."""
+    return get_job_executor().submit(body, *args, ticket=Ticket(current_session_id(), priority), **kwargs)
+
+def job_status_text(job):
+    """Describes where a background job is, for the loading views."""
+    position = get_job_executor().queue_position(job)
+    if not position and job.ticket is not None:
+        position = get_rate_limiter().position(job.ticket)
+    if position:
+        return f"⏳ {position} request{'s' if position != 1 else ''} ahead of you"
+    if job.status == "queued":
+        return "⏳ Starting shortly..."
+    return ""
+
 # --- Utility Functions ---
 
-def generate_content_with_backoff(payload):
-    """Makes a request to the Gemini API with exponential backoff for retries."""
-    if not GEMINI_API_KEY:
-        st.error("Gemini API key not found.")
-        return None
-
-    headers = {'Content-Type': 'application/json'}
-    params = {'key': GEMINI_API_KEY}
-
-    for attempt in range(MAX_RETRIES):
-        try:
-            response = requests.post(GEMINI_API_URL, headers=headers, params=params, data=json.dumps(payload))
-            response.raise_for_status() 
-
-            result = response.json()
-            
-            if 'candidates' not in result or not result['candidates']:
-                st.error("AI response failed: No candidates returned.")
-                return None
-            
-            text = result['candidates'][0]['content']['parts'][0]['text']
-            return text
-
-        except requests.exceptions.RequestException as e:
-            if attempt < MAX_RETRIES - 1:
-                delay = BASE_DELAY * (2 ** attempt)
-                time.sleep(delay)
-            else:
-                st.error("Max retries reached. API request failed.")
-                return None
-        except (json.JSONDecodeError, KeyError, IndexError) as e:
-            st.error(f"Error processing API response: {e}")
-            return None
-    return None
+def stream_content(payload, regenerate=False, notes=None):
+    """Returns open_stream(cancel_event=None, ticket=None), which starts a streamed Gemini response and iterates its text chunks.
+
+    The client is resolved here, on the script thread, so the stream can be opened on a
+    job worker. notes, if given, is a notes_lookup whose passages are added to the
+    prompt on the worker first. Raises GeminiError while iterating if the request fails.
+    """
+    return partial(stream_text, get_gemini_client(), payload, regenerate, notes)
+
+def stream_text(client, payload, regenerate=False, notes=None, cancel_event=None, ticket=None):
+    """Yields the text chunks of client's streamed response to payload grounded in notes (see grounded)."""
+    yield from client.stream(grounded(payload, notes), use_cache=not regenerate, cancel_event=cancel_event, ticket=ticket)
 
-def generate_structured_quiz(topic, difficulty, num_questions):
-    """Generates structured quiz data using the Gemini API's JSON output capability."""
-    if not GEMINI_API_KEY:
-        st.error("Gemini API key not found.")
-        return None
+def fit_topic(topic):
+    """Cuts a topic (often pasted notes) to TOPIC_MAX_TOKENS estimated tokens at a sentence boundary."""
+    return get_token_estimator().truncate(topic, TOPIC_MAX_TOKENS)
 
+def with_notes(prompt, notes):
+    """Appends excerpts of the user's uploaded notes to a prompt, when there are any."""
+    if not notes:
+        return prompt
+    return f"{prompt}\n\nBase your answer on these excerpts from my notes:\n\n{notes}"
+
+def grounded(payload, notes):
+    """Returns payload with the passages found by notes (a notes_lookup, or None) appended to its prompt.
+
+    The lookup runs here, so call this on the job worker.
+    """
+    excerpts = notes() if notes is not None else None
+    if not excerpts:
+        return payload
+    prompt = payload["contents"][0]["parts"][0]["text"]
+    return {**payload, "contents": [{"parts": [{"text": with_notes(prompt, excerpts)}]}]}
+
+def build_quiz_payload(topic, difficulty, num_questions):
+    """Builds the structured-output request for a multiple-choice quiz."""
+    topic = fit_topic(topic)
     system_prompt = f"""You are 'MyBuddy', an AI exam generation engine. Generate {num_questions} multiple-choice questions on '{topic}' at '{difficulty}' level. Each question must have exactly four options."""
     
-    payload = {
+    return {
         "contents": [{"parts": [{"text": f"Generate {num_questions} MCQs about {topic}."}]}],
         "systemInstruction": {"parts": [{"text": system_prompt}]},
         "generationConfig": {
@@ -112,39 +358,12 @@ def generate_structured_quiz(topic, difficulty, num_questions):
         "model": "gemini-2.5-flash-preview-05-20"
     }
 
-    headers = {'Content-Type': 'application/json'}
-    params = {'key': GEMINI_API_KEY}
-
-    for attempt in range(MAX_RETRIES):
-        try:
-            response = requests.post(GEMINI_API_URL, headers=headers, params=params, data=json.dumps(payload))
-            response.raise_for_status()
-            
-            result = response.json()
-            raw_text = result['candidates'][0]['content']['parts'][0]['text']
-            quiz_data = json.loads(raw_text)
-            
-            return quiz_data if quiz_data else None
-
-        except requests.exceptions.RequestException:
-            if attempt < MAX_RETRIES - 1:
-                time.sleep(BASE_DELAY * (2 ** attempt))
-            else:
-                return None
-        except (json.JSONDecodeError, KeyError, IndexError) as e:
-            st.error(f"Error parsing quiz data: {e}")
-            return None
-    return None
-
-def generate_structured_flashcards(topic, num_cards):
-    """Generates structured flashcard data using the Gemini API's JSON output capability."""
-    if not GEMINI_API_KEY:
-        st.error("Gemini API key not found.")
-        return None
-
+def build_flashcard_payload(topic, num_cards):
+    """Builds the structured-output request for a flashcard deck."""
+    topic = fit_topic(topic)
     system_prompt = f"""You are 'MyBuddy', an AI study companion. Generate exactly {num_cards} flashcards based on '{topic}'. Each must have a 'question' (concept) and an 'answer' (definition)."""
     
-    payload = {
+    return {
         "contents": [{"parts": [{"text": f"Generate {num_cards} flashcards about {topic}."}]}],
         "systemInstruction": {"parts": [{"text": system_prompt}]},
         "generationConfig": {
@@ -154,55 +373,147 @@ def generate_structured_flashcards(topic, num_cards):
         "model": "gemini-2.5-flash-preview-05-20"
     }
 
-    headers = {'Content-Type': 'application/json'}
-    params = {'key': GEMINI_API_KEY}
-
-    for attempt in range(MAX_RETRIES):
-        try:
-            response = requests.post(GEMINI_API_URL, headers=headers, params=params, data=json.dumps(payload))
-            response.raise_for_status()
-            
-            result = response.json()
-            raw_text = result['candidates'][0]['content']['parts'][0]['text']
-            card_data = json.loads(raw_text)
-
-            return card_data if card_data else None
-
-        except requests.exceptions.RequestException:
-            if attempt < MAX_RETRIES - 1:
-                time.sleep(BASE_DELAY * (2 ** attempt))
-            else:
-                return None
-        except (json.JSONDecodeError, KeyError, IndexError) as e:
-            st.error(f"Error parsing flashcard data: {e}")
-            return None
-    return None
+def is_valid_question(item):
+    """Checks that a streamed quiz item has everything the quiz view needs."""
+    if not isinstance(item, dict):
+        return False
+    options = item.get('options')
+    correct_index = item.get('correct_index')
+    return (
+        bool(item.get('question'))
+        and isinstance(options, list) and len(options) >= 2
+        and isinstance(correct_index, int) and 0 <= correct_index < len(options)
+        and 'explanation' in item
+    )
 
-def extract_text_from_file(uploaded_file):
-    """Extracts text from an uploaded file (PDF or TXT)."""
-    if uploaded_file is None:
-        st.error("No file uploaded.")
-        return None
-    
-    file_type = uploaded_file.type
-    
-    if file_type == "text/plain":
-        try:
-            return uploaded_file.getvalue().decode("utf-8")
-        except Exception as e:
-            st.error(f"Error reading text file: {e}")
-            return None
-        
-    elif file_type == "application/pdf":
-        try:
-            with pdfplumber.open(BytesIO(uploaded_file.read())) as pdf:
-                text = ""
-                for page in pdf.pages[:10]:  # First 10 pages
-                    text += page.extract_text() or ""
-                return text.strip()
-        except Exception as e:
-            st.error(f"Error processing PDF: {e}")
+def is_valid_card(item):
+    """Checks that a streamed flashcard has both sides filled in."""
+    return isinstance(item, dict) and bool(item.get('question')) and bool(item.get('answer'))
+
+def iter_structured_items(client, payload, is_valid, regenerate=False, notes=None, cancel_event=None, ticket=None):
+    """Yields each valid array item of a structured response as soon as its closing brace streams in.
+
+    The payload is grounded in notes (see grounded) first. Raises GeminiError for API
+    failures and ValueError for malformed JSON or unreadable notes.
+    """
+    payload = grounded(payload, notes)
+    parser = JsonItemStream()
+    try:
+        for chunk in client.stream(payload, use_cache=not regenerate, cancel_event=cancel_event, ticket=ticket):
+            for item in parser.feed(chunk):
+                if is_valid(item):
+                    yield item
+        if not parser.complete:
+            raise GeminiResponseError("The response ended before the JSON was complete.")
+    except (GeminiResponseError, ValueError):
+        # Never serve a malformed response from the cache again.
+        if client.cache is not None:
+            client.cache.delete(payload_key(payload))
+        raise
+
+def stream_quiz_questions(topic, difficulty, num_questions, regenerate=False, notes=None):
+    """Returns open_stream(cancel_event=None, ticket=None), which yields each quiz question as soon as it is generated.
+
+    notes, if given, is a notes_lookup whose passages are added to the prompt on the job worker.
+    """
+    payload = build_quiz_payload(topic, difficulty, num_questions)
+    return partial(iter_structured_items, get_gemini_client(), payload, is_valid_question, regenerate, notes)
+
+def stream_flashcards(topic, num_cards, regenerate=False, notes=None):
+    """Returns open_stream(cancel_event=None, ticket=None), which yields each flashcard as soon as it is generated.
+
+    notes, if given, is a notes_lookup whose passages are added to the prompt on the job worker.
+    """
+    payload = build_flashcard_payload(topic, num_cards)
+    return partial(iter_structured_items, get_gemini_client(), payload, is_valid_card, regenerate, notes)
+
+def cancel_job(job_id):
+    """Cancels a background generation the user no longer needs; unknown or finished ids are ignored."""
+    if job_id:
+        get_job_executor().cancel(job_id)
+
+def document_pages(upload, on_progress=None):
+    """Returns a StoredUpload PDF's page texts as a lazy iterable, served from the extraction cache or parsed in parallel.
+
+    Nothing is read until the result is iterated, so it can be handed to a job worker;
+    documents already seen (by any session) skip parsing entirely. Spilled uploads are
+    opened by path, so the worker processes never receive the file's bytes.
+    """
+    cache = get_extraction_cache()
+    key = f"{upload.sha256}:{PDF_MAX_PAGES}:{PDF_BACKEND}"
+    cached = cache.get(key)
+    if cached is not None:
+        return ExtractedPdf.from_dict(cached)
+    return PdfPageStream(
+        upload.source,
+        pool=get_pdf_pool(),
+        max_pages=PDF_MAX_PAGES,
+        time_budget=PDF_TIME_BUDGET,
+        backend=PDF_BACKEND,
+        on_progress=on_progress,
+        on_complete=lambda extracted: cache.set(key, extracted.as_dict()),
+    )
+
+def notes_lookup(query, uploads):
+    """Returns notes(), which returns the passages of the uploaded files most relevant to query, up to RETRIEVAL_TOKENS, or None.
+
+    Only these excerpts are sent with the request, never the whole documents. Everything
+    the lookup needs is resolved here; it runs on the job worker (see grounded), so
+    reading and indexing the files never holds up the page.
+    """
+    sources = [library_pages(upload) for upload in uploads]
+    return partial(find_notes, query, sources, get_retrieval_cache(), get_token_estimator())
+
+def find_notes(query, sources, cache, estimator):
+    """Returns the passages of LibraryPages sources most relevant to query, or None; raises ValueError if one cannot be read."""
+    try:
+        indexes = [(source.name, document_index(source, cache, estimator)) for source in sources]
+    except Exception as e:
+        raise ValueError(f"Could not read your uploaded notes: {e}") from e
+    return select_passages(indexes, query, RETRIEVAL_TOKENS, estimator.estimate) or None
+
+def document_index(source, cache, estimator):
+    """Returns the DocumentIndex of a LibraryPages, from the retrieval cache or built from its library pages."""
+    cached = cache.get(source.document)
+    if cached is not None:
+        return DocumentIndex.from_dict(cached)
+    source.add()
+    index = DocumentIndex.build([text for _, text in source.library.pages(source.document)], estimator)
+    cache.set(source.document, index.as_dict())
+    return index
+
+def text_pages(upload):
+    """Yields a text StoredUpload's content as its single page, reading it only when iterated."""
+    yield upload.getvalue().decode("utf-8")
+
+def library_pages(upload, query=None):
+    """Returns a StoredUpload's pages as a LibraryPages of this session's note library, all of them or those that mention query.
+
+    Nothing is read until it is iterated (or added) on a job worker: a PDF's pages come
+    from document_pages, a text file is a single page.
+    """
+    source = document_pages(upload) if upload.type == "application/pdf" else text_pages(upload)
+    return LibraryPages(get_note_library(), current_session_id() or "", library_key(upload), upload.name, source, query)
+
+def library_key(upload):
+    """Returns the note library's key for a StoredUpload's document (its extraction settings included)."""
+    return f"{upload.sha256}:{PDF_MAX_PAGES}:{PDF_BACKEND}"
+
+def add_to_library(job, sources):
+    """Job body that adds LibraryPages to the note library, extracting only documents no session has added yet."""
+    for done, source in enumerate(sources):
+        if job.cancelled:
             return None
-    else:
-        st.error(f"Unsupported file type. Please upload PDF or TXT files only.")
-        return None
+        job.report(f"📚 Adding {source.name} to your library ({done + 1} of {len(sources)})...")
+        source.add()
+    return len(sources)
+
+def missing_from_library(uploads):
+    """Returns the StoredUploads the note library does not hold yet; the others are made visible to this session."""
+    library = get_note_library()
+    owner = current_session_id() or ""
+    return [upload for upload in uploads if not library.attach(owner, library_key(upload), upload.name)]
+
+def search_notes(query):
+    """Returns this session's best-matching library pages for query (see NoteLibrary.search)."""
+    return get_note_library().search(current_session_id() or "", query)